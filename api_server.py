@@ -1,10 +1,19 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
 import main
+from src.service import get_service_context
+from src.timing import StageTimer
+from src.async_pipeline import run_pipeline
+from src.jobs import JobManager, QueueFull, SUCCEEDED, FAILED, CANCELLED
+from src.evaluation import setup_evaluation_queue
+from src.metrics import REGISTRY, cache_collector
 import traceback
+import json
 import logging
 import sys
 import os
+import time
+import threading
 
 # Set up logging - change level to INFO to reduce verbosity
 logging.basicConfig(
@@ -20,9 +29,96 @@ logger = logging.getLogger(__name__)
 logging.getLogger('werkzeug').setLevel(logging.WARNING)
 logging.getLogger('matplotlib').setLevel(logging.WARNING)
 
+# Generated emails are scored in batches in the background (EVALUATION_SCORER)
+evaluation_queue = setup_evaluation_queue()
+
+def run_generation(job):
+    """Job body: the full main() pipeline, printing into the job's own buffer"""
+    timer = StageTimer()
+    try:
+        return main.main(
+            product_url=job.params['product_url'],
+            client_url=job.params['client_url'],
+            context=get_service_context(),
+            timer=timer,
+            out=job.output,
+            evaluation=evaluation_queue
+        )
+    finally:
+        job.timings = timer.as_dict()
+        logger.info(f"Job {job.id} finished ({timer.summary()})")
+
+# Generations run on a bounded pool; JOB_QUEUE_SIZE more may wait before
+# new submissions are rejected with 429
+jobs = JobManager(
+    run_generation,
+    workers=int(os.getenv('JOB_WORKERS', 2)),
+    max_queue=int(os.getenv('JOB_QUEUE_SIZE', 16)),
+    retention=float(os.getenv('JOB_RETENTION', 3600))
+)
+# Seconds clients are told to wait after a 429
+RETRY_AFTER = 5
+# Streamed generations run in their request thread rather than on the job
+# pool, so they get their own bound; more are rejected with 429
+STREAM_CONCURRENCY = int(os.getenv('STREAM_CONCURRENCY', os.getenv('JOB_WORKERS', 2)))
+stream_slots = threading.BoundedSemaphore(STREAM_CONCURRENCY)
+
 app = Flask(__name__)
 CORS(app, resources={r"/api/*": {"origins": "*"}})  # Allow all origins for /api/ routes
 
+HTTP_SECONDS = REGISTRY.histogram(
+    "outbound_http_request_seconds", "HTTP request latency by endpoint", ["endpoint", "method"]
+)
+HTTP_REQUESTS = REGISTRY.counter(
+    "outbound_http_requests_total", "HTTP requests by endpoint and status", ["endpoint", "method", "status"]
+)
+
+@app.before_request
+def _start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def _record_request(response):
+    start = g.get('request_start')
+    if start is not None:
+        # The route pattern, not the path, so job ids do not explode label cardinality
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        HTTP_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint, method=request.method)
+        HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    return response
+
+def _collect_queues():
+    job_stats = jobs.stats()
+    samples = [
+        ("outbound_jobs", "gauge", "Generation jobs by state",
+         [({"state": state}, job_stats[state]) for state in ("running", "queued")]),
+    ]
+    if evaluation_queue is not None:
+        stats = evaluation_queue.stats()
+        samples.append(("outbound_evaluation_pending", "gauge", "Emails waiting to be evaluated",
+                        [({}, stats["pending"])]))
+        samples.append(("outbound_evaluation_emails_total", "counter", "Emails by evaluation outcome",
+                        [({"outcome": outcome}, stats[outcome]) for outcome in ("submitted", "evaluated", "dropped")]))
+    return samples
+
+def _service_caches():
+    from src.llm import get_llm_cache
+    # Read the current state without triggering a load from the scrape
+    state = get_service_context().current
+    if state is None:
+        return {"llm": get_llm_cache()}
+    return {
+        "llm": get_llm_cache(),
+        "page": state.page_cache,
+        "extraction": state.extraction_cache,
+        "embedding": getattr(state.clip_model, "embedding_cache", None),
+        "pixel": getattr(state.clip_model, "pixel_cache", None),
+        "query": getattr(state, "query_cache", None),
+    }
+
+REGISTRY.register_collector(_collect_queues)
+REGISTRY.register_collector(cache_collector(_service_caches))
+
 @app.route('/api/generate-email', methods=['POST'])
 def generate_email():
     logger.info(f"Processing email generation request")
@@ -49,35 +145,32 @@ def generate_email():
                 'message': 'Both product_url and client_url are required'
             }), 400
         
-        # Call the main function with the provided URLs
+        # Run through the job pool so concurrent requests are bounded and
+        # each one's output is captured in its own buffer
         try:
-            # Create a quiet environment for main.py execution
-            original_stdout = sys.stdout
-            sys.stdout = open(os.devnull, 'w')  # Redirect stdout to null
-            
-            email_content = main.main(product_url=product_url, client_url=client_url)
-            
-            # Restore stdout
-            sys.stdout.close()
-            sys.stdout = original_stdout
-            
-            logger.info("Successfully generated email content")
-        except Exception as e:
-            # Restore stdout if exception occurred
-            if sys.stdout != original_stdout:
-                sys.stdout.close()
-                sys.stdout = original_stdout
-                
-            logger.error(f"Error in email generation: {str(e)}")
+            job = jobs.submit(product_url=product_url, client_url=client_url)
+        except QueueFull as e:
+            logger.warning(str(e))
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 429, {'Retry-After': str(RETRY_AFTER)}
+        job.done.wait()
+        
+        if job.status != SUCCEEDED:
+            logger.error(f"Error in email generation: {job.error}")
             return jsonify({
                 'status': 'error',
-                'message': f"Error in email generation: {str(e)}"
+                'message': f"Error in email generation: {job.error}"
             }), 500
         
+        logger.info(f"Successfully generated email content (job {job.id})")
+        
         # Return the generated email
         return jsonify({
             'status': 'success',
-            'email_content': email_content
+            'email_content': job.result,
+            'timings_ms': job.timings
         })
     except Exception as e:
         logger.error(f"Unhandled error: {str(e)}")
@@ -86,7 +179,129 @@ def generate_email():
             'message': str(e)
         }), 500
 
-# Add a simple health check endpoint
+def _job_urls(job):
+    return {
+        'status_url': f"/api/jobs/{job.id}",
+        'result_url': f"/api/jobs/{job.id}/result"
+    }
+
+# Submit a generation and return immediately; poll the status URL
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    data = request.get_json(silent=True) or {}
+    product_url = data.get('product_url')
+    client_url = data.get('client_url')
+    if not product_url or not client_url:
+        return jsonify({
+            'status': 'error',
+            'message': 'Both product_url and client_url are required'
+        }), 400
+    try:
+        job = jobs.submit(product_url=product_url, client_url=client_url)
+    except QueueFull as e:
+        logger.warning(str(e))
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 429, {'Retry-After': str(RETRY_AFTER)}
+    logger.info(f"Queued job {job.id}")
+    return jsonify({**job.as_dict(), **_job_urls(job)}), 202, {'Location': f"/api/jobs/{job.id}"}
+
+@app.route('/api/jobs', methods=['GET'])
+def job_pool_stats():
+    return jsonify(jobs.stats())
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': f"Unknown job {job_id}"}), 404
+    return jsonify({**job.as_dict(include_output=True), **_job_urls(job)})
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': f"Unknown job {job_id}"}), 404
+    if job.status == SUCCEEDED:
+        return jsonify({
+            'status': 'success',
+            'email_content': job.result,
+            'timings_ms': job.timings
+        })
+    if job.status == FAILED:
+        return jsonify({'status': 'error', 'message': f"Error in email generation: {job.error}"}), 500
+    if job.status == CANCELLED:
+        return jsonify({'status': 'error', 'message': 'Job was cancelled'}), 409
+    # Not finished yet
+    return jsonify(job.as_dict()), 202, {'Retry-After': '1'}
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = jobs.cancel(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': f"Unknown job {job_id}"}), 404
+    logger.info(f"Cancelled job {job.id} ({job.status})")
+    return jsonify(job.as_dict())
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+# Same inputs as /api/generate-email, but the email is pushed as Server-Sent
+# Events while the model writes it: a "status" event, a "search" event once
+# products are matched, "token" events, then "done" (or "error")
+@app.route('/api/generate-email/stream', methods=['POST'])
+def generate_email_stream():
+    data = request.get_json(silent=True) or {}
+    product_url = data.get('product_url')
+    client_url = data.get('client_url')
+    if not product_url or not client_url:
+        return jsonify({
+            'status': 'error',
+            'message': 'Both product_url and client_url are required'
+        }), 400
+
+    def events():
+        from src.email_generator import stream_sales_email
+        timer = StageTimer()
+        yield _sse('status', {'stage': 'started'})
+        try:
+            result = run_pipeline(
+                product_url, client_url, get_service_context().state, main.COMPANY_DESCRIPTION,
+                timer=timer, generate=False
+            )
+            style_names, _, composition_desc, _ = result.likeliness_results
+            yield _sse('search', {'styles': list(style_names)})
+            chunks = []
+            with timer.stage('generate_email'):
+                for text in stream_sales_email(
+                    main.COMPANY_DESCRIPTION, result.client_info, result.product_info,
+                    style_names, composition_desc
+                ):
+                    chunks.append(text)
+                    yield _sse('token', {'text': text})
+            yield _sse('done', {'email_content': ''.join(chunks), 'timings_ms': timer.as_dict()})
+            logger.info(f"Streamed email content ({timer.summary()})")
+        except Exception as e:
+            logger.error(f"Error in streamed email generation: {str(e)}")
+            yield _sse('error', {'message': f"Error in email generation: {str(e)}"})
+
+    if not stream_slots.acquire(blocking=False):
+        logger.warning(f"Rejected streamed generation, {STREAM_CONCURRENCY} already running")
+        return jsonify({
+            'status': 'error',
+            'message': f"Too many streamed generations ({STREAM_CONCURRENCY} running)"
+        }), 429, {'Retry-After': str(RETRY_AFTER)}
+    response = Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # Held until the stream ends or the client goes away
+    response.call_on_close(stream_slots.release)
+    return response
+
+# Liveness: answers as soon as the process serves requests, without loading anything
 @app.route('/api/health', methods=['GET'])
 def health_check():
     return jsonify({
@@ -94,6 +309,107 @@ def health_check():
         'message': 'API server is running'
     })
 
+# Readiness: 200 once models, inventory and index are loaded, 503 until then
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    context = get_service_context()
+    status = context.status
+    if status == 'ready':
+        return jsonify({'status': status, 'startup_timings_ms': context.current.startup_timings})
+    body = {'status': status}
+    if status == 'failed':
+        body['error'] = context.load_error
+    return jsonify(body), 503
+
+# Per-process unique vs shared memory; in pre-fork mode for the master and every worker
+@app.route('/api/memory', methods=['GET'])
+def memory_stats():
+    from src.prefork import memory_report
+    try:
+        return jsonify(memory_report())
+    except OSError as e:
+        return jsonify({'status': 'error', 'message': f"Memory report unavailable: {str(e)}"}), 501
+
+def preload_for_workers():
+    """
+    Everything pre-fork workers share, loaded once in the master: models,
+    inventory and index, plus the modules the first request would import
+    """
+    import importlib
+    state = get_service_context().state
+    if hasattr(state.index, 'compact'):
+        state.index.compact()
+    decode_pool = getattr(state.clip_model, 'decode_pool', None)
+    if decode_pool is not None:
+        # Its processes are not inherited; each worker starts its own on first use
+        decode_pool.shutdown()
+    for module in ('src.web_scraping', 'src.email_generator', 'langchain_groq'):
+        importlib.import_module(module)
+    # Workers reset their inherited metrics; the master's loading stages are counted from here
+    REGISTRY.write_snapshot()
+    return state
+
+def start_prewarm():
+    """
+    Load the service context in the background unless PREWARM is off; for
+    WSGI servers, call this from a post-fork hook in each worker
+    """
+    if os.getenv('PREWARM', 'true').lower() in ('0', 'false', 'no'):
+        return None
+    return get_service_context().prewarm()
+
+# Progress of the background evaluation stage
+@app.route('/api/evaluation', methods=['GET'])
+def evaluation_stats():
+    if evaluation_queue is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **evaluation_queue.stats()})
+
+# Prometheus scrape target: stage latencies, throughput, cache hit ratios, queue depths
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    if not REGISTRY.enabled:
+        return jsonify({'enabled': False}), 404
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+def stop_worker(timeout):
+    """Finish a stopping pre-fork worker's jobs and pending evaluations within timeout seconds"""
+    deadline = time.monotonic() + timeout
+    if not jobs.drain(timeout):
+        logger.warning(f"Stopping with unfinished jobs: {jobs.stats()}")
+    if evaluation_queue is not None:
+        evaluation_queue.close(max(0.0, deadline - time.monotonic()))
+    # Its counters stay in /api/metrics after it exits
+    REGISTRY.write_snapshot()
+
+def reload_for_workers():
+    """Reload in the pre-fork master (on SIGHUP), then prepare the new state for forking"""
+    get_service_context().reload()
+    return preload_for_workers()
+
+# Reload models, inventory and index without restarting the server
+@app.route('/api/reload', methods=['POST'])
+def reload_context():
+    from src.prefork import request_reload
+    # A pre-fork worker only holds a copy of the state; the master reloads and replaces every worker
+    if request_reload():
+        return jsonify({
+            'status': 'accepted',
+            'message': 'Reloading in the pre-fork master; workers are replaced when it finishes'
+        }), 202
+    try:
+        state = get_service_context().reload()
+    except Exception as e:
+        logger.error(f"Error reloading service context: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f"Error reloading service context: {str(e)}"
+        }), 500
+    return jsonify({
+        'status': 'success',
+        'startup_timings_ms': state.startup_timings
+    })
+
 # For debugging - simple test endpoint
 @app.route('/api/test', methods=['GET', 'POST'])
 def test_endpoint():
@@ -103,6 +419,33 @@ def test_endpoint():
     })
 
 if __name__ == '__main__':
+    from werkzeug.serving import make_server
     PORT = 5001
-    logger.info(f"Starting API server on port {PORT}")
-    app.run(debug=False, port=PORT, host='0.0.0.0') 
\ No newline at end of file
+    WEB_WORKERS = int(os.getenv('WEB_WORKERS', 1))
+    if WEB_WORKERS > 1:
+        # Load once, then fork workers that share it copy-on-write
+        import tempfile
+        from src.prefork import PreforkServer
+        from src.disk_cache import DiskCache
+        # Any worker can answer polls for a job another worker runs
+        job_store_dir = os.getenv('JOB_STORE_DIR') or tempfile.mkdtemp(prefix='outbound-jobs-')
+        jobs.store = DiskCache(os.path.join(job_store_dir, 'jobs.sqlite'))
+        # /api/metrics on any worker reports all of them
+        REGISTRY.use_directory(os.getenv('METRICS_DIR') or tempfile.mkdtemp(prefix='outbound-metrics-'))
+        PreforkServer(
+            app, '0.0.0.0', PORT,
+            workers=WEB_WORKERS,
+            preload=preload_for_workers,
+            reload=reload_for_workers,
+            on_worker_start=REGISTRY.reset_after_fork,
+            on_worker_stop=stop_worker,
+            shutdown_timeout=float(os.getenv('WORKER_SHUTDOWN_TIMEOUT', 30)),
+            torch_threads=int(os.getenv('WORKER_TORCH_THREADS', 0)) or None
+        ).serve()
+    else:
+        # Bind first so /api/health answers immediately, then load models,
+        # inventory and index in the background; /api/ready turns 200 when done
+        server = make_server('0.0.0.0', PORT, app, threaded=True)
+        start_prewarm()
+        logger.info(f"Starting API server on port {PORT}")
+        server.serve_forever() 
\ No newline at end of file
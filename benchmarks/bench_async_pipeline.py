@@ -0,0 +1,91 @@
+"""
+Offline benchmark of the concurrent generation pipeline
+
+Runs src.async_pipeline with stub loaders, stub LLM calls and a fake CLIP
+and compares its wall-clock time with the same stages run one after the
+other (the order main.main used before the pipeline existed).
+
+    python -m benchmarks.bench_async_pipeline --scrape-latency 0.3 --extract-latency 0.8
+"""
+import argparse
+import json
+import time
+from src.async_pipeline import PipelineStages, run_pipeline, build_search_query
+from src.data_processing import load_inventory_data, process_inventory_data
+from src.search import search_multi_alpha
+from src.timing import StageTimer
+from benchmarks.stubs import (
+    PRODUCT_INFO, CLIENT_INFO, make_bm25, make_stub_loader, make_stub_extractor, make_stub_email_generator,
+    make_stub_state
+)
+
+
+def run_sequential(product_url, client_url, state, stages):
+    """Baseline: every stage strictly in sequence"""
+    timer = StageTimer()
+    with timer.stage("scrape_product"):
+        page_product = stages.load_page(product_url)
+    with timer.stage("extract_product"):
+        product_info = stages.extract_product(page_product)
+    with timer.stage("scrape_client"):
+        page_client = stages.load_page(client_url)
+    with timer.stage("extract_client"):
+        client_info = stages.extract_client(page_client)
+    query = build_search_query(product_info)
+    with timer.stage("query_embed"):
+        sparse = state.bm25_model.encode_queries(query)
+        dense = state.clip_model.embed_texts([query])[0]
+    with timer.stage("search"):
+        _, likeliness = search_multi_alpha(state.index, sparse, dense, [0, 1])
+    with timer.stage("generate_email"):
+        stages.generate_email("Stub company", client_info, product_info, likeliness[0], likeliness[2])
+    return timer
+
+
+def run(inventory_path="./Images/test_image.csv", scrape_latency=0.3, extract_latency=0.8,
+        generate_latency=1.0, embed_latency=0.2, repeats=3):
+    inventory_df = process_inventory_data(load_inventory_data(inventory_path))
+    bm25_model = make_bm25()
+    bm25_model.fit(inventory_df["Description"])
+    state = make_stub_state(inventory_df, bm25_model)
+    state.clip_model.latency = embed_latency
+
+    stages = PipelineStages(
+        load_page=make_stub_loader(scrape_latency),
+        extract_product=make_stub_extractor(PRODUCT_INFO, extract_latency),
+        extract_client=make_stub_extractor(CLIENT_INFO, extract_latency),
+        generate_email=make_stub_email_generator(generate_latency),
+    )
+
+    results = {"sequential": [], "async": []}
+    for _ in range(repeats):
+        start = time.perf_counter()
+        timer = run_sequential("product", "client", state, stages)
+        timer.wall = time.perf_counter() - start
+        results["sequential"].append(timer.as_dict())
+
+        timer = StageTimer()
+        run_pipeline("product", "client", state, "Stub company", stages=stages, timer=timer)
+        results["async"].append(timer.as_dict())
+
+    sequential_wall = min(r["wall"] for r in results["sequential"])
+    async_wall = min(r["wall"] for r in results["async"])
+    return {
+        "sequential_wall_ms": sequential_wall,
+        "async_wall_ms": async_wall,
+        "speedup": round(sequential_wall / async_wall, 2),
+        "stage_timings_ms": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the concurrent generation pipeline offline.")
+    parser.add_argument("--inventory", default="./Images/test_image.csv")
+    parser.add_argument("--scrape-latency", type=float, default=0.3)
+    parser.add_argument("--extract-latency", type=float, default=0.8)
+    parser.add_argument("--generate-latency", type=float, default=1.0)
+    parser.add_argument("--embed-latency", type=float, default=0.2)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    print(json.dumps(run(args.inventory, args.scrape_latency, args.extract_latency,
+                         args.generate_latency, args.embed_latency, args.repeats), indent=2))
@@ -0,0 +1,73 @@
+"""
+Micro-benchmark of the per-query vector path
+
+Compares the original list-based query path (tensor -> list, list
+comprehension scaling) with the NumPy path, for both a list-based
+backend (Pinecone wire format) and the local index (no conversion).
+
+    python -m benchmarks.bench_hybrid_scale --queries 20000
+"""
+import argparse
+import json
+import timeit
+import numpy as np
+from src.search import hybrid_scale, to_wire_format
+
+
+def legacy_hybrid_scale(sparse, dense, style_similarity=1):
+    """The list comprehension implementation this path replaced"""
+    scaled_sparse = {
+        "indices": sparse["indices"],
+        "values": [value * (1 - style_similarity) for value in sparse["values"]]
+    }
+    scaled_dense = [style_similarity * value for value in dense]
+    return scaled_sparse, scaled_dense
+
+
+class _ListBackend:
+    """Stands in for the Pinecone client, which needs plain lists"""
+
+
+class _NumpyBackend:
+    accepts_numpy = True
+
+
+def run(queries=20000, dimension=512, sparse_terms=12, style_similarities=(0, 1)):
+    rng = np.random.default_rng(0)
+    embedding = rng.normal(size=(1, dimension)).astype(np.float32)
+    sparse = {
+        "indices": rng.integers(0, 2**32, size=sparse_terms).tolist(),
+        "values": rng.random(sparse_terms).tolist()
+    }
+
+    def legacy():
+        dense = embedding.squeeze(0).tolist()
+        for style_similarity in style_similarities:
+            legacy_hybrid_scale(sparse, dense, style_similarity)
+
+    def numpy_wire():
+        dense = embedding[0]
+        for style_similarity in style_similarities:
+            to_wire_format(_ListBackend, *hybrid_scale(sparse, dense, style_similarity))
+
+    def numpy_local():
+        dense = embedding[0]
+        for style_similarity in style_similarities:
+            to_wire_format(_NumpyBackend, *hybrid_scale(sparse, dense, style_similarity))
+
+    results = {}
+    for name, fn in (("legacy_lists", legacy), ("numpy_wire", numpy_wire), ("numpy_local", numpy_local)):
+        seconds = min(timeit.repeat(fn, number=queries, repeat=3))
+        results[name] = {
+            "us_per_query": round(seconds / queries * 1e6, 2),
+            "max_qps_single_core": round(queries / seconds),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark per-query hybrid scaling overhead.")
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--dimension", type=int, default=512)
+    args = parser.parse_args()
+    print(json.dumps(run(args.queries, args.dimension), indent=2))
@@ -0,0 +1,115 @@
+"""
+Import-time report for a module, from python -X importtime
+
+Imports the module in fresh interpreters, keeps each module's fastest
+run and lists the most expensive imports, cumulative and self. Heavy
+dependencies that should only load on first use (torch, transformers,
+LangChain, LangSmith, Pinecone, pandas, matplotlib) are flagged if the
+import pulls them in.
+
+    python -m benchmarks.bench_import_time api_server --output import_time.json
+    python -m benchmarks.bench_import_time api_server --baseline import_time.json --budget-ms 1000
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+
+LAZY_MODULES = (
+    "torch", "transformers", "langchain_openai", "langchain_groq", "langchain_community",
+    "langsmith", "pinecone", "pinecone_text", "pandas", "matplotlib",
+)
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def parse_importtime(stderr):
+    """{module: (self_us, cumulative_us, depth)} from -X importtime output"""
+    modules = {}
+    for line in stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            depth = (len(match.group(3)) - 1) // 2
+            modules[match.group(4)] = (int(match.group(1)), int(match.group(2)), depth)
+    return modules
+
+
+def measure_imports(module, repeats=3, cwd=None):
+    """Per-module import times (fastest of repeats fresh interpreters)"""
+    best = {}
+    for _ in range(repeats):
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True, text=True, cwd=cwd
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{completed.stderr[-2000:]}")
+        for name, (self_us, cumulative_us, depth) in parse_importtime(completed.stderr).items():
+            previous = best.get(name)
+            if previous is None or cumulative_us < previous[1]:
+                best[name] = (self_us, cumulative_us, depth)
+    return best
+
+
+def report(module, repeats=3, top=25, cwd=None):
+    modules = measure_imports(module, repeats, cwd)
+    total_us = modules[module][1] if module in modules else sum(c for _, c, d in modules.values() if d == 0)
+
+    def rows(key):
+        ranked = sorted(modules.items(), key=lambda item: item[1][key], reverse=True)[:top]
+        return [
+            {"module": name, "self_ms": round(s / 1000, 2), "cumulative_ms": round(c / 1000, 2), "depth": d}
+            for name, (s, c, d) in ranked
+        ]
+
+    return {
+        "module": module,
+        "python": sys.version.split()[0],
+        "total_ms": round(total_us / 1000, 2),
+        "modules_imported": len(modules),
+        "lazy_modules_loaded": sorted({name.split(".")[0] for name in modules} & set(LAZY_MODULES)),
+        "top_cumulative": rows(1),
+        "top_self": rows(0),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report per-module import times of a module.")
+    parser.add_argument("module", nargs="?", default="api_server")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--output", default=None, help="JSON file the report is written to (stdout if not given)")
+    parser.add_argument("--baseline", default=None, help="Earlier report to compare the total against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown against the baseline")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail if the import takes longer")
+    args = parser.parse_args()
+
+    result = report(args.module, args.repeats, args.top, cwd=os.getcwd())
+    failures = []
+    if result["lazy_modules_loaded"]:
+        failures.append(f"imports heavy dependencies eagerly: {', '.join(result['lazy_modules_loaded'])}")
+    if args.budget_ms is not None and result["total_ms"] > args.budget_ms:
+        failures.append(f"import took {result['total_ms']} ms, budget {args.budget_ms} ms")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        result["baseline_total_ms"] = baseline["total_ms"]
+        if result["total_ms"] > baseline["total_ms"] * (1 + args.tolerance):
+            failures.append(f"import took {result['total_ms']} ms, baseline {baseline['total_ms']} ms")
+    result["failures"] = failures
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    else:
+        print(json.dumps(result, indent=2))
+
+    print(f"import {args.module}: {result['total_ms']} ms, {result['modules_imported']} modules", file=sys.stderr)
+    for row in result["top_cumulative"][:10]:
+        print(f"  {row['cumulative_ms']:>10.2f} ms  {row['module']}", file=sys.stderr)
+    for failure in failures:
+        print(f"FAIL {failure}", file=sys.stderr)
+    if failures:
+        raise SystemExit(1)
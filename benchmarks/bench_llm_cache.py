@@ -0,0 +1,73 @@
+"""
+Benchmark of the LLM response cache on a regenerated campaign
+
+Runs the same campaign twice into fresh output files against the fixture
+pages and a fake chat model with fixed latency: once with a cold LLM cache
+and once with the cache filled by the first run, as when a campaign is
+regenerated after a downstream failure. Reports provider calls, wall time
+and the tokens and seconds the cache saved.
+
+    python -m benchmarks.bench_llm_cache --pairs 32 --llm-latency 0.5
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+from src.llm import register_llm, set_llm_cache
+from src.llm_cache import LLMCache
+from src.campaign import run_campaign
+from src.data_processing import load_inventory_data, process_inventory_data
+from benchmarks.stubs import FakeChatModel, make_bm25, serve_fixtures, make_stub_state
+from benchmarks.suite import make_catalog
+
+
+def run(pairs=32, catalog_size=200, llm_latency=0.5, concurrency=8):
+    with tempfile.TemporaryDirectory() as tmp:
+        inventory_df = process_inventory_data(load_inventory_data(make_catalog(catalog_size, tmp)))
+        bm25_model = make_bm25()
+        bm25_model.fit(inventory_df["Description"])
+        state = make_stub_state(inventory_df, bm25_model)
+
+        llm = FakeChatModel(latency=llm_latency)
+        register_llm(llm)
+        cache = LLMCache(os.path.join(tmp, "llm.sqlite"))
+        set_llm_cache(cache)
+        base_url, server = serve_fixtures()
+
+        # Distinct URLs serving the same pages, so every pair is scraped and extracted
+        input_path = os.path.join(tmp, "pairs.csv")
+        with open(input_path, "w") as f:
+            f.write("product_url,client_url\n")
+            for i in range(pairs):
+                f.write(f"{base_url}/product.html?p={i},{base_url}/client.html?c={i}\n")
+
+        results = []
+        try:
+            for label in ("cold", "warm"):
+                calls = llm.calls
+                start = time.perf_counter()
+                stats = run_campaign(
+                    input_path, os.path.join(tmp, f"emails_{label}.jsonl"), state,
+                    "Garment manufacturer", concurrency=concurrency
+                )
+                results.append({
+                    "run": label,
+                    "succeeded": stats.succeeded,
+                    "llm_calls": llm.calls - calls,
+                    "wall_s": round(time.perf_counter() - start, 3),
+                })
+        finally:
+            server.shutdown()
+            set_llm_cache(None)
+        return {"cache": cache.stats(), "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark a campaign re-run against a warm LLM response cache.")
+    parser.add_argument("--pairs", type=int, default=32)
+    parser.add_argument("--catalog-size", type=int, default=200)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per fake LLM call")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+    print(json.dumps(run(args.pairs, args.catalog_size, args.llm_latency, args.concurrency), indent=2))
@@ -0,0 +1,78 @@
+"""
+Benchmark of micro-batched CLIP query embedding under concurrent load
+
+Closed-loop clients, each embedding one query at a time, call
+CLIPModelWrapper.embed_query with and without micro-batching; reports
+throughput and p50/p99 latency per concurrency level. Uses the randomly
+initialized tiny CLIP from benchmarks/stubs.py unless --model is given.
+
+    python -m benchmarks.bench_microbatch --concurrency 1 4 16 64
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+import threading
+import numpy as np
+from src.models.clip_model import CLIPModelWrapper
+from benchmarks.stubs import make_tiny_clip
+
+QUERIES = [
+    "Fabric: 100% cotton velvet; Description: Men's single-breasted velvet blazer",
+    "Fabric: 78% wool, 22% polyamide; Description: Double-breasted overcoat",
+    "Fabric: 64% wool, 26% viscose, 10% others; Description: Slim fit suit jacket",
+    "Fabric: 100% linen; Description: Unstructured summer blazer",
+]
+
+
+def run_clients(clip_model, concurrency, requests_per_client):
+    """Latencies (seconds) and wall time of concurrency closed-loop clients"""
+    latencies = [[] for _ in range(concurrency)]
+
+    def client(i):
+        for n in range(requests_per_client):
+            start = time.perf_counter()
+            clip_model.embed_query(QUERIES[(i + n) % len(QUERIES)])
+            latencies[i].append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return np.concatenate(latencies), time.perf_counter() - start
+
+
+def run(model=None, concurrency=(1, 4, 16, 64), requests=256, max_batch_size=32, max_wait=0.0):
+    with tempfile.TemporaryDirectory() as tmp:
+        clip_model = CLIPModelWrapper(model_name=model or make_tiny_clip(os.path.join(tmp, "tiny-clip")))
+        clip_model.embed_query(QUERIES[0])  # warm up
+
+        results = []
+        for batched in (False, True):
+            if batched:
+                clip_model.enable_micro_batching(max_batch_size, max_wait)
+            for level in concurrency:
+                latencies, wall = run_clients(clip_model, level, max(1, requests // level))
+                results.append({
+                    "micro_batching": batched,
+                    "concurrency": level,
+                    "requests": len(latencies),
+                    "qps": round(len(latencies) / wall, 1),
+                    "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 2),
+                    "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 2),
+                })
+        return {"batcher": clip_model.text_batcher.stats(), "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark micro-batched query embedding under concurrency.")
+    parser.add_argument("--model", default=None, help="CLIP model id or path (default: tiny random CLIP)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=0)
+    args = parser.parse_args()
+    print(json.dumps(run(args.model, args.concurrency, args.requests, args.max_batch_size, args.max_wait_ms / 1000), indent=2))
@@ -0,0 +1,298 @@
+"""
+Deterministic offline stand-ins for the scraper, LLM calls, the vector
+index, CLIP and the BM25 tokenizer
+
+Used by the benchmarks so the pipeline can be timed without network access.
+"""
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+import numpy as np
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pinecone_text.sparse import BM25Encoder
+from src.local_index import LocalHybridIndex
+from src.models.bm25_model import BM25ModelWrapper
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+PRODUCT_INFO = {
+    "brand": "Dudalina",
+    "fabric composition": "100% cotton velvet",
+    "garment description": "Men's single-breasted velvet blazer with patch pockets",
+}
+
+CLIENT_INFO = {
+    "company": "Dudalina",
+    "description": "Brazilian fashion brand known for shirts and tailoring",
+}
+
+
+def make_stub_loader(latency=0.2, page_text="Stub page content"):
+    """load_web_content stand-in: sleeps latency seconds and returns page_text"""
+    def load_page(url):
+        time.sleep(latency)
+        return f"{page_text} ({url})"
+    return load_page
+
+
+def make_stub_extractor(result, latency=0.5):
+    """extract_*_info stand-in: sleeps latency seconds and returns a copy of result"""
+    def extract(page_data):
+        time.sleep(latency)
+        return dict(result)
+    return extract
+
+
+def make_stub_email_generator(latency=1.0):
+    """generate_sales_email stand-in"""
+    def generate_email(company_description, client_info, sample_products, popular_styles, fabrics_descriptions, quiet=True):
+        time.sleep(latency)
+        return f"Dear {client_info.get('company', 'team')}, we would like to send you samples of {', '.join(popular_styles)}."
+    return generate_email
+
+
+class OfflineBM25Encoder(BM25Encoder):
+    def __init__(self, b=0.75, k1=1.2):
+        """
+        BM25Encoder tokenizing with a regex (lowercased words, no stopword
+        removal or stemming) instead of NLTK, whose data it does not need
+        """
+        self.b = b
+        self.k1 = k1
+        self._tokenizer = lambda text: re.findall(r"\w+", text.lower())
+        self.doc_freq = None
+        self.n_docs = None
+        self.avgdl = None
+
+
+_nltk_missing = False
+
+
+def make_bm25():
+    """
+    BM25ModelWrapper, on an OfflineBM25Encoder when NLTK's data (punkt_tab,
+    stopwords) is not installed and cannot be downloaded
+
+    Only tokenization differs, so the wrapper's fit and encode code is the
+    one measured either way; see bm25_tokenizer for which one was used.
+    """
+    global _nltk_missing
+    if not _nltk_missing:
+        try:
+            return BM25ModelWrapper()
+        except LookupError:
+            _nltk_missing = True
+            print("NLTK data not available, BM25 tokenizes with OfflineBM25Encoder's regex", file=sys.stderr)
+    return BM25ModelWrapper(encoder=OfflineBM25Encoder())
+
+
+def bm25_tokenizer():
+    """Tokenizer behind make_bm25's encoders so far, nltk or regex"""
+    return "regex" if _nltk_missing else "nltk"
+
+
+class FakeCLIP:
+    def __init__(self, dimension=512, latency=0.0):
+        """CLIPModelWrapper stand-in returning deterministic unit vectors seeded by the input"""
+        self.dimension = dimension
+        self.latency = latency
+        self.model_name = "fake-clip"
+        self.embedding_cache = None
+
+    def _vector(self, seed_text):
+        rng = np.random.default_rng(zlib.crc32(str(seed_text).encode()))
+        vector = rng.normal(size=self.dimension).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def _matrix(self, items):
+        time.sleep(self.latency * len(items))
+        if not items:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        return np.ascontiguousarray(np.stack([self._vector(item) for item in items]))
+
+    def embed_texts(self, queries, batch_size=None):
+        return self._matrix(list(queries))
+
+    def embed_query(self, query):
+        return self._matrix([query])[0]
+
+    def embed_images(self, image_paths, batch_size=None):
+        return self._matrix(list(image_paths))
+
+    def get_image_embeddings(self, images, batch_size=None):
+        return self._matrix([getattr(image, "size", i) for i, image in enumerate(images)])
+
+
+def make_stub_state(inventory_df, bm25_model, dimension=512, index=None):
+    """A ServiceState-like bundle over an index (a LocalHybridIndex by default) filled with fake image vectors"""
+    clip_model = FakeCLIP(dimension)
+    index = index if index is not None else LocalHybridIndex(dimension)
+    dense = clip_model.embed_images(inventory_df["Image"].tolist())
+    sparse = bm25_model.encode_documents(inventory_df["Description"].tolist())
+    index.upsert([
+        {"id": row["style"], "values": vector, "sparse_values": sparse_vector, "metadata": row}
+        for row, vector, sparse_vector in zip(inventory_df.to_dict("records"), dense, sparse)
+    ])
+    return SimpleNamespace(clip_model=clip_model, bm25_model=bm25_model, inventory_df=inventory_df, index=index)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model answering the project's prompts offline
+
+    Extraction prompts get PRODUCT_INFO / CLIENT_INFO as JSON, anything else
+    a short email. Each call sleeps latency seconds, plus token_latency per
+    streamed chunk, and reports word counts as token usage.
+    """
+    latency: float = 0.5
+    token_latency: float = 0.0
+    calls: int = 0
+
+    @property
+    def _llm_type(self):
+        return "fake-chat"
+
+    def _respond(self, messages):
+        prompt = messages[-1].content
+        if "'brand', 'fabric composition'" in prompt:
+            return json.dumps(PRODUCT_INFO)
+        if "potential client" in prompt:
+            return json.dumps(CLIENT_INFO)
+        return (
+            "Subject: Samples for your next collection\n\n"
+            "Dear team, we would like to send you our catalog and samples of velvet blazers "
+            "matching your range. Could we schedule a call next week?"
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        content = self._respond(messages)
+        # Word counts stand in for token usage
+        input_tokens = sum(len(message.content.split()) for message in messages)
+        output_tokens = len(content.split())
+        message = AIMessage(content=content, usage_metadata={
+            "input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens
+        })
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        for word in self._respond(messages).split(" "):
+            time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    latency = 0.0
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_fixtures(directory=FIXTURES_DIR, latency=0.0):
+    """
+    Serve the fixture HTML pages on a local port, so scraping runs through
+    the real loader without leaving the machine
+
+    Return:
+      - the base URL (e.g. http://127.0.0.1:54321)
+      - the server; call shutdown() when done
+    """
+    handler = type("FixtureHandler", (_QuietHandler,), {"latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(handler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}", server
+
+
+class FakePineconeIndex:
+    # Like the Pinecone client, takes plain lists (see src.search.to_wire_format)
+    accepts_numpy = False
+
+    def __init__(self, dimension=512, latency=0.0):
+        """
+        Pinecone index handle stand-in: a LocalHybridIndex behind the
+        Pinecone subset of its API, sleeping latency seconds per request
+        to model the network round trip
+        """
+        self._index = LocalHybridIndex(dimension)
+        self.latency = latency
+        self.requests = 0
+
+    def _request(self):
+        self.requests += 1
+        time.sleep(self.latency)
+
+    def upsert(self, vectors):
+        self._request()
+        return self._index.upsert(vectors)
+
+    def fetch(self, ids):
+        self._request()
+        return self._index.fetch(ids)
+
+    def delete(self, ids):
+        self._request()
+        return self._index.delete(ids)
+
+    def query(self, top_k, vector=None, sparse_vector=None, include_metadata=False, **kwargs):
+        self._request()
+        return self._index.query(top_k, vector=vector, sparse_vector=sparse_vector, include_metadata=include_metadata)
+
+    def describe_index_stats(self):
+        self._request()
+        return self._index.describe_index_stats()
+
+
+def make_tiny_clip(path, projection_dim=512, seed=0):
+    """
+    Save a randomly initialized two-layer CLIP to path, loadable with
+    CLIPModelWrapper(model_name=path) without downloading anything
+
+    The real model's image preprocessing and output dimension are kept;
+    the tokenizer is byte-level with no merges.
+    """
+    import torch
+    from transformers import CLIPConfig, CLIPModel, CLIPImageProcessor, CLIPProcessor, CLIPTokenizer
+    from transformers.models.clip.tokenization_clip import bytes_to_unicode
+
+    if os.path.exists(os.path.join(path, "config.json")):
+        return path
+    os.makedirs(path, exist_ok=True)
+    symbols = list(bytes_to_unicode().values())
+    vocab = {token: i for i, token in enumerate(
+        symbols + [symbol + "</w>" for symbol in symbols] + ["<|startoftext|>", "<|endoftext|>"]
+    )}
+    with open(os.path.join(path, "vocab.json"), "w") as f:
+        json.dump(vocab, f)
+    with open(os.path.join(path, "merges.txt"), "w") as f:
+        f.write("#version: 0.2\n")
+    tokenizer = CLIPTokenizer(os.path.join(path, "vocab.json"), os.path.join(path, "merges.txt"), model_max_length=77)
+
+    layers = dict(hidden_size=32, intermediate_size=64, num_attention_heads=4, num_hidden_layers=2)
+    config = CLIPConfig(
+        text_config=dict(
+            layers, vocab_size=len(vocab), bos_token_id=vocab["<|startoftext|>"],
+            eos_token_id=vocab["<|endoftext|>"], pad_token_id=vocab["<|endoftext|>"]
+        ),
+        vision_config=dict(layers, image_size=224, patch_size=32),
+        projection_dim=projection_dim
+    )
+    torch.manual_seed(seed)
+    CLIPModel(config).save_pretrained(path)
+    CLIPProcessor(image_processor=CLIPImageProcessor(), tokenizer=tokenizer).save_pretrained(path)
+    return path
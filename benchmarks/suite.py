@@ -0,0 +1,321 @@
+"""
+Offline benchmark suite over every stage, at several catalog sizes
+
+Every external dependency is replaced by a local stand-in (see
+benchmarks/stubs.py): a synthetic catalog of generated JPEGs, a randomly
+initialized two-layer CLIP, a Pinecone-like index with configurable
+round-trip latency, fixture HTML pages served on localhost and a fake chat
+model with configurable latency. Results are written as JSON; pass an
+earlier run as --baseline to flag stages that got slower.
+
+    python -m benchmarks.suite --sizes 100 1000 10000 --output benchmarks/results/run.json
+    python -m benchmarks.suite --baseline benchmarks/results/run.json --output new.json
+"""
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from contextlib import redirect_stdout
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+from PIL import Image
+import main
+from src.data_processing import load_inventory_data, process_inventory_data
+from src.models.clip_model import CLIPModelWrapper
+from src.pinecone_utils import upsert_inventory_to_pinecone
+from src.search import hybrid_scale, search_multi_alpha
+from src.llm import register_llm
+from benchmarks.stubs import (
+    FakeChatModel, FakePineconeIndex, make_bm25, bm25_tokenizer, make_stub_state, make_tiny_clip, serve_fixtures
+)
+
+FIBERS = ["wool", "polyester", "viscose", "cotton", "polyamide", "elastane", "linen", "silk", "cashmere", "acetate"]
+
+QUERIES = [
+    "Shell: 100% cotton velvet, Lining: 100% viscose",
+    "Shell: 78% wool, 22% polyamide, Lining: 100% polyester",
+    "Men's single-breasted wool blazer with patch pockets",
+    "Shell: 64% wool, 26% viscose, 10% others, Lining: 61% polyester, 39% cotton",
+]
+
+
+def _composition(rng):
+    fibers = rng.choice(FIBERS, size=rng.integers(1, 4), replace=False)
+    shares = np.sort(rng.integers(1, 100, size=len(fibers) - 1))
+    percents = np.diff(np.concatenate([[0], shares, [100]]))
+    return ",".join(f"{percent}%{fiber}" for percent, fiber in zip(percents, fibers) if percent)
+
+
+def make_catalog(size, directory, distinct_images=32, distinct_compositions=400, seed=0):
+    """
+    Write a synthetic inventory CSV of size rows in the source format
+
+    Rows cycle over distinct_images generated 640x480 JPEGs and draw their
+    fabric and lining compositions from distinct_compositions variants, so
+    the data repeats the way a real catalog does.
+    """
+    rng = np.random.default_rng(seed)
+    image_dir = os.path.join(directory, "images")
+    os.makedirs(image_dir, exist_ok=True)
+    images = []
+    for i in range(distinct_images):
+        path = os.path.join(image_dir, f"IMG_{i:04d}.jpg")
+        if not os.path.exists(path):
+            gradient = np.linspace(0, 255, 640, dtype=np.float32)[None, :, None]
+            pixels = gradient * rng.random((480, 1, 3)) + rng.normal(0, 20, (480, 640, 3))
+            Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(path, quality=90)
+        images.append(path)
+
+    compositions = [_composition(rng) for _ in range(distinct_compositions)]
+    csv_path = os.path.join(directory, f"inventory_{size}.csv")
+    pd.DataFrame({
+        "Image": [images[i % distinct_images] for i in range(size)],
+        "style": [f"ST-{i:07d}" for i in range(size)],
+        "fabric composition": rng.choice(compositions, size=size),
+        "lining composition": rng.choice(compositions, size=size),
+    }).to_csv(csv_path, index=False)
+    return csv_path
+
+
+def measure(fn, repeats=3, setup=None):
+    """
+    Wall-clock seconds of repeats calls of fn
+
+    Args:
+      - setup: called before each run (untimed); its return value is passed to fn
+    """
+    seconds = []
+    for _ in range(repeats):
+        args = setup() if setup is not None else None
+        start = time.perf_counter()
+        fn(args) if setup is not None else fn()
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def _record(stage, size, items, seconds):
+    median = statistics.median(seconds)
+    return {
+        "stage": stage,
+        "size": size,
+        "items": items,
+        "repeats": len(seconds),
+        "min_ms": round(min(seconds) * 1000, 3),
+        "median_ms": round(median * 1000, 3),
+        "mean_ms": round(statistics.fmean(seconds) * 1000, 3),
+        "items_per_s": round(items / median, 2) if median else None,
+    }
+
+
+def bench_fixed(clip_model, repeats, queries=1000):
+    """Stages whose cost does not depend on the catalog size"""
+    rng = np.random.default_rng(0)
+    dense = rng.normal(size=512).astype(np.float32)
+    sparse = {"indices": rng.integers(0, 2**32, size=12).tolist(), "values": rng.random(12).tolist()}
+    bm25_model = make_bm25()
+    bm25_model.fit(QUERIES)
+    texts = (QUERIES * (64 // len(QUERIES) + 1))[:64]
+
+    def scale():
+        for _ in range(queries):
+            hybrid_scale(sparse, dense, 0)
+            hybrid_scale(sparse, dense, 1)
+
+    def encode_queries():
+        for _ in range(queries // len(QUERIES)):
+            for query in QUERIES:
+                bm25_model.encode_queries(query)
+
+    return [
+        _record("hybrid_scale", None, queries, measure(scale, repeats)),
+        _record("bm25_encode_queries", None, queries, measure(encode_queries, repeats)),
+        _record("clip_embed_texts", None, len(texts), measure(lambda: clip_model.embed_texts(texts), repeats)),
+    ]
+
+
+def bench_size(csv_path, size, clip_model, repeats, max_embed, index_latency, search_queries=200):
+    """Inventory processing, BM25, CLIP, upsert and search at one catalog size"""
+    results = [_record(
+        "process_inventory_data", size, size,
+        measure(lambda: process_inventory_data(load_inventory_data(csv_path)), repeats)
+    )]
+    inventory_df = process_inventory_data(load_inventory_data(csv_path))
+    descriptions = inventory_df["Description"]
+
+    bm25_model = make_bm25()
+    results.append(_record("bm25_fit", size, size, measure(lambda: bm25_model.fit(descriptions), repeats)))
+    results.append(_record(
+        "bm25_encode_documents", size, size, measure(lambda: bm25_model.encode_documents(descriptions), repeats)
+    ))
+
+    # Image stages are capped: CLIP cost is linear in the images embedded
+    embed_rows = inventory_df.head(min(size, max_embed))
+    image_paths = embed_rows["Image"].tolist()
+    results.append(_record(
+        "clip_embed_images", size, len(image_paths), measure(lambda: clip_model.embed_images(image_paths), repeats)
+    ))
+
+    def upsert(index):
+        with redirect_stdout(io.StringIO()):
+            upsert_inventory_to_pinecone(index, embed_rows, clip_model, bm25_model)
+    results.append(_record(
+        "upsert_inventory_to_pinecone", size, len(embed_rows),
+        measure(upsert, repeats, setup=lambda: FakePineconeIndex(latency=index_latency))
+    ))
+
+    rng = np.random.default_rng(1)
+    query_vectors = rng.normal(size=(search_queries, 512)).astype(np.float32)
+    query_sparse = [bm25_model.encode_queries(QUERIES[i % len(QUERIES)]) for i in range(search_queries)]
+    for stage, index in (
+        ("search_local_index", None),
+        ("search_pinecone_index", FakePineconeIndex(latency=index_latency)),
+    ):
+        state = make_stub_state(inventory_df, bm25_model, index=index)
+
+        def search():
+            for sparse, dense in zip(query_sparse, query_vectors):
+                search_multi_alpha(state.index, sparse, dense, [0, 1])
+        results.append(_record(stage, size, search_queries, measure(search, repeats)))
+    return results, inventory_df, bm25_model
+
+
+def bench_pipeline(inventory_df, bm25_model, size, repeats, base_url, index_latency):
+    """main.main end to end: fixture pages, fake LLM, stub CLIP and a Pinecone-like index"""
+    state = make_stub_state(inventory_df, bm25_model, index=FakePineconeIndex(latency=index_latency))
+    context = SimpleNamespace(state=state)
+
+    def run():
+        main.main(
+            product_url=f"{base_url}/product.html",
+            client_url=f"{base_url}/client.html",
+            context=context,
+            out=io.StringIO()
+        )
+    return _record("main_pipeline", size, 1, measure(run, repeats))
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance=0.25):
+    """Stages whose median got more than tolerance slower than in baseline"""
+    previous = {(r["stage"], r["size"]): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = previous.get((result["stage"], result["size"]))
+        if before is None or not before["median_ms"]:
+            continue
+        ratio = result["median_ms"] / before["median_ms"]
+        if ratio > 1 + tolerance:
+            regressions.append({
+                "stage": result["stage"],
+                "size": result["size"],
+                "baseline_ms": before["median_ms"],
+                "median_ms": result["median_ms"],
+                "ratio": round(ratio, 2),
+            })
+    return regressions
+
+
+def run(sizes=(100, 1000, 10000), repeats=3, max_embed=1000, llm_latency=0.5, page_latency=0.05,
+        index_latency=0.0, pipeline_size=None, workdir=None):
+    """
+    Run the suite
+
+    Args:
+      - sizes: catalog sizes (rows)
+      - max_embed: cap on the rows run through CLIP (clip_embed_images, upsert)
+      - llm_latency: seconds per fake LLM call
+      - page_latency: seconds per fixture page request
+      - index_latency: seconds per fake Pinecone request
+      - pipeline_size: catalog size of the main_pipeline run, the largest size if None
+      - workdir: where the catalog and tiny CLIP are written, a temporary directory if None
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = workdir or tmp
+        clip_model = CLIPModelWrapper(model_name=make_tiny_clip(os.path.join(workdir, "tiny-clip")))
+        llm = FakeChatModel(latency=llm_latency)
+        register_llm(llm)
+        base_url, server = serve_fixtures(latency=page_latency)
+
+        results = bench_fixed(clip_model, repeats)
+        pipeline_size = pipeline_size or max(sizes)
+        try:
+            for size in sorted(sizes):
+                csv_path = make_catalog(size, workdir)
+                size_results, inventory_df, bm25_model = bench_size(
+                    csv_path, size, clip_model, repeats, max_embed, index_latency
+                )
+                results.extend(size_results)
+                if size == pipeline_size:
+                    results.append(bench_pipeline(inventory_df, bm25_model, size, repeats, base_url, index_latency))
+                print(f"size {size} done", file=sys.stderr)
+        finally:
+            server.shutdown()
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "parameters": {
+                "sizes": list(sizes), "repeats": repeats, "max_embed": max_embed, "llm_latency": llm_latency,
+                "page_latency": page_latency, "index_latency": index_latency, "pipeline_size": pipeline_size,
+            },
+            "llm_calls": llm.calls,
+            # BM25 stages are only comparable between runs with the same tokenizer
+            "bm25_tokenizer": bm25_tokenizer(),
+        },
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every stage offline at several catalog sizes.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--max-embed", type=int, default=1000)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--page-latency", type=float, default=0.05)
+    parser.add_argument("--index-latency", type=float, default=0.0)
+    parser.add_argument("--pipeline-size", type=int, default=None)
+    parser.add_argument("--workdir", default=None, help="Keep the catalog and tiny CLIP here between runs")
+    parser.add_argument("--output", default=None, help="JSON file results are written to (stdout if not given)")
+    parser.add_argument("--baseline", default=None, help="Earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before a stage is flagged")
+    args = parser.parse_args()
+
+    report = run(args.sizes, args.repeats, args.max_embed, args.llm_latency, args.page_latency,
+                 args.index_latency, args.pipeline_size, args.workdir)
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["regressions"] = compare(report["results"], json.load(f), args.tolerance)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    for result in report["results"]:
+        print(f"{result['stage']:<30} {str(result['size']):>7} {result['median_ms']:>12.3f} ms", file=sys.stderr)
+    if report.get("regressions"):
+        for regression in report["regressions"]:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        raise SystemExit(1)
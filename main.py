@@ -1,23 +1,49 @@
 import os
+import sys
 import argparse
 import logging
 from src.config import load_environment, print_environment_variables
-from src.web_scraping import load_web_content, extract_product_info, extract_client_info
-from src.data_processing import load_inventory_data, process_inventory_data
-from src.models.clip_model import CLIPModelWrapper
-from src.models.bm25_model import BM25ModelWrapper
-from src.pinecone_utils import setup_pinecone_index, upsert_inventory_to_pinecone
-from src.search import search_by_fabric, search_by_likeliness, collect_search_results
-from src.visualization import show_matched_images
-from src.email_generator import generate_sales_email
-from src.evaluation import setup_evaluation_dataset, evaluate_email
-from langchain_openai import ChatOpenAI
-from langchain_groq import ChatGroq
+from src.service import ServiceContext
+from src.timing import StageTimer
+from src.async_pipeline import run_pipeline
+from src.campaign import run_campaign, parse_rate_limits
+from src.evaluation import setup_evaluation_queue
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-def main(product_url=None, client_url=None, quiet=True):
+# Description of the seller used in the email prompt
+COMPANY_DESCRIPTION = '''
+    ### About Us:
+
+    AIRRY GARMENTS CO., LTD. is a seasoned garment manufacturer. The company specializes in producing high-quality men's and ladies' suits, blazers, trousers, jackets, coats, and overcoats.
+
+    Most of AIRRY's production is destined for European department stores and boutiques, but for the past ten years, AIRRY has supplied designer garments for North and South American clients, replacing their European suppliers with compelling price points and state-of-the-art production and supply chain management capabilities.
+
+    AIRRY has one owned factory and two contracted factories with over 1,000 total staff, offering economy of scale and flexibility in production quantity.
+
+    ### Our Differentiations:
+
+    AIRRY is an experienced client-centric garment supplier whose passion for fashion aesthetics runs deep.
+
+    We develop trendy new samples every season. Our innovative fabric, colorway and design often provide inspiration to our clients. Our team members possess a sense of style and can offer our clients design support and industry insights when needed.
+
+    Unlike most clothing suppliers with a strict minimum order quantity, AIRRY offers quantity flexibility and welcomes special detail or craftsmanship requests. Our manufacturing and supply chain management capabilities can make your design a reality.
+
+    ## Key Competitive Advantages:
+
+    1. 20+ Years of Experience We have specialized in garment production for over two decades and have partnered with clients worldwide.
+
+    2. Best Value via Supply Chain Advantage We can get the best prices from fabric and accessory suppliers offering the highest quality goods to deliver maximum value to clients.
+
+    3. Comprehensive R&D Capabilities We develop new styles to add to our huge showroom collection every season and show them to our clients. Also, we can quickly fulfill clients' patterns, materials, and sample creation requests.
+
+    4. Unmatched Flexibility We accept order quantities from 100 to 10,000+ pieces per style and welcome requests for special garment details.
+
+    5. Piece-by-Piece Inspection Before shipments, our dedicated and well-trained Quality Control team inspects every piece of the finished goods.
+    '''
+
+def main(product_url=None, client_url=None, quiet=True, context=None, timer=None, out=None, evaluation=None):
     """
     Main function to generate sales email based on product and client URLs
     
@@ -25,150 +51,94 @@ def main(product_url=None, client_url=None, quiet=True):
         product_url: URL for the product page
         client_url: URL for the client's page
         quiet: If True, suppresses most print output for API usage
+        context: a loaded ServiceContext to reuse; a one-off context is built if None
+        timer: optional StageTimer that receives the per-stage latency breakdown
+        out: text stream progress is printed to, sys.stdout if None (the API
+            passes a per-job buffer instead of redirecting sys.stdout)
+        evaluation: optional EvaluationQueue the email is handed to; it is
+            scored in the background, so this call does not wait for it
     
     Returns:
         The generated email content
     """
-    # Load environment variables
-    load_environment()
+    if timer is None:
+        timer = StageTimer()
+    if out is None:
+        out = sys.stdout
+
+    # Load environment variables (a shared context already did this at startup)
+    if context is None:
+        load_environment()
     if not quiet:
         print_environment_variables()
     
     # Configure the model
     model_name = os.getenv("GROQ_MODEL_NAME_1")
     if not quiet:
-        print(f"Using model: {model_name}")
+        print(f"Using model: {model_name}", file=out)
     
     # Test LLM connections (only in verbose mode)
     if not quiet:
-        print("Testing OpenAI connection...")
+        from langchain_openai import ChatOpenAI
+        from langchain_groq import ChatGroq
+
+        print("Testing OpenAI connection...", file=out)
         llm_openai = ChatOpenAI()
         response_openai = llm_openai.invoke("Hello, world!")
-        print(response_openai)
+        print(response_openai, file=out)
         
-        print("Testing Groq connection...")
+        print("Testing Groq connection...", file=out)
         llm_groq = ChatGroq(
             temperature=0,
             model_name=model_name
         )
         response_groq = llm_groq.invoke("Hello, world!")
-        print(response_groq)
+        print(response_groq, file=out)
     
-    # Web scraping
-    if not quiet:
-        print("Scraping product data...")
     if not product_url:
         product_url = "https://www.dudalina.com.br/blazer-de-veludo-com-bolsos-dudalina-masculino-cinza-medio-21-13-0108/p?skuId=16968"
-    page_data_product = load_web_content(product_url)
-    json_res_product = extract_product_info(page_data_product)
-    if not quiet:
-        print(json_res_product)
-    
-    if not quiet:
-        print("Scraping client data...")
     if not client_url:
         client_url = "https://www.dudalina.com.br/quem-somos"
-    page_data_client = load_web_content(client_url)
-    json_res_client = extract_client_info(page_data_client)
+    
+    # Models, inventory and index are loaded once per process by the service context
+    if context is None:
+        print("Loading models, inventory and index...", file=out)
+        context = ServiceContext()
+    
+    # Scraping, extraction, search and email generation; the product and
+    # client branches run concurrently
+    print("Scraping, searching and generating sales email...", file=out)
+    result = run_pipeline(product_url, client_url, context.state, COMPANY_DESCRIPTION, timer=timer)
     if not quiet:
-        print(json_res_client)
-    
-    # Data processing
-    print("Processing inventory data...")
-    inventory_df = load_inventory_data("./images/test_image.csv")
-    inventory_df = process_inventory_data(inventory_df)
-    print(inventory_df.head())
-    
-    # Initialize models
-    print("Initializing models...")
-    clip_model = CLIPModelWrapper()
-    bm25_model = BM25ModelWrapper()
-    bm25_model.fit(inventory_df['Description'])
-    
-    # Setup Pinecone
-    print("Setting up Pinecone...")
-    index = setup_pinecone_index()
-    print(index.describe_index_stats())
-    
-    # Upsert inventory to Pinecone
-    print("Upserting inventory to Pinecone...")
-    upsert_inventory_to_pinecone(index, inventory_df, clip_model, bm25_model)
-    
-    # Search
-    print("Performing search...")
-    query = f"Fabric: {json_res_product['fabric composition']}; Description: {json_res_product['garment description']}"
-    print(f"Search query: {query}")
-    
-    sparse = bm25_model.encode_queries(query)
-    dense = clip_model.get_text_embedding(query).squeeze(0).tolist()
-    
-    # Search by fabric
-    print("Searching by fabric...")
-    fabric_search_result = search_by_fabric(index, sparse, dense)
-    style_names_fabric, image_paths_fabric, composition_desc_fabric = collect_search_results(fabric_search_result)
-    print(style_names_fabric)
-    
-    # Search by likeliness
-    print("Searching by likeliness...")
-    likeliness_search_result = search_by_likeliness(index, sparse, dense)
-    style_names_likeliness, image_paths_likeliness, composition_desc_likeliness = collect_search_results(likeliness_search_result)
-    print(style_names_likeliness)
+        print(result.product_info, file=out)
+        print(result.client_info, file=out)
+    print(f"Search query: {result.query}", file=out)
+    
+    style_names_fabric, image_paths_fabric, composition_desc_fabric, scores_fabric = result.fabric_results
+    print(style_names_fabric, file=out)
+    style_names_likeliness, image_paths_likeliness, composition_desc_likeliness, scores_likeliness = result.likeliness_results
+    print(style_names_likeliness, file=out)
     
     # Visualization
+    # from src.visualization import show_matched_images
     # print("Visualizing search results...")
     # show_matched_images(style_names_fabric, image_paths_fabric, composition_desc_fabric)
     # show_matched_images(style_names_likeliness, image_paths_likeliness, composition_desc_likeliness)
     
-    # Email generation
-    print("Generating sales email...")
-    company_description = '''
-    ### About Us:
-
-    AIRRY GARMENTS CO., LTD. is a seasoned garment manufacturer. The company specializes in producing high-quality men's and ladies' suits, blazers, trousers, jackets, coats, and overcoats.
-
-    Most of AIRRY's production is destined for European department stores and boutiques, but for the past ten years, AIRRY has supplied designer garments for North and South American clients, replacing their European suppliers with compelling price points and state-of-the-art production and supply chain management capabilities.
-
-    AIRRY has one owned factory and two contracted factories with over 1,000 total staff, offering economy of scale and flexibility in production quantity.
-
-    ### Our Differentiations:
-
-    AIRRY is an experienced client-centric garment supplier whose passion for fashion aesthetics runs deep.
-
-    We develop trendy new samples every season. Our innovative fabric, colorway and design often provide inspiration to our clients. Our team members possess a sense of style and can offer our clients design support and industry insights when needed.
-
-    Unlike most clothing suppliers with a strict minimum order quantity, AIRRY offers quantity flexibility and welcomes special detail or craftsmanship requests. Our manufacturing and supply chain management capabilities can make your design a reality.
-
-    ## Key Competitive Advantages:
-
-    1. 20+ Years of Experience We have specialized in garment production for over two decades and have partnered with clients worldwide.
-
-    2. Best Value via Supply Chain Advantage We can get the best prices from fabric and accessory suppliers offering the highest quality goods to deliver maximum value to clients.
-
-    3. Comprehensive R&D Capabilities We develop new styles to add to our huge showroom collection every season and show them to our clients. Also, we can quickly fulfill clients' patterns, materials, and sample creation requests.
-
-    4. Unmatched Flexibility We accept order quantities from 100 to 10,000+ pieces per style and welcome requests for special garment details.
-
-    5. Piece-by-Piece Inspection Before shipments, our dedicated and well-trained Quality Control team inspects every piece of the finished goods.
-    '''
-    
-    email_content = generate_sales_email(
-        company_description,
-        json_res_client,
-        json_res_product,
-        style_names_likeliness,
-        composition_desc_likeliness
-    )
-    print(email_content)
+    email_content = result.email_content
+    print(email_content, file=out)
     
-    # Evaluation
-    print("Setting up evaluation...")
-    dataset_name = setup_evaluation_dataset(email_content)
-    
-    print("Evaluating email...")
-    evaluation_results = evaluate_email(dataset_name)
-    print(evaluation_results)
+    # Evaluation runs in a background stage, off the critical path
+    if evaluation is not None:
+        print("Queued email for evaluation", file=out)
+        evaluation.submit(
+            email_content,
+            client_info=result.client_info,
+            metadata={"product_url": product_url, "client_url": client_url}
+        )
     
-    print("Process completed successfully!")
+    print("Process completed successfully!", file=out)
+    print(f"Latency breakdown: {timer.summary()}", file=out)
     
     # Return the generated email for the API
     return email_content
@@ -178,11 +148,40 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Generate a sales email based on product and client information.')
     parser.add_argument('--product_url', type=str, help='URL of the product page')
     parser.add_argument('--client_url', type=str, help='URL of the client about us page')
+    parser.add_argument('--batch', type=str, help='CSV or JSONL of product_url,client_url pairs to run as a campaign')
+    parser.add_argument('--output', type=str, default='output/campaign.jsonl', help='JSONL file campaign results are appended to')
+    parser.add_argument('--concurrency', type=int, default=8, help='Pairs processed at the same time in batch mode')
+    parser.add_argument('--rate_limit', action='append', help='LLM calls per second per provider, e.g. groq=2 (repeatable)')
     
     args = parser.parse_args()
+    try:
+        rate_limits = parse_rate_limits(args.rate_limit)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    if args.batch:
+        load_environment()
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        stats = run_campaign(
+            args.batch,
+            args.output,
+            ServiceContext().state,
+            COMPANY_DESCRIPTION,
+            concurrency=args.concurrency,
+            rate_limits=rate_limits
+        )
+        print(stats.as_dict())
+        raise SystemExit(0)
     
-    email = main(product_url=args.product_url, client_url=args.client_url)
+    evaluation = setup_evaluation_queue()
+    email = main(product_url=args.product_url, client_url=args.client_url, evaluation=evaluation)
     
     # Print only the email content for the API to capture
     print("\n--- GENERATED EMAIL ---\n")
-    print(email) 
\ No newline at end of file
+    print(email)
+    
+    # The email is out; now wait for its evaluation before exiting
+    if evaluation is not None:
+        print("\nEvaluating email...")
+        evaluation.close()
+        print(evaluation.results[-1] if evaluation.results else evaluation.stats()) 
\ No newline at end of file
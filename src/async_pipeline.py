@@ -0,0 +1,187 @@
+import os
+import asyncio
+import time
+import logging
+import threading
+import contextvars
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from src.query_cache import QuerySearch
+from src.timing import StageTimer
+
+logger = logging.getLogger(__name__)
+
+# Seconds; a timed-out stage raises asyncio.TimeoutError and the caller gets
+# control back at once. The thread running the stage cannot be interrupted:
+# it finishes in the background on the stage executor, holding one of its
+# threads until then.
+DEFAULT_STAGE_TIMEOUTS = {
+    "scrape_product": 30,
+    "scrape_client": 30,
+    "extract_product": 60,
+    "extract_client": 60,
+    "query_embed": 30,
+    "search": 15,
+    "generate_email": 120,
+}
+
+
+_stage_executor = None
+_stage_executor_pid = None
+_stage_executor_lock = threading.Lock()
+
+
+def stage_executor():
+    """
+    Process-wide thread pool blocking stages run on (PIPELINE_STAGE_WORKERS threads)
+
+    Not the event loop's default executor: asyncio.run joins that one on
+    exit, so a timed-out stage still running would hold its caller until
+    it finished. Re-created in a forked child.
+    """
+    global _stage_executor, _stage_executor_pid
+    if _stage_executor is None or _stage_executor_pid != os.getpid():
+        with _stage_executor_lock:
+            if _stage_executor is None or _stage_executor_pid != os.getpid():
+                _stage_executor = ThreadPoolExecutor(
+                    max_workers=int(os.getenv("PIPELINE_STAGE_WORKERS", 64)), thread_name_prefix="pipeline-stage"
+                )
+                _stage_executor_pid = os.getpid()
+    return _stage_executor
+
+
+async def run_blocking(fn, *args, executor=None):
+    """Like asyncio.to_thread (context variables included), on executor or stage_executor()"""
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        executor or stage_executor(), partial(context.run, fn, *args)
+    )
+
+
+class PipelineStages:
+    def __init__(self, load_page=None, extract_product=None, extract_client=None, generate_email=None):
+        """
+        The blocking callables the pipeline runs; swap any of them for stubs
+        to run offline (see benchmarks/bench_async_pipeline.py)
+
+        Unset stages default to the real scraper, extractors and email
+        generator, imported here so that the LangChain stack is only
+        loaded once a pipeline is built.
+        """
+        if None in (load_page, extract_product, extract_client, generate_email):
+            from src.web_scraping import load_web_content, extract_product_info, extract_client_info
+            from src.email_generator import generate_sales_email
+            load_page = load_page or load_web_content
+            extract_product = extract_product or extract_product_info
+            extract_client = extract_client or extract_client_info
+            generate_email = generate_email or generate_sales_email
+        self.load_page = load_page
+        self.extract_product = extract_product
+        self.extract_client = extract_client
+        self.generate_email = generate_email
+
+    @classmethod
+    def for_state(cls, state):
+        """Real stages, going through the state's page and extraction caches when it has them"""
+        from src.web_scraping import load_web_content, extract_product_info, extract_client_info
+        page_cache = getattr(state, "page_cache", None)
+        extraction_cache = getattr(state, "extraction_cache", None)
+        return cls(
+            load_page=partial(load_web_content, cache=page_cache),
+            extract_product=partial(extract_product_info, cache=extraction_cache),
+            extract_client=partial(extract_client_info, cache=extraction_cache)
+        )
+
+
+class PipelineResult:
+    def __init__(self, product_info, client_info, query, fabric_results, likeliness_results, email_content):
+        """Intermediate and final outputs of one generation"""
+        self.product_info = product_info
+        self.client_info = client_info
+        self.query = query
+        self.fabric_results = fabric_results
+        self.likeliness_results = likeliness_results
+        self.email_content = email_content
+
+
+def build_search_query(product_info):
+    """Search query from the extracted product JSON"""
+    return f"Fabric: {product_info['fabric composition']}; Description: {product_info['garment description']}"
+
+
+async def run_pipeline_async(product_url, client_url, state, company_description,
+                             stages=None, timeouts=None, timer=None, generate=True):
+    """
+    Generate an email with independent stages overlapped
+
+    The product branch (scrape, extract, embed query) and the client branch
+    (scrape, extract) run concurrently, so query embedding overlaps client
+    extraction. Search and email generation follow once both are done.
+    Each blocking stage runs in a worker thread under its own timeout.
+
+    Args:
+      - state: a ServiceState (or anything with clip_model, bm25_model and index)
+      - company_description: the seller description passed to the email prompt
+      - stages: PipelineStages, defaults to PipelineStages.for_state(state)
+      - timeouts: per-stage timeouts in seconds, merged over DEFAULT_STAGE_TIMEOUTS
+      - timer: StageTimer receiving per-stage timings; timer.wall is set to the end-to-end time
+      - generate: False stops after search and leaves email_content None,
+        for callers that generate (e.g. stream) the email themselves
+
+    Return:
+      - a PipelineResult
+    """
+    stages = stages or PipelineStages.for_state(state)
+    timeouts = {**DEFAULT_STAGE_TIMEOUTS, **(timeouts or {})}
+    timer = timer if timer is not None else StageTimer()
+    start = time.perf_counter()
+
+    async def run_stage(name, fn, *args):
+        with timer.stage(name):
+            return await asyncio.wait_for(run_blocking(fn, *args), timeouts.get(name))
+
+    async def product_branch():
+        page_data = await run_stage("scrape_product", stages.load_page, product_url)
+        product_info = await run_stage("extract_product", stages.extract_product, page_data)
+        search = QuerySearch(state, build_search_query(product_info))
+        # A repeated query against an unchanged index skips embedding and search
+        cached = search.cached()
+        if cached is not None:
+            return product_info, search, None, None, cached
+        sparse, dense = await run_stage("query_embed", search.embed)
+        return product_info, search, sparse, dense, None
+
+    async def client_branch():
+        page_data = await run_stage("scrape_client", stages.load_page, client_url)
+        return await run_stage("extract_client", stages.extract_client, page_data)
+
+    (product_info, search, sparse, dense, cached), client_info = await asyncio.gather(product_branch(), client_branch())
+    query = search.query
+
+    if cached is not None:
+        fabric_results, likeliness_results = cached
+    else:
+        fabric_results, likeliness_results = await run_stage("search", search.search, sparse, dense)
+
+    if not generate:
+        timer.wall = time.perf_counter() - start
+        return PipelineResult(product_info, client_info, query, fabric_results, likeliness_results, None)
+
+    style_names_likeliness, _, composition_desc_likeliness, _ = likeliness_results
+    email_content = await run_stage(
+        "generate_email",
+        stages.generate_email,
+        company_description,
+        client_info,
+        product_info,
+        style_names_likeliness,
+        composition_desc_likeliness
+    )
+
+    timer.wall = time.perf_counter() - start
+    return PipelineResult(product_info, client_info, query, fabric_results, likeliness_results, email_content)
+
+
+def run_pipeline(product_url, client_url, state, company_description, **kwargs):
+    """Blocking wrapper around run_pipeline_async for synchronous callers"""
+    return asyncio.run(run_pipeline_async(product_url, client_url, state, company_description, **kwargs))
@@ -0,0 +1,208 @@
+import os
+import csv
+import json
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from src.async_pipeline import PipelineStages, DEFAULT_STAGE_TIMEOUTS, build_search_query, run_blocking
+from src.query_cache import QuerySearch
+
+logger = logging.getLogger(__name__)
+
+
+def read_url_pairs(path):
+    """
+    Read (product_url, client_url) pairs from a CSV with those two columns
+    or from a JSONL file with those two keys per line
+    """
+    pairs = []
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if path.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    pairs.append((row["product_url"], row["client_url"]))
+        else:
+            for row in csv.DictReader(f):
+                pairs.append((row["product_url"], row["client_url"]))
+    return pairs
+
+
+def read_completed_pairs(output_path):
+    """Pairs that already have a successful result in a previous run's output"""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by an interrupted run
+                continue
+            if row.get("status") == "success":
+                completed.add((row["product_url"], row["client_url"]))
+    return completed
+
+
+class CampaignStats:
+    def __init__(self):
+        """Progress counters for one campaign run"""
+        self.total = 0
+        self.resumed = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.unique_products = 0
+        self.unique_clients = 0
+        self.elapsed = 0.0
+
+    def as_dict(self):
+        return {
+            "total": self.total,
+            "resumed": self.resumed,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "unique_products": self.unique_products,
+            "unique_clients": self.unique_clients,
+            "elapsed_s": round(self.elapsed, 2),
+            "emails_per_min": round(self.succeeded / self.elapsed * 60, 2) if self.elapsed else 0.0,
+        }
+
+
+async def run_campaign_async(pairs, output_path, state, company_description, concurrency=8,
+                             rate_limits=None, stages=None, timeouts=None, executor=None):
+    """
+    Generate emails for many (product_url, client_url) pairs
+
+    Each product and client URL is scraped and extracted once no matter how
+    many pairs share it, and each product's search runs once. Results are
+    appended to output_path as JSONL as they complete; pairs that already
+    succeeded in output_path are skipped, so an interrupted run resumes.
+
+    Args:
+      - pairs: iterable of (product_url, client_url)
+      - state: a ServiceState (clip_model, bm25_model, index)
+      - concurrency: pairs processed at the same time
+      - rate_limits: {provider: requests per second} for LLM requests actually
+        sent (see src.llm.set_rate_limits), in effect while the campaign runs
+      - stages: PipelineStages, defaults to PipelineStages.for_state(state)
+      - executor: thread pool the blocking stages run on, src.async_pipeline.stage_executor() if None
+
+    Return:
+      - a CampaignStats
+    """
+    stages = stages or PipelineStages.for_state(state)
+    timeouts = {**DEFAULT_STAGE_TIMEOUTS, **(timeouts or {})}
+    stats = CampaignStats()
+
+    pairs = list(dict.fromkeys(pairs))
+    completed = read_completed_pairs(output_path)
+    stats.total = len(pairs)
+    stats.resumed = sum(1 for pair in pairs if pair in completed)
+    pending = [pair for pair in pairs if pair not in completed]
+
+    products = {}
+    clients = {}
+
+    async def run_stage(name, fn, *args):
+        return await asyncio.wait_for(run_blocking(fn, *args, executor=executor), timeouts.get(name))
+
+    async def product_branch(product_url):
+        page_data = await run_stage("scrape_product", stages.load_page, product_url)
+        product_info = await run_stage("extract_product", stages.extract_product, page_data)
+        query = build_search_query(product_info)
+
+        # Products with the same attributes share one embedding and search
+        _, likeliness_results = await run_stage("search", QuerySearch(state, query))
+        return product_info, likeliness_results
+
+    async def client_branch(client_url):
+        page_data = await run_stage("scrape_client", stages.load_page, client_url)
+        return await run_stage("extract_client", stages.extract_client, page_data)
+
+    def once(tasks, url, branch):
+        # Shared by every pair with this URL; a failure is shared too, so a bad page is not retried per pair
+        if url not in tasks:
+            tasks[url] = asyncio.ensure_future(branch(url))
+        return tasks[url]
+
+    async def process(product_url, client_url):
+        (product_info, likeliness_results), client_info = await asyncio.gather(
+            once(products, product_url, product_branch), once(clients, client_url, client_branch)
+        )
+        style_names, _, composition_desc, _ = likeliness_results
+        return await run_stage(
+            "generate_email", stages.generate_email,
+            company_description, client_info, product_info, style_names, composition_desc
+        )
+
+    queue = asyncio.Queue()
+    for pair in pending:
+        queue.put_nowait(pair)
+
+    start = time.perf_counter()
+    with open(output_path, "a", encoding="utf-8") as out:
+        def write(row):
+            out.write(json.dumps(row, ensure_ascii=False) + "\n")
+            out.flush()
+
+        async def worker():
+            while not queue.empty():
+                product_url, client_url = queue.get_nowait()
+                row = {"product_url": product_url, "client_url": client_url}
+                try:
+                    row["email_content"] = await process(product_url, client_url)
+                    row["status"] = "success"
+                    stats.succeeded += 1
+                except Exception as e:
+                    row["status"] = "error"
+                    row["message"] = f"{type(e).__name__}: {str(e)}"
+                    stats.failed += 1
+                    logger.warning(f"Failed {product_url} / {client_url}: {row['message']}")
+                write(row)
+
+        # Imported here so the server process does not load the HTTP client at startup
+        from src.llm import set_rate_limits, restore_rate_limits
+        previous_limits = set_rate_limits(rate_limits) if rate_limits is not None else None
+        try:
+            await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(pending))))))
+        finally:
+            if previous_limits is not None:
+                restore_rate_limits(previous_limits)
+
+    stats.elapsed = time.perf_counter() - start
+    stats.unique_products = len(products)
+    stats.unique_clients = len(clients)
+    logger.info(f"Campaign finished: {stats.as_dict()}")
+    return stats
+
+
+def run_campaign(input_path, output_path, state, company_description, concurrency=8, **kwargs):
+    """Blocking entry point: read pairs from input_path and run the campaign"""
+    pairs = read_url_pairs(input_path)
+
+    # Enough threads that blocking stages never queue. Not the loop's default
+    # executor, which asyncio.run would join, waiting out timed-out stages
+    executor = ThreadPoolExecutor(max_workers=2 * concurrency + 4, thread_name_prefix="campaign-stage")
+    try:
+        return asyncio.run(run_campaign_async(
+            pairs, output_path, state, company_description, concurrency, executor=executor, **kwargs
+        ))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def parse_rate_limits(values):
+    """Parse ["groq=2", "openai=5"] into {"groq": 2.0, "openai": 5.0}; rates must be positive"""
+    rate_limits = {}
+    for value in values or []:
+        provider, sep, rate = value.partition("=")
+        try:
+            rate = float(rate) if sep else None
+        except ValueError:
+            rate = None
+        if rate is None or not rate > 0:
+            raise ValueError(f"Invalid rate limit {value!r}: expected provider=calls per second, e.g. groq=2")
+        rate_limits[provider.strip()] = rate
+    return rate_limits
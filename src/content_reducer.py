@@ -0,0 +1,222 @@
+import os
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOKEN_BUDGET = 2000
+
+# Lines that are site chrome rather than content (English and Portuguese,
+# since most client and product pages we scrape are one or the other)
+BOILERPLATE_PATTERNS = re.compile(
+    r"cookie|privacy|privacidade|terms of (use|service)|termos de uso|all rights reserved|"
+    r"todos os direitos|newsletter|\bsign (in|up)\b|\blog ?in\b|cadastre|\bentrar\b|minha conta|my account|"
+    r"carrinho|shopping (bag|cart)|\bcart\b|wishlist|lista de desejos|skip to|pular para|"
+    r"javascript|accept all|aceitar|follow us|siga-nos|copyright|©",
+    re.IGNORECASE
+)
+
+# Words that mark the sections each extraction needs
+RELEVANT_TERMS = {
+    "product": re.compile(
+        r"fabric|composition|cotton|linen|polyester|viscose|elastane|spandex|wool|silk|material|"
+        r"tecido|composição|composicao|algodão|algodao|linho|poliéster|poliester|elastano|"
+        r"description|descrição|descricao|detalhes|details|\bfit\b|modelagem|\d+\s?%",
+        re.IGNORECASE
+    ),
+    "client": re.compile(
+        r"about|our story|history|founded|mission|vision|values|brand|company|since|"
+        r"sobre|nossa história|historia|história|fundad|missão|missao|visão|visao|valores|marca|empresa|desde",
+        re.IGNORECASE
+    ),
+}
+
+# A run of at least this many short lines is treated as a menu, unless it
+# looks like content (e.g. a composition table of "100% Algodão" lines)
+MENU_RUN = 5
+SHORT_LINE_WORDS = 3
+# Longer blocks are split so the budget can be spent at a finer grain
+MAX_BLOCK_LINES = 20
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+
+def estimate_tokens(text):
+    """
+    Approximate LLM token count: words and punctuation marks, with long
+    words counted as several tokens. Close enough to budget a prompt
+    without loading a tokenizer.
+    """
+    return sum(1 + len(piece) // 8 for piece in _TOKEN_PATTERN.findall(text))
+
+
+class ReductionStats:
+    def __init__(self, input_tokens, output_tokens, input_blocks, output_blocks, duplicates, boilerplate):
+        """Size of a page before and after reduce_page_content"""
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.input_blocks = input_blocks
+        self.output_blocks = output_blocks
+        self.duplicates = duplicates
+        self.boilerplate = boilerplate
+
+    @property
+    def ratio(self):
+        return self.output_tokens / self.input_tokens if self.input_tokens else 1.0
+
+    def as_dict(self):
+        return {
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "input_blocks": self.input_blocks,
+            "output_blocks": self.output_blocks,
+            "duplicates": self.duplicates,
+            "boilerplate": self.boilerplate,
+            "ratio": round(self.ratio, 3),
+        }
+
+    def __str__(self):
+        return (
+            f"{self.input_tokens} -> {self.output_tokens} tokens ({self.ratio:.0%}), "
+            f"{self.output_blocks}/{self.input_blocks} blocks kept, "
+            f"{self.duplicates} duplicate and {self.boilerplate} boilerplate lines dropped"
+        )
+
+
+def _split_blocks(text):
+    """Blank-line separated blocks of whitespace-normalized, non-empty lines"""
+    blocks = []
+    current = []
+    for line in text.splitlines():
+        line = _SPACES.sub(" ", line).strip()
+        if line:
+            current.append(line)
+        elif current:
+            blocks.append(current)
+            current = []
+    if current:
+        blocks.append(current)
+    return blocks
+
+
+def _is_menu(run, pattern):
+    if len(run) < MENU_RUN:
+        return False
+    text = " ".join(run)
+    return "%" not in text and (pattern is None or not pattern.search(text))
+
+
+def _drop_menus(lines, pattern=None):
+    """Remove runs of MENU_RUN or more consecutive short lines with no % and no match of pattern"""
+    kept = []
+    run = []
+    for line in lines + [None]:
+        if line is not None and len(line.split()) <= SHORT_LINE_WORDS:
+            run.append(line)
+            continue
+        if not _is_menu(run, pattern):
+            kept.extend(run)
+        run = []
+        if line is not None:
+            kept.append(line)
+    return kept
+
+
+def _score(lines, position, total, pattern):
+    text = " ".join(lines)
+    hits = len(pattern.findall(text)) if pattern is not None else 0
+    # Relevance per token, so one long block cannot win on size alone, plus
+    # a small bias towards the top of the page where the main content sits
+    return (1 + 10 * hits) / (1 + estimate_tokens(text)) ** 0.5 + 0.5 * (1 - position / max(total, 1))
+
+
+def reduce_page_content(text, token_budget=DEFAULT_TOKEN_BUDGET, kind=None):
+    """
+    Shrink scraped page text to what an extraction prompt needs
+
+    A page within budget is passed through whole. A page over budget first
+    loses repeated blocks (navigation, footers) and repeated sentences,
+    compared case-insensitively; short lines are never deduplicated, since
+    table values such as "100% Algodão" legitimately repeat under
+    different labels. If it is still over budget it loses boilerplate
+    lines (cookie banners, account and cart links) and menus, and then the
+    blocks most relevant to kind are kept, in page order.
+
+    Args:
+      - text: page text as returned by load_web_content
+      - token_budget: upper bound on estimate_tokens of the result; None or 0 keeps every block
+      - kind: "product" or "client", selects the relevance terms
+
+    Return:
+      - (reduced text, ReductionStats)
+    """
+    input_tokens = estimate_tokens(text)
+    blocks = _split_blocks(text)
+    pattern = RELEVANT_TERMS.get(kind)
+    duplicates = 0
+    deduplicated = blocks
+    if token_budget and sum(estimate_tokens("\n".join(lines)) for lines in blocks) > token_budget:
+        seen_blocks = set()
+        seen_lines = set()
+        deduplicated = []
+        for lines in blocks:
+            block_key = "\n".join(lines).lower()
+            if block_key in seen_blocks:
+                duplicates += len(lines)
+                continue
+            seen_blocks.add(block_key)
+            kept = []
+            for line in lines:
+                if len(line.split()) > SHORT_LINE_WORDS:
+                    key = line.lower()
+                    if key in seen_lines:
+                        duplicates += 1
+                        continue
+                    seen_lines.add(key)
+                kept.append(line)
+            deduplicated.append(kept)
+
+    boilerplate = 0
+    over_budget = token_budget and sum(estimate_tokens("\n".join(lines)) for lines in deduplicated) > token_budget
+    cleaned = []
+    for kept in deduplicated:
+        if over_budget:
+            before = len(kept)
+            kept = [
+                line for line in kept
+                if not (BOILERPLATE_PATTERNS.search(line) and len(line.split()) <= 12)
+            ]
+            kept = _drop_menus(kept, pattern)
+            boilerplate += before - len(kept)
+        for start in range(0, len(kept), MAX_BLOCK_LINES):
+            cleaned.append(kept[start:start + MAX_BLOCK_LINES])
+
+    sizes = [estimate_tokens("\n".join(lines)) for lines in cleaned]
+    if token_budget and sum(sizes) > token_budget:
+        ranked = sorted(
+            range(len(cleaned)),
+            key=lambda i: _score(cleaned[i], i, len(cleaned), pattern),
+            reverse=True
+        )
+        selected = set()
+        used = 0
+        for i in ranked:
+            if used + sizes[i] <= token_budget:
+                selected.add(i)
+                used += sizes[i]
+        cleaned = [lines for i, lines in enumerate(cleaned) if i in selected]
+
+    reduced = "\n\n".join("\n".join(lines) for lines in cleaned)
+    stats = ReductionStats(input_tokens, estimate_tokens(reduced), len(blocks), len(cleaned), duplicates, boilerplate)
+    return reduced, stats
+
+
+def reduce_for_extraction(text, kind):
+    """reduce_page_content with the budget from PAGE_TOKEN_BUDGET (0 disables reduction), logging the savings"""
+    token_budget = int(os.getenv("PAGE_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET))
+    if token_budget <= 0:
+        return text
+    reduced, stats = reduce_page_content(text, token_budget, kind)
+    logger.info(f"Reduced {kind} page: {stats}")
+    return reduced
@@ -1,26 +1,128 @@
+import os
+import json
+import logging
+import numpy as np
 import pandas as pd
-import re
 
-def load_inventory_data(file_path):
-    """Load inventory data from CSV file"""
-    return pd.read_csv(file_path)
+logger = logging.getLogger(__name__)
+
+# Compact dtypes: compositions repeat across styles, so they are categorical
+INVENTORY_DTYPES = {
+    "Image": "string",
+    "style": "string",
+    "fabric composition": "category",
+    "lining composition": "category",
+}
+
+# Bump when process_inventory_data changes so columnar caches are rebuilt
+INVENTORY_CACHE_VERSION = "1"
+
+def load_inventory_data(file_path, chunksize=None):
+    """
+    Load inventory data from CSV file
+
+    Args:
+      - chunksize: rows per chunk; if given an iterator of DataFrames is
+        returned instead of one DataFrame (see iter_inventory)
+    """
+    return pd.read_csv(file_path, dtype=INVENTORY_DTYPES, chunksize=chunksize, encoding="utf-8-sig")
+
+def _clean_descriptions(descriptions):
+    return (descriptions
+            .str.replace("%", "% ")
+            .str.replace(",", ", ")
+            .str.replace(r'\s+', ' ', regex=True)
+            .str.strip())
+
+def build_descriptions(fabric, lining):
+    """
+    "Shell: <fabric>, Lining: <lining>" per row, as a categorical
+
+    Strings are built and cleaned once per distinct (fabric, lining) pair
+    and broadcast back to the rows by code, so the cost follows the number
+    of distinct compositions rather than the number of styles.
+    """
+    fabric = fabric.astype("category")
+    lining = lining.astype("category")
+    # NaN has code -1; shift so every code is a valid index
+    fabric_codes = fabric.cat.codes.to_numpy().astype(np.int64) + 1
+    lining_codes = lining.cat.codes.to_numpy().astype(np.int64) + 1
+    pair_keys, row_pairs = np.unique(fabric_codes * (len(lining.cat.categories) + 1) + lining_codes, return_inverse=True)
+
+    fabric_names = np.concatenate([["nan"], fabric.cat.categories.astype(str)]).astype(object)
+    lining_names = np.concatenate([["nan"], lining.cat.categories.astype(str)]).astype(object)
+    pair_fabric = fabric_names[pair_keys // (len(lining.cat.categories) + 1)]
+    pair_lining = lining_names[pair_keys % (len(lining.cat.categories) + 1)]
+    pair_descriptions = _clean_descriptions(pd.Series("Shell: " + pair_fabric + ", Lining: " + pair_lining))
+
+    categories = pd.Index(pair_descriptions.unique())
+    pair_codes = categories.get_indexer(pair_descriptions)
+    return pd.Series(
+        pd.Categorical.from_codes(pair_codes[row_pairs.reshape(-1)], categories=categories),
+        index=fabric.index
+    )
 
 def process_inventory_data(df):
     """Process inventory data"""
     # Create description from fabric composition
-    df["Description"] = df.apply(
-        lambda row: f"Shell: {row['fabric composition']}, Lining: {row['lining composition']}",
-        axis=1
-    )
-    
+    df["Description"] = build_descriptions(df["fabric composition"], df["lining composition"])
+
     # Drop original columns
     df = df.drop(["fabric composition", "lining composition"], axis=1)
-    
-    # Clean up description text
-    df["Description"] = (df["Description"]
-                         .str.replace("%", "% ")
-                         .str.replace(",", ", ")
-                         .str.replace(r'\s+', ' ', regex=True)
-                         .str.strip())
-    
-    return df 
\ No newline at end of file
+
+    return df
+
+def iter_inventory(file_path, chunksize=50000):
+    """Stream processed inventory in chunks of chunksize rows, for catalogs too large to hold twice"""
+    for chunk in load_inventory_data(file_path, chunksize=chunksize):
+        yield process_inventory_data(chunk)
+
+def _source_signature(file_path):
+    stat = os.stat(file_path)
+    return {
+        "source": os.path.abspath(file_path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "version": INVENTORY_CACHE_VERSION,
+    }
+
+def load_inventory(file_path, cache_dir=None):
+    """
+    Loaded and processed inventory, through a Parquet cache if cache_dir is given
+
+    The cache is keyed by the CSV's path, size and modification time (and
+    INVENTORY_CACHE_VERSION), so it is rebuilt only when the CSV changes.
+    Categorical columns round-trip through Parquet as dictionary columns.
+    Without pyarrow the CSV is simply parsed every time.
+    """
+    if not cache_dir:
+        return process_inventory_data(load_inventory_data(file_path))
+
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    cache_path = os.path.join(cache_dir, f"{name}.parquet")
+    meta_path = os.path.join(cache_dir, f"{name}.meta.json")
+    signature = _source_signature(file_path)
+
+    if os.path.exists(cache_path) and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            cached_signature = json.load(f)
+        if cached_signature == signature:
+            try:
+                return pd.read_parquet(cache_path)
+            except ImportError:
+                logger.warning("pyarrow is not installed; ignoring the inventory cache")
+                return process_inventory_data(load_inventory_data(file_path))
+            except Exception as e:
+                logger.warning(f"Unreadable inventory cache {cache_path} ({type(e).__name__}), rebuilding")
+
+    df = process_inventory_data(load_inventory_data(file_path))
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        df.to_parquet(cache_path, index=False)
+    except ImportError:
+        logger.warning("pyarrow is not installed; inventory cache disabled")
+        return df
+    with open(meta_path, "w") as f:
+        json.dump(signature, f)
+    logger.info(f"Wrote inventory cache {cache_path} ({len(df)} rows)")
+    return df
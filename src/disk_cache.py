@@ -0,0 +1,154 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+# Rows read per eviction query
+EVICT_BATCH = 64
+
+
+class DiskCache:
+    def __init__(self, path, max_bytes=256 * 1024 * 1024, default_ttl=None):
+        """
+        Persistent key/value cache in a single SQLite file
+
+        Values are stored as JSON. Entries expire after their TTL and the
+        least recently used entries are evicted once the stored values
+        exceed max_bytes. Safe to share between threads of one process;
+        a forked worker process transparently opens its own connection.
+
+        Args:
+          - path: SQLite file; parent directories are created
+          - max_bytes: size bound for the stored values
+          - default_ttl: seconds an entry stays fresh, None for no expiry
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._connect()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT, size INTEGER, expires REAL, accessed REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+
+    def _connect(self):
+        self._pid = os.getpid()
+        self._process_lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        # Running total of stored value sizes, read from the table on first write
+        self._total = None
+
+    # SQLite connections (and a lock another thread may have held) must not
+    # be used across fork
+    @property
+    def _lock(self):
+        if self._pid != os.getpid():
+            self._connect()
+        return self._process_lock
+
+    @property
+    def _conn(self):
+        if self._pid != os.getpid():
+            self._connect()
+        return self._connection
+
+    def get_entry(self, key):
+        """
+        Look up an entry whether or not it has expired
+
+        Return:
+          - (value, fresh) or (None, False) if the key is unknown
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None, False
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+        value, expires = row
+        return json.loads(value), expires is None or expires > time.time()
+
+    def get(self, key, default=None):
+        """Fresh value for key, or default; counts a hit or a miss"""
+        value, fresh = self.get_entry(key)
+        if value is None or not fresh:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        """Store a JSON-serializable value; ttl overrides default_ttl"""
+        ttl = self.default_ttl if ttl is None else ttl
+        payload = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        expires = now + ttl if ttl is not None else None
+        with self._lock:
+            if self._total is None:
+                self._total = self._stored_bytes()
+            row = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload), expires, now)
+            )
+            self._total += len(payload) - (row[0] if row else 0)
+            self._evict()
+
+    def delete(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            if row and self._total is not None:
+                self._total -= row[0]
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._total = 0
+
+    def _stored_bytes(self):
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def _evict(self):
+        if self._total <= self.max_bytes:
+            return
+        # Other processes may have written or evicted since; recount before evicting
+        total = self._total = self._stored_bytes()
+        if total <= self.max_bytes:
+            return
+        # Least recently used first, a batch at a time through the accessed index
+        while total > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM entries ORDER BY accessed LIMIT ?", (EVICT_BATCH,)
+            ).fetchall()
+            if not rows:
+                break
+            evicted = []
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                evicted.append((key,))
+                total -= size
+            self._conn.executemany("DELETE FROM entries WHERE key = ?", evicted)
+            self.evictions += len(evicted)
+        self._total = total
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -1,14 +1,16 @@
-from langchain_groq import ChatGroq
 from langchain_core.prompts import PromptTemplate
+from src.llm import invoke_cached, stream_cached
 import os
 import logging
 
 logger = logging.getLogger(__name__)
 
-def generate_sales_email(company_description, client_info, sample_products, popular_styles, fabrics_descriptions, quiet=True):
-    """Generate a sales email based on client and product information"""
-    prompt_email = PromptTemplate.from_template(
-        '''
+# Part of the LLM response cache key; bump when PROMPT_EMAIL changes meaning without changing its text
+EMAIL_PROMPT_VERSION = "1"
+
+# Built once at import; chains over it are composed once per model by src.llm.get_chain
+PROMPT_EMAIL = PromptTemplate.from_template(
+    '''
         ### INSTRUCTION:
         You are a business development executive at Airry Garments., LTD. Your job is to write a cold email to a prospective client.
 
@@ -33,33 +35,40 @@ def generate_sales_email(company_description, client_info, sample_products, popu
 
         ### EMAIL (NO PREAMBLE):
         '''
-    )
-    
+)
+
+def _email_inputs(company_description, client_info, sample_products, popular_styles, fabrics_descriptions):
+    return {
+        "company_description": company_description,
+        "client_info": client_info,
+        "sample_products": sample_products,
+        "popular_styles": str(popular_styles),
+        "fabrics_descriptions": str(fabrics_descriptions)
+    }
+
+def generate_sales_email(company_description, client_info, sample_products, popular_styles, fabrics_descriptions, quiet=True):
+    """Generate a sales email based on client and product information"""
     # Use the model specified in environment variables
     model_name = os.getenv("GROQ_MODEL_NAME_1")
     
     if not quiet:
         logger.info(f"Using model: {model_name}")
     
-    llm_groq = ChatGroq(
-        temperature=0,
-        model_name=model_name
-    )
-    
-    chain_email = prompt_email | llm_groq
-    
     if not quiet:
         logger.info("Generating email...")
         
-    response = chain_email.invoke({
-        "company_description": company_description,
-        "client_info": client_info,
-        "sample_products": sample_products,
-        "popular_styles": str(popular_styles),
-        "fabrics_descriptions": str(fabrics_descriptions)
-    })
+    # Identical inputs (e.g. a campaign re-run after a failure) are answered from the LLM cache
+    response = invoke_cached(PROMPT_EMAIL, _email_inputs(
+        company_description, client_info, sample_products, popular_styles, fabrics_descriptions
+    ), EMAIL_PROMPT_VERSION)
     
     if not quiet and hasattr(response, 'response_metadata') and response.response_metadata:
         logger.info(f"Email generated using model: {response.response_metadata.get('model_name', model_name)}")
     
-    return response.content 
\ No newline at end of file
+    return response.content 
+
+def stream_sales_email(company_description, client_info, sample_products, popular_styles, fabrics_descriptions):
+    """Generate a sales email, yielding text chunks as the model produces them"""
+    yield from stream_cached(PROMPT_EMAIL, _email_inputs(
+        company_description, client_info, sample_products, popular_styles, fabrics_descriptions
+    ), EMAIL_PROMPT_VERSION)
\ No newline at end of file
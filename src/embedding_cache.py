@@ -0,0 +1,191 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# Bump when image decoding / preprocessing changes so stale embeddings are not reused
+# (2: reduced-scale JPEG decoding in src.image_preprocessing)
+PREPROCESS_VERSION = "2"
+
+KEY_BYTES = 16
+EMPTY_KEY = b"\0" * KEY_BYTES
+
+
+class EmbeddingCache:
+    def __init__(self, cache_dir, model_name, dimension=512, capacity=100000,
+                 preprocess_version=PREPROCESS_VERSION, read_only=False):
+        """
+        Content-addressed on-disk cache of image embeddings
+
+        Embeddings live in a memory-mapped float32 matrix (one row per slot)
+        and the key index is a memory-mapped array of 16-byte digests plus a
+        last-used tick per slot. Keys hash the file bytes together with the
+        model name and preprocessing version. When full, the least recently
+        used slots are evicted; an evicted slot's key is cleared on disk
+        before its row is overwritten, so a crash can lose entries but never
+        map a key to another image's embedding. Open with read_only=True to
+        share one cache between worker processes; only a single writer is
+        supported.
+
+        Args:
+          - cache_dir: directory holding embeddings.f32, keys.npy, ticks.npy and meta.json
+          - model_name: CLIP model id the embeddings were produced with
+          - dimension: embedding size
+          - capacity: maximum number of cached embeddings
+          - preprocess_version: part of every key; change it to invalidate the cache
+          - read_only: never write to disk
+        """
+        self.cache_dir = cache_dir
+        self.model_name = model_name
+        self.dimension = dimension
+        self.preprocess_version = preprocess_version
+        self.read_only = read_only
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        meta_path = os.path.join(cache_dir, "meta.json")
+        matrix_path = os.path.join(cache_dir, "embeddings.f32")
+        keys_path = os.path.join(cache_dir, "keys.npy")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta["dimension"] != dimension:
+                raise ValueError(
+                    f"Embedding cache at {cache_dir} has dimension {meta['dimension']}, expected {dimension}"
+                )
+            self.capacity = meta["capacity"]
+            mode = "r" if read_only else "r+"
+            self._keys = np.lib.format.open_memmap(keys_path, mode=mode)
+            self._ticks = np.load(os.path.join(cache_dir, "ticks.npy"))
+        else:
+            if read_only:
+                raise FileNotFoundError(f"No embedding cache at {cache_dir}")
+            os.makedirs(cache_dir, exist_ok=True)
+            self.capacity = capacity
+            mode = "w+"
+            self._keys = np.lib.format.open_memmap(keys_path, mode=mode, dtype=np.uint8, shape=(capacity, KEY_BYTES))
+            self._ticks = np.zeros(capacity, dtype=np.uint64)
+            with open(meta_path, "w") as f:
+                json.dump({"dimension": dimension, "capacity": capacity}, f)
+
+        self._matrix = np.memmap(matrix_path, dtype=np.float32, mode=mode, shape=(self.capacity, dimension))
+        # key -> slot, least recently used first
+        self._slots = OrderedDict()
+        for slot in np.argsort(self._ticks, kind="stable"):
+            key = self._keys[slot].tobytes()
+            if key != EMPTY_KEY:
+                self._slots[key] = int(slot)
+        # Slots with no key, lowest last so they are used in order; a crash
+        # between clearing and rewriting a key leaves such holes anywhere
+        occupied = np.zeros(self.capacity, dtype=bool)
+        occupied[list(self._slots.values())] = True
+        self._free = [int(slot) for slot in np.flatnonzero(~occupied)[::-1]]
+        self._tick = int(self._ticks.max()) if len(self._ticks) else 0
+        if mode == "w+":
+            self.flush()
+
+    def key_for_bytes(self, data):
+        """Cache key for raw image bytes"""
+        digest = hashlib.blake2b(digest_size=KEY_BYTES)
+        digest.update(f"{self.model_name}\0{self.preprocess_version}\0".encode())
+        digest.update(data)
+        return digest.digest()
+
+    def key_for_file(self, path):
+        """Cache key for an image file"""
+        with open(path, "rb") as f:
+            return self.key_for_bytes(f.read())
+
+    def __contains__(self, key):
+        return key in self._slots
+
+    def __len__(self):
+        return len(self._slots)
+
+    def get_many(self, keys):
+        """
+        Look up embeddings
+
+        Return:
+          - an (n, dimension) float32 matrix, rows for misses are zero
+          - a boolean hit mask
+        """
+        embeddings = np.zeros((len(keys), self.dimension), dtype=np.float32)
+        hit_mask = np.zeros(len(keys), dtype=bool)
+        with self._lock:
+            for i, key in enumerate(keys):
+                slot = self._slots.get(key)
+                if slot is None:
+                    continue
+                embeddings[i] = self._matrix[slot]
+                hit_mask[i] = True
+                self._slots.move_to_end(key)
+                self._tick += 1
+                self._ticks[slot] = self._tick
+            hits = int(hit_mask.sum())
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return embeddings, hit_mask
+
+    def put_many(self, keys, embeddings):
+        """Store embeddings, evicting least recently used slots when full"""
+        if self.read_only:
+            return
+        with self._lock:
+            slots = []
+            new_keys = []
+            evicted = False
+            for key in keys:
+                slot = self._slots.get(key)
+                if slot is None:
+                    slot, was_used = self._free_slot()
+                    evicted = evicted or was_used
+                    new_keys.append((slot, key))
+                self._slots[key] = slot
+                self._slots.move_to_end(key)
+                slots.append(slot)
+            if evicted:
+                # Evicted keys are cleared on disk before their rows get new embeddings
+                self._keys.flush()
+            for slot, embedding in zip(slots, embeddings):
+                self._matrix[slot] = embedding
+                self._tick += 1
+                self._ticks[slot] = self._tick
+            for slot, key in new_keys:
+                self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+
+    def _free_slot(self):
+        """(slot, whether it held an evicted entry)"""
+        if self._free:
+            return self._free.pop(), False
+        _, slot = self._slots.popitem(last=False)
+        self._keys[slot] = 0
+        self.evictions += 1
+        return slot, True
+
+    def flush(self):
+        """Persist the matrix, key index and usage ticks"""
+        if self.read_only:
+            return
+        with self._lock:
+            self._matrix.flush()
+            self._keys.flush()
+            tmp_path = os.path.join(self.cache_dir, "ticks.npy.tmp")
+            with open(tmp_path, "wb") as f:
+                np.save(f, self._ticks)
+            os.replace(tmp_path, os.path.join(self.cache_dir, "ticks.npy"))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._slots),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -1,35 +1,54 @@
-from langsmith import Client
-from langsmith.evaluation import LangChainStringEvaluator, evaluate
-from langsmith.schemas import DataType
+import os
+import re
+import time
+import uuid
+import queue
+import logging
+import threading
+from src.metrics import track_stage
 
-def setup_evaluation_dataset(email_content):
-    """Set up evaluation dataset for email content"""
-    client = Client()
-    dataset_name = "outbound_cold_emails"
-    
+# langsmith is imported where it is used, so that importing this module
+# (and with it the API server) does not load it
+
+logger = logging.getLogger(__name__)
+
+DATASET_NAME = "outbound_cold_emails"
+
+def _ensure_dataset(client, dataset_name=DATASET_NAME):
+    """The evaluation dataset, created on first use"""
+    from langsmith.schemas import DataType
     if not client.has_dataset(dataset_name = dataset_name):
-        dataset = client.create_dataset(
+        return client.create_dataset(
             dataset_name=dataset_name,
             data_type=DataType.kv,
             description="This dataset contains outbound email drafts"
         )
-    
+    return client.read_dataset(dataset_name=dataset_name)
+
+def setup_evaluation_dataset(email_content):
+    """Set up evaluation dataset for email content"""
+    from langsmith import Client
+    client = Client()
+    dataset_name = DATASET_NAME
+    _ensure_dataset(client, dataset_name)
+
     client.create_example(
         dataset_name=dataset_name,
         inputs={"inputs": email_content}
     )
-    
+
     return dataset_name
 
-def evaluate_email(dataset_name):
-    """Evaluate email content"""
+def build_evaluators():
+    """The four LLM criteria evaluators emails are scored with"""
+    from langsmith.evaluation import LangChainStringEvaluator
     evaluator_conciseness = LangChainStringEvaluator(
         "criteria",
         config={
             "criteria": "conciseness"
         }
     )
-    
+
     evaluator_clarity = LangChainStringEvaluator(
         "criteria",
         config={
@@ -38,7 +57,7 @@ def evaluate_email(dataset_name):
             }
         }
     )
-    
+
     evaluator_personalization = LangChainStringEvaluator(
         "criteria",
         config={
@@ -47,7 +66,7 @@ def evaluate_email(dataset_name):
             }
         }
     )
-    
+
     evaluator_call_to_action = LangChainStringEvaluator(
         "criteria",
         config={
@@ -56,18 +75,229 @@ def evaluate_email(dataset_name):
             }
         }
     )
-    
+
+    return [
+        evaluator_conciseness,
+        evaluator_clarity,
+        evaluator_personalization,
+        evaluator_call_to_action
+    ]
+
+def evaluate_email(dataset_name):
+    """Evaluate email content"""
+    from langsmith.evaluation import evaluate
     results = evaluate(
         lambda input: input["inputs"],
         data=dataset_name,
-        evaluators=[
-            evaluator_conciseness, 
-            evaluator_clarity, 
-            evaluator_personalization, 
-            evaluator_call_to_action
-        ],
+        evaluators=build_evaluators(),
         experiment_prefix="gpt4",
         metadata={"Trial": "1"}
     )
-    
-    return results 
\ No newline at end of file
+
+    return results
+
+class LangSmithScorer:
+    def __init__(self, dataset_name=DATASET_NAME, experiment_prefix="gpt4"):
+        """
+        Scores a batch of emails with the LangSmith criteria evaluators
+
+        The batch is added to the dataset with one bulk call and only those
+        new examples are evaluated, not the whole dataset.
+        """
+        self.dataset_name = dataset_name
+        self.experiment_prefix = experiment_prefix
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from langsmith import Client
+            self._client = Client()
+        return self._client
+
+    def __call__(self, records):
+        from langsmith.evaluation import evaluate
+        dataset = _ensure_dataset(self.client, self.dataset_name)
+        ids = [uuid.uuid4() for _ in records]
+        self.client.create_examples(
+            inputs=[{"inputs": record["email_content"]} for record in records],
+            metadata=[record.get("metadata") or {} for record in records],
+            ids=ids,
+            dataset_id=dataset.id
+        )
+        results = evaluate(
+            lambda input: input["inputs"],
+            data=self.client.list_examples(dataset_id=dataset.id, example_ids=ids),
+            evaluators=build_evaluators(),
+            experiment_prefix=self.experiment_prefix,
+            metadata={"Trial": "1", "batch_size": len(records)}
+        )
+        return results
+
+CALL_TO_ACTION_TERMS = re.compile(
+    r"catalog|sample|call|meeting|schedule|let me know|reply|reach out|would you be open|are you available",
+    re.IGNORECASE
+)
+
+def local_scorer(records):
+    """
+    Offline heuristic stand-in for the LLM evaluators, no network needed
+
+    Scores (0 to 1) per email: conciseness from the word count, clarity
+    from the average sentence length, call_to_action from CTA phrases,
+    and personalization from mentions of the client's words (only when
+    the record carries client_info).
+    """
+    scores = []
+    for record in records:
+        email = record["email_content"] or ""
+        words = email.split()
+        sentences = [s for s in re.split(r"[.!?]+\s", email) if s.strip()]
+        avg_sentence = len(words) / max(len(sentences), 1)
+        score = {
+            "conciseness": round(min(1.0, 200 / max(len(words), 1)), 3),
+            "clarity": round(min(1.0, 20 / max(avg_sentence, 1)), 3),
+            "call_to_action": 1.0 if CALL_TO_ACTION_TERMS.search(email) else 0.0,
+        }
+        client_info = record.get("client_info")
+        if client_info:
+            client_terms = {w.lower() for w in re.findall(r"[A-Za-z]{5,}", str(client_info))}
+            email_terms = {w.lower() for w in re.findall(r"[A-Za-z]{5,}", email)}
+            score["personalization"] = round(len(client_terms & email_terms) / max(min(len(client_terms), 20), 1), 3)
+        scores.append(score)
+    return scores
+
+SCORERS = {
+    "langsmith": LangSmithScorer,
+    "local": lambda: local_scorer,
+}
+
+class EvaluationQueue:
+    def __init__(self, scorer, batch_size=16, flush_interval=30.0, max_pending=1000, keep_results=100):
+        """
+        Background stage that evaluates generated emails in batches
+
+        submit() only enqueues, so callers never wait on evaluation. A
+        worker thread hands the scorer a batch once batch_size emails are
+        waiting or flush_interval seconds have passed since the oldest one.
+
+        Args:
+          - scorer: callable(list of records) -> results; records are dicts
+            with email_content and optional client_info / metadata
+          - max_pending: emails beyond this are dropped (and counted) rather
+            than letting the backlog grow without bound
+          - keep_results: most recent batch results kept for inspection
+        """
+        self.scorer = scorer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.submitted = 0
+        self.evaluated = 0
+        self.dropped = 0
+        self.failed_batches = 0
+        self.results = []
+        self.keep_results = keep_results
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._flush_requested = threading.Event()
+        self._pending = 0
+        self._done = threading.Condition()
+        self._thread = None
+
+    def _start(self):
+        # Started on first use, so the queue can be created before a server forks its workers
+        with self._done:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._work, name="evaluation", daemon=True)
+                self._thread.start()
+
+    def submit(self, email_content, client_info=None, metadata=None):
+        """Queue an email for evaluation; returns False if it was dropped"""
+        self._start()
+        with self._done:
+            try:
+                self._queue.put_nowait({"email_content": email_content, "client_info": client_info, "metadata": metadata})
+            except queue.Full:
+                self.dropped += 1
+                return False
+            self._pending += 1
+            self.submitted += 1
+        return True
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and batch[-1] is not None:
+            try:
+                if self._flush_requested.is_set():
+                    # Take what is already waiting, without holding out for a full batch
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=max(0.0, min(0.5, deadline - time.monotonic()))))
+            except queue.Empty:
+                if self._flush_requested.is_set() or time.monotonic() >= deadline:
+                    break
+        return batch
+
+    def _work(self):
+        while True:
+            batch = self._next_batch()
+            stopping = batch[-1] is None
+            batch = [record for record in batch if record is not None]
+            if batch:
+                start = time.perf_counter()
+                try:
+                    with track_stage("evaluation"):
+                        result = self.scorer(batch)
+                    self.evaluated += len(batch)
+                    self.results.append(result)
+                    del self.results[:-self.keep_results]
+                    logger.info(f"Evaluated {len(batch)} emails in {time.perf_counter() - start:.1f}s")
+                except Exception as e:
+                    self.failed_batches += 1
+                    logger.warning(f"Evaluation of {len(batch)} emails failed: {type(e).__name__}: {str(e)}")
+            with self._done:
+                self._pending -= len(batch)
+                if self._pending == 0:
+                    self._flush_requested.clear()
+                    self._done.notify_all()
+            if stopping:
+                return
+
+    def flush(self, timeout=None):
+        """Evaluate whatever is queued now instead of waiting for a full batch; blocks until done"""
+        self._flush_requested.set()
+        with self._done:
+            return self._done.wait_for(lambda: self._pending == 0, timeout)
+
+    def close(self, timeout=None):
+        """Evaluate what is queued, then stop the worker"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._flush_requested.set()
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "submitted": self.submitted,
+            "evaluated": self.evaluated,
+            "pending": self._queue.qsize(),
+            "dropped": self.dropped,
+            "failed_batches": self.failed_batches,
+        }
+
+def setup_evaluation_queue():
+    """
+    EvaluationQueue for the scorer named by EVALUATION_SCORER ("langsmith",
+    "local" or "off"), or None when evaluation is off
+    """
+    name = os.getenv("EVALUATION_SCORER", "langsmith").lower()
+    if name in ("off", "none", ""):
+        return None
+    if name not in SCORERS:
+        raise ValueError(f"Unknown EVALUATION_SCORER: {name}")
+    return EvaluationQueue(
+        SCORERS[name](),
+        batch_size=int(os.getenv("EVALUATION_BATCH_SIZE", 16)),
+        flush_interval=float(os.getenv("EVALUATION_FLUSH_INTERVAL", 30))
+    )
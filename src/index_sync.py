@@ -0,0 +1,229 @@
+import os
+import json
+import time
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from src.ingestion import ingest_inventory
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+
+class SyncStats:
+    def __init__(self):
+        """What one sync run found and did"""
+        self.added = 0
+        self.changed = 0
+        self.removed = 0
+        self.unchanged = 0
+        self.unreadable = 0
+        self.images_hashed = 0
+        self.ingest = None
+        self.elapsed = 0.0
+
+    def as_dict(self):
+        return {
+            "added": self.added,
+            "changed": self.changed,
+            "removed": self.removed,
+            "unchanged": self.unchanged,
+            "unreadable": self.unreadable,
+            "images_hashed": self.images_hashed,
+            "ingest": self.ingest.as_dict() if self.ingest is not None else None,
+            "elapsed_s": round(self.elapsed, 3),
+        }
+
+    def __str__(self):
+        return (
+            f"{self.added} added, {self.changed} changed, {self.removed} removed, "
+            f"{self.unchanged} unchanged, {self.unreadable} unreadable "
+            f"({self.images_hashed} images hashed) in {self.elapsed:.2f}s"
+        )
+
+
+def load_manifest(path):
+    """Manifest written by save_manifest, or an empty one"""
+    if not path or not os.path.exists(path):
+        return {"version": MANIFEST_VERSION, "model": None, "styles": {}}
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        logger.warning(f"Ignoring manifest {path} with version {manifest.get('version')}")
+        return {"version": MANIFEST_VERSION, "model": None, "styles": {}}
+    return manifest
+
+
+def save_manifest(manifest, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def _metadata_hash(metadata):
+    payload = json.dumps(metadata, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _image_entry(path, previous):
+    """
+    Content hash of an image file, reusing the previous hash when the
+    file's size and mtime are unchanged
+
+    Return:
+      - (entry dict, whether the file was read) or (None, False) if unreadable
+    """
+    try:
+        stat = os.stat(path)
+        if previous is not None and previous.get("size") == stat.st_size and previous.get("mtime_ns") == stat.st_mtime_ns:
+            return {"hash": previous["hash"], "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}, False
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return {"hash": digest.hexdigest(), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}, True
+    except OSError as e:
+        logger.warning(f"Could not read image {path}: {str(e)}")
+        return None, False
+
+
+def diff_inventory(inventory_df, manifest, model_name=None, hash_workers=8, full=False):
+    """
+    Compare the inventory against a manifest
+
+    Args:
+      - full: treat every readable style as new (the index does not hold
+        what the manifest describes); image hashes are still reused
+
+    Return:
+      - new manifest styles for every readable row ({style: entry})
+      - styles to (re)embed: new, or whose image or metadata changed
+      - styles to delete: in the manifest but no longer in the inventory
+      - a SyncStats with the counts filled in
+    """
+    stats = SyncStats()
+    # A different embedding model invalidates every stored vector
+    previous_styles = manifest["styles"] if manifest.get("model") == model_name else {}
+    indexed_styles = {} if full else previous_styles
+    records = {record["style"]: record for record in inventory_df.to_dict("records")}
+
+    with ThreadPoolExecutor(max_workers=hash_workers) as pool:
+        images = pool.map(
+            lambda style: _image_entry(records[style]["Image"], previous_styles.get(style, {}).get("image")),
+            list(records)
+        )
+        styles = {}
+        upsert = []
+        for (style, record), (image, was_read) in zip(records.items(), images):
+            stats.images_hashed += was_read
+            if image is None:
+                stats.unreadable += 1
+                # Keep what is indexed for it until the file can be read again
+                if style in manifest["styles"]:
+                    styles[style] = manifest["styles"][style]
+                continue
+            entry = {"image": image, "metadata": _metadata_hash(record), "description": record["Description"]}
+            styles[style] = entry
+            previous = indexed_styles.get(style)
+            if previous is None:
+                stats.added += 1
+                upsert.append(style)
+            elif previous["image"]["hash"] != image["hash"] or previous["metadata"] != entry["metadata"]:
+                stats.changed += 1
+                upsert.append(style)
+            else:
+                stats.unchanged += 1
+
+    removed = [style for style in manifest["styles"] if style not in records]
+    stats.removed = len(removed)
+    return styles, upsert, removed, stats
+
+
+def _index_matches(index, manifest):
+    """
+    Whether the index still holds what the manifest describes
+
+    False when the index is empty although the manifest lists styles (a
+    fresh local index, a recreated Pinecone index) or when the index's
+    content fingerprint differs from the one recorded in the manifest.
+    Backends without a fingerprint (Pinecone) are only checked for emptiness.
+    """
+    if not manifest["styles"]:
+        return True
+    fingerprint = getattr(index, "fingerprint", None)
+    if fingerprint is not None and manifest.get("index") != fingerprint:
+        return False
+    return index.describe_index_stats()["total_vector_count"] > 0
+
+
+def sync_inventory(index, inventory_df, clip_model, bm25_model, manifest_path,
+                   update_bm25=True, delete_batch_size=1000, persist=None, **ingest_kwargs):
+    """
+    Bring the index in line with the inventory, touching only what changed
+
+    A manifest next to the index records, per style, a hash of its image
+    bytes (reused while the file's size and mtime are unchanged), a hash of
+    its metadata and its description. New and changed styles are re-embedded
+    and upserted; styles dropped from the inventory are deleted in bulk.
+    The manifest is written only after the index has been updated and
+    persisted, so an interrupted sync is redone on the next run, and it
+    records the index's fingerprint: if the index turns out not to be the
+    one the manifest was written for (or is empty), every style is upserted.
+    Styles whose image fails to embed are not recorded as indexed.
+
+    Args:
+      - index: a Pinecone index or LocalHybridIndex
+      - manifest_path: JSON manifest file, created on the first sync
+      - persist: optional callable saving the index (e.g. a LocalHybridIndex
+        to disk), called after the index writes and before the manifest is saved
+      - update_bm25: apply the same diff to bm25_model's corpus statistics;
+        pass False if bm25_model was already fitted on this inventory.
+        Stored sparse vectors of unchanged styles keep the average document
+        length they were encoded with.
+      - ingest_kwargs: passed to src.ingestion.ingest_inventory
+
+    Return:
+      - a SyncStats
+    """
+    start = time.perf_counter()
+    manifest = load_manifest(manifest_path)
+    model_name = getattr(clip_model, "model_name", None)
+    full = not _index_matches(index, manifest)
+    if full:
+        logger.warning(f"Index does not match manifest {manifest_path}; upserting every style")
+    styles, upsert, removed, stats = diff_inventory(inventory_df, manifest, model_name, full=full)
+
+    if update_bm25:
+        stale = [style for style in upsert if style in manifest["styles"]] + removed
+        bm25_model.remove_documents([manifest["styles"][style]["description"] for style in stale])
+        bm25_model.add_documents([styles[style]["description"] for style in upsert])
+
+    if removed:
+        for begin in range(0, len(removed), delete_batch_size):
+            index.delete(ids=removed[begin:begin + delete_batch_size])
+
+    if upsert:
+        rows = inventory_df[inventory_df["style"].isin(set(upsert))]
+        stats.ingest = ingest_inventory(index, rows, clip_model, bm25_model, skip_existing=False, **ingest_kwargs)
+        keep_previous = not full and manifest.get("model") == model_name
+        for style in stats.ingest.failed_styles:
+            # Keep the entry of what is still indexed for it, so the next sync retries it
+            if keep_previous and style in manifest["styles"]:
+                styles[style] = manifest["styles"][style]
+            else:
+                styles.pop(style, None)
+
+    if persist is not None and (removed or upsert):
+        persist()
+    save_manifest({
+        "version": MANIFEST_VERSION,
+        "model": model_name,
+        "index": getattr(index, "fingerprint", None),
+        "styles": styles,
+    }, manifest_path)
+    stats.elapsed = time.perf_counter() - start
+    logger.info(f"Index sync finished: {stats}")
+    return stats
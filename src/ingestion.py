@@ -0,0 +1,258 @@
+import time
+import logging
+import numpy as np
+import pandas as pd
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from src.image_preprocessing import PreprocessConfig, decode_to_pixels
+from src.metrics import ITEMS
+
+logger = logging.getLogger(__name__)
+
+
+class IngestStats:
+    def __init__(self):
+        """Counters and throughput for one ingestion run"""
+        self.images = 0
+        self.cache_hits = 0
+        self.vectors = 0
+        self.skipped = 0
+        self.failed = 0
+        # Styles whose image could not be read or embedded, so callers do not record them as indexed
+        self.failed_styles = []
+        self.elapsed = 0.0
+
+    @property
+    def images_per_s(self):
+        return self.images / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def vectors_per_s(self):
+        return self.vectors / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            "images": self.images,
+            "cache_hits": self.cache_hits,
+            "vectors": self.vectors,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "elapsed_s": round(self.elapsed, 3),
+            "images_per_s": round(self.images_per_s, 2),
+            "vectors_per_s": round(self.vectors_per_s, 2),
+        }
+
+    def __str__(self):
+        return (
+            f"{self.images} images embedded, {self.cache_hits} cached, {self.vectors} vectors upserted, "
+            f"{self.skipped} skipped, {self.failed} failed in {self.elapsed:.2f}s "
+            f"({self.images_per_s:.1f} images/s, {self.vectors_per_s:.1f} vectors/s)"
+        )
+
+
+# Placeholder for images whose embedding is already in the cache and need no decoding
+CACHED = object()
+
+
+def _load_image(image_path, cache=None, config=None, pixel_cache=None, pool=None):
+    """
+    Read one image and preprocess it unless its embedding is cached
+
+    Args:
+      - config: PreprocessConfig, defaults to CLIP's
+      - pixel_cache: optional PixelCache of preprocessed images
+      - pool: optional executor (e.g. a process pool) the decode runs on
+
+    Return:
+      - the cache key (None without a cache)
+      - (H, W, 3) uint8 model-input pixels, CACHED, or None if it cannot be read
+    """
+    config = config or PreprocessConfig()
+    try:
+        with open(image_path, "rb") as f:
+            data = f.read()
+        key = cache.key_for_bytes(data) if cache is not None else None
+        if key is not None and key in cache:
+            return key, CACHED
+        pixel_key = pixel_cache.key(data, config) if pixel_cache is not None else None
+        pixels = pixel_cache.get(pixel_key) if pixel_cache is not None else None
+        if pixels is None:
+            if pool is not None:
+                pixels = pool.submit(decode_to_pixels, data, config).result()
+            else:
+                pixels = decode_to_pixels(data, config)
+            if pixel_cache is not None:
+                pixel_cache.put(pixel_key, pixels)
+        return key, pixels
+    except Exception as e:
+        logger.warning(f"Could not decode image {image_path}: {str(e)}")
+        return None, None
+
+
+def _json_metadata(record):
+    """
+    Index metadata with JSON-native values: NumPy scalars become Python
+    ones and missing values (NaN, None, pd.NA) are left out, since
+    Pinecone rejects nulls
+    """
+    metadata = {}
+    for name, value in record.items():
+        if isinstance(value, np.generic):
+            value = value.item()
+        if value is None or (np.ndim(value) == 0 and pd.isna(value)):
+            continue
+        metadata[name] = value
+    return metadata
+
+
+def _iter_chunks(df, chunk_size):
+    for start in range(0, len(df), chunk_size):
+        yield df.iloc[start:start + chunk_size]
+
+
+def _existing_ids(index, ids):
+    """Ids already present in the index, using one bulk fetch"""
+    return set(index.fetch(ids)["vectors"].keys())
+
+
+def ingest_inventory(
+    index,
+    inventory_df,
+    clip_model,
+    bm25_model,
+    chunk_size=64,
+    embed_batch_size=16,
+    upsert_batch_size=100,
+    decode_workers=4,
+    max_in_flight=4,
+    skip_existing=True,
+):
+    """
+    Stream inventory rows into the index in chunks
+
+    Images of the next chunk are decoded on a thread pool while the current
+    chunk runs through CLIP, and upserts are issued from a second pool with
+    at most max_in_flight requests outstanding. If clip_model has an
+    embedding cache, cached images are neither decoded nor embedded.
+    Decoding uses src.image_preprocessing (reduced-scale JPEG decode straight
+    to model-input pixels) and goes through clip_model's pixel_cache and
+    decode_pool when they are set.
+
+    Args:
+      - index: a Pinecone index or any object with the same fetch/upsert surface
+      - inventory_df: processed inventory with style, Image and Description columns
+      - chunk_size: rows per existence check and decode/embed round
+      - embed_batch_size: images per CLIP forward pass
+      - upsert_batch_size: vectors per upsert request
+      - decode_workers: threads reading and decoding images (handing the decode to decode_pool if set)
+      - max_in_flight: concurrent upsert requests
+      - skip_existing: if True, ids already in the index are not re-embedded
+
+    Return:
+      - an IngestStats with counts and images/s, vectors/s throughput
+    """
+    stats = IngestStats()
+    cache = getattr(clip_model, "embedding_cache", None)
+    config = getattr(clip_model, "preprocess_config", None)
+    pixel_cache = getattr(clip_model, "pixel_cache", None)
+    pool = getattr(clip_model, "decode_pool", None)
+
+    def load(path):
+        return _load_image(path, cache, config, pixel_cache, pool)
+    start = time.perf_counter()
+    in_flight = deque()
+
+    def submit_upsert(upsert_pool, records):
+        for begin in range(0, len(records), upsert_batch_size):
+            while len(in_flight) >= max_in_flight:
+                in_flight.popleft().result()
+            batch = records[begin:begin + upsert_batch_size]
+            in_flight.append(upsert_pool.submit(index.upsert, vectors=batch))
+            stats.vectors += len(batch)
+            ITEMS.inc(len(batch), stage="index_upsert")
+
+    def embed_chunk(upsert_pool, chunk, image_futures):
+        loaded = [future.result() for future in image_futures]
+        keep = [i for i, (_, image) in enumerate(loaded) if image is not None]
+        stats.failed += len(loaded) - len(keep)
+        stats.failed_styles.extend(chunk["style"].iloc[[i for i in range(len(loaded)) if loaded[i][1] is None]])
+        if not keep:
+            return
+        chunk = chunk.iloc[keep]
+        keys = [loaded[i][0] for i in keep]
+        images = [loaded[i][1] for i in keep]
+
+        if cache is not None:
+            dense_embeds, hit_mask = cache.get_many(keys)
+        else:
+            dense_embeds = np.zeros((len(images), clip_model.dimension), dtype=np.float32)
+            hit_mask = np.zeros(len(images), dtype=bool)
+        misses = np.flatnonzero(~hit_mask)
+        stats.cache_hits += len(images) - len(misses)
+
+        if len(misses):
+            # An entry seen as cached while decoding may have been evicted since; it is decoded again
+            for i in misses:
+                if images[i] is CACHED:
+                    images[i] = _load_image(chunk["Image"].iloc[i], None, config, pixel_cache, pool)[1]
+            readable = np.array([image is not None for image in images], dtype=bool)
+            if not readable.all():
+                stats.failed += int((~readable).sum())
+                stats.failed_styles.extend(chunk["style"].iloc[np.flatnonzero(~readable)])
+                chunk = chunk.iloc[np.flatnonzero(readable)]
+                keys = [key for key, ok in zip(keys, readable) if ok]
+                images = [image for image in images if image is not None]
+                dense_embeds, hit_mask = dense_embeds[readable], hit_mask[readable]
+                misses = np.flatnonzero(~hit_mask)
+                if chunk.empty:
+                    return
+        if len(misses):
+            computed = clip_model.get_pixel_embeddings(np.stack([images[i] for i in misses]), batch_size=embed_batch_size)
+            dense_embeds[misses] = computed
+            if cache is not None:
+                cache.put_many([keys[i] for i in misses], computed)
+            stats.images += len(misses)
+
+        sparse_embeds = bm25_model.encode_documents(chunk["Description"].tolist())
+
+        records = [
+            {
+                'id': metadata["style"],
+                'sparse_values': sparse,
+                'values': dense.tolist(),
+                'metadata': _json_metadata(metadata)
+            }
+            for metadata, sparse, dense in zip(chunk.to_dict("records"), sparse_embeds, dense_embeds)
+        ]
+        submit_upsert(upsert_pool, records)
+
+    with ThreadPoolExecutor(max_workers=decode_workers) as decode_pool, \
+            ThreadPoolExecutor(max_workers=max_in_flight) as upsert_pool:
+        pending = None
+        for chunk in _iter_chunks(inventory_df, chunk_size):
+            if skip_existing:
+                existing = _existing_ids(index, chunk["style"].tolist())
+                if existing:
+                    stats.skipped += len(existing)
+                    chunk = chunk[~chunk["style"].isin(existing)]
+            if chunk.empty:
+                continue
+
+            # Start decoding this chunk before embedding the previous one
+            image_futures = [decode_pool.submit(load, path) for path in chunk["Image"]]
+            if pending is not None:
+                embed_chunk(upsert_pool, *pending)
+            pending = (chunk, image_futures)
+
+        if pending is not None:
+            embed_chunk(upsert_pool, *pending)
+
+        while in_flight:
+            in_flight.popleft().result()
+
+    if cache is not None:
+        cache.flush()
+
+    stats.elapsed = time.perf_counter() - start
+    logger.info(f"Ingestion finished: {stats}")
+    return stats
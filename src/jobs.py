@@ -0,0 +1,252 @@
+import io
+import time
+import uuid
+import queue
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class QueueFull(Exception):
+    """Raised by JobManager.submit when the backlog is at capacity"""
+
+
+class Job:
+    def __init__(self, params):
+        """
+        One unit of work submitted to a JobManager
+
+        output collects whatever the job prints (pass it as the file of
+        print or as a stream), so concurrent jobs never share stdout.
+        """
+        self.id = uuid.uuid4().hex
+        self.params = params
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.timings = None
+        self.output = io.StringIO()
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.cancel_requested = threading.Event()
+        self.done = threading.Event()
+
+    def as_dict(self, include_output=False):
+        info = {
+            "job_id": self.id,
+            "status": self.status,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+        if self.error is not None:
+            info["message"] = self.error
+        if self.timings is not None:
+            info["timings_ms"] = self.timings
+        if include_output:
+            info["output"] = self.output.getvalue()
+        return info
+
+    def to_record(self):
+        """Everything another process needs to answer polls for this job"""
+        return {**self.as_dict(include_output=True), "params": self.params, "result": self.result}
+
+    @classmethod
+    def from_record(cls, record):
+        """Read-only copy of a job run by another process"""
+        job = cls(record["params"])
+        job.id = record["job_id"]
+        job.status = record["status"]
+        job.result = record["result"]
+        job.error = record.get("message")
+        job.timings = record.get("timings_ms")
+        job.output.write(record["output"])
+        job.created = record["created"]
+        job.started = record["started"]
+        job.finished = record["finished"]
+        if job.status in FINISHED:
+            job.done.set()
+        return job
+
+
+class JobManager:
+    def __init__(self, run, workers=2, max_queue=16, retention=3600, store=None):
+        """
+        Bounded worker pool with a bounded backlog
+
+        Args:
+          - run: callable(job) doing the work; its return value becomes
+            job.result and an exception marks the job failed
+          - workers: jobs executed at the same time
+          - max_queue: jobs that may wait for a worker; submit raises
+            QueueFull beyond that
+          - retention: seconds finished jobs stay available for polling
+          - store: optional DiskCache shared with other processes running a
+            JobManager (pre-fork workers). Jobs are published there when
+            queued, started and finished, so any process can report their
+            status and result or cancel them. A running job's output is as
+            of its start until it finishes.
+        """
+        self.run = run
+        self.workers = workers
+        self.retention = retention
+        self.store = store
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self._running = 0
+        self._closed = False
+
+    def _start(self):
+        # Threads are started on first use so importing the server stays cheap
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, **params):
+        """Queue a job and return it; raises QueueFull if the backlog is full or the manager is draining"""
+        if self._closed:
+            raise QueueFull("Not accepting jobs, shutting down")
+        self._start()
+        self._prune()
+        job = Job(params)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            raise QueueFull(f"Job queue is full ({self._queue.maxsize} waiting)")
+        with self._lock:
+            self._jobs[job.id] = job
+        self._publish(job)
+        return job
+
+    def get(self, job_id):
+        """The job, from this process or the shared store; None if unknown"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None or self.store is None:
+            return job
+        record = self.store.get(f"job:{job_id}")
+        return Job.from_record(record) if record is not None else None
+
+    def _publish(self, job):
+        if self.store is None:
+            return
+        try:
+            self.store.set(f"job:{job.id}", job.to_record(), ttl=self.retention)
+        except Exception as e:
+            logger.warning(f"Could not publish job {job.id}: {str(e)}")
+
+    def _cancelled_elsewhere(self, job):
+        return self.store is not None and self.store.get(f"job:{job.id}:cancel") is not None
+
+    def cancel(self, job_id):
+        """
+        Cancel a job
+
+        A queued job is dropped before it starts. A running job cannot be
+        interrupted mid-stage; it is marked cancelled and its result is
+        discarded when the current run returns.
+
+        A job owned by another process is flagged in the shared store; its
+        owner drops it before it starts or discards its result afterwards.
+
+        Return:
+          - the job, or None if the id is unknown
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            job = self.get(job_id)
+            if job is not None and job.status not in FINISHED:
+                self.store.set(f"job:{job_id}:cancel", True, ttl=self.retention)
+                job.cancel_requested.set()
+            return job
+        job.cancel_requested.set()
+        with self._lock:
+            if job.status == QUEUED:
+                self._finish(job, CANCELLED)
+        return job
+
+    def _finish(self, job, status):
+        job.status = status
+        job.finished = time.time()
+        job.done.set()
+        self._publish(job)
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if self._cancelled_elsewhere(job):
+                job.cancel_requested.set()
+            with self._lock:
+                if job.status != QUEUED:
+                    continue
+                if job.cancel_requested.is_set():
+                    self._finish(job, CANCELLED)
+                    continue
+                job.status = RUNNING
+                job.started = time.time()
+                self._running += 1
+            self._publish(job)
+            try:
+                result = self.run(job)
+            except Exception as e:
+                job.error = f"{type(e).__name__}: {str(e)}"
+                logger.warning(f"Job {job.id} failed: {job.error}")
+                status = FAILED
+            else:
+                status = SUCCEEDED
+                if self._cancelled_elsewhere(job):
+                    job.cancel_requested.set()
+                if not job.cancel_requested.is_set():
+                    job.result = result
+            with self._lock:
+                self._running -= 1
+                self._finish(job, CANCELLED if job.cancel_requested.is_set() else status)
+
+    def drain(self, timeout=None):
+        """
+        Stop accepting jobs and wait for the queued and running ones to finish
+
+        Return:
+          - True if they all finished within timeout seconds
+        """
+        self._closed = True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            pending = [job for job in self._jobs.values() if job.status not in FINISHED]
+        for job in pending:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not job.done.wait(remaining):
+                return False
+        return True
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items() if job.finished and job.finished < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "running": self._running,
+                "queued": self._queue.qsize(),
+                "max_queue": self._queue.maxsize,
+            }
@@ -0,0 +1,322 @@
+import os
+import time
+import random
+import logging
+import threading
+import httpx
+from src.metrics import REGISTRY
+from src.llm_cache import setup_llm_cache, response_tokens
+
+logger = logging.getLogger(__name__)
+
+# Connection pool shared by every client of a provider
+HTTP_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=16, keepalive_expiry=60)
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+
+RETRY_ATTEMPTS = 4
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 8.0
+
+LLM_CALLS = REGISTRY.counter(
+    "outbound_llm_calls_total", "LLM requests by outcome (success, retry, error, cached)", ["outcome"]
+)
+
+_clients = {}
+_chains = {}
+_lock = threading.Lock()
+_llm_cache = None
+_llm_cache_loaded = False
+_limiters = {}
+
+
+def _build_client(provider, model_name, temperature):
+    # Retries are handled by invoke_with_retry, so the SDK's own are disabled
+    http_client = httpx.Client(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+    if provider == "groq":
+        from langchain_groq import ChatGroq
+        return ChatGroq(
+            temperature=temperature,
+            model_name=model_name,
+            http_client=http_client,
+            max_retries=0
+        )
+    if provider == "openai":
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(
+            temperature=temperature,
+            model=model_name,
+            http_client=http_client,
+            max_retries=0
+        )
+    raise ValueError(f"Unknown LLM provider: {provider}")
+
+
+def _model_name(provider, model_name):
+    if model_name is None and provider == "groq":
+        return os.getenv("GROQ_MODEL_NAME_1")
+    return model_name
+
+
+def get_llm(provider="groq", model_name=None, temperature=0):
+    """
+    Process-wide chat model for a provider/model, built once and reused
+
+    Args:
+      - provider: "groq" or "openai"
+      - model_name: defaults to GROQ_MODEL_NAME_1 for groq
+      - temperature: sampling temperature
+    """
+    model_name = _model_name(provider, model_name)
+    key = (provider, model_name, temperature)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _build_client(provider, model_name, temperature)
+                _clients[key] = client
+    return client
+
+
+def register_llm(client, provider="groq", model_name=None, temperature=0):
+    """
+    Serve get_llm(provider, model_name, temperature) from client, e.g. a
+    stand-in chat model for offline benchmarks
+
+    Chains composed over the previous client are dropped with it.
+    """
+    model_name = _model_name(provider, model_name)
+    with _lock:
+        previous = _clients.get((provider, model_name, temperature))
+        _clients[(provider, model_name, temperature)] = client
+        if previous is not None:
+            for key in [key for key in _chains if key[1] == id(previous)]:
+                del _chains[key]
+
+
+def get_chain(prompt, provider="groq", model_name=None):
+    """prompt | llm, composed once per prompt and model"""
+    llm = get_llm(provider, model_name)
+    key = (id(prompt), id(llm))
+    chain = _chains.get(key)
+    if chain is None:
+        chain = prompt | llm
+        _chains[key] = chain
+    return chain
+
+
+def get_llm_cache():
+    """Process-wide LLM response cache, built from LLM_CACHE_* env on first use; None if disabled"""
+    global _llm_cache, _llm_cache_loaded
+    if not _llm_cache_loaded:
+        with _lock:
+            if not _llm_cache_loaded:
+                _llm_cache = setup_llm_cache()
+                _llm_cache_loaded = True
+    return _llm_cache
+
+
+def set_llm_cache(cache):
+    """Use cache (an LLMCache, or None to disable caching) instead of the one configured by env"""
+    global _llm_cache, _llm_cache_loaded
+    with _lock:
+        _llm_cache = cache
+        _llm_cache_loaded = True
+
+
+class RateLimiter:
+    def __init__(self, rate, burst=1):
+        """Thread-safe token bucket allowing rate calls per second with bursts of up to burst calls"""
+        if rate <= 0:
+            raise ValueError(f"Rate must be positive, got {rate}")
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, sleeping until one is available"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # A negative balance reserves a future token, so waiters are served in order
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+def set_rate_limits(rate_limits):
+    """
+    Throttle provider requests made through this module
+
+    Only requests actually sent count: cache hits take no token, retries do.
+
+    Args:
+      - rate_limits: {provider: requests per second}; None or {} removes the limits
+
+    Return:
+      - the previous {provider: RateLimiter}, for restore_rate_limits
+    """
+    global _limiters
+    previous = _limiters
+    _limiters = {provider: RateLimiter(rate) for provider, rate in (rate_limits or {}).items()}
+    return previous
+
+
+def restore_rate_limits(limiters):
+    """Put back limiters returned by set_rate_limits"""
+    global _limiters
+    _limiters = limiters
+
+
+def _throttle(provider):
+    limiter = _limiters.get(provider)
+    if limiter is not None:
+        limiter.acquire()
+
+
+def is_retryable(error):
+    """Rate limits, server errors, timeouts and dropped connections are worth retrying"""
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    if isinstance(error, (ConnectionError, TimeoutError, httpx.TransportError)):
+        return True
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def backoff_delay(attempt, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+    """Full-jitter exponential backoff"""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+def invoke_with_retry(runnable, inputs, attempts=RETRY_ATTEMPTS, provider=None):
+    """
+    Invoke a chain, retrying transient provider errors with jittered backoff
+
+    Each attempt waits for provider's rate limit, if one is set.
+    """
+    for attempt in range(attempts):
+        try:
+            _throttle(provider)
+            response = runnable.invoke(inputs)
+            LLM_CALLS.inc(outcome="success")
+            return response
+        except Exception as e:
+            if attempt == attempts - 1 or not is_retryable(e):
+                LLM_CALLS.inc(outcome="error")
+                raise
+            LLM_CALLS.inc(outcome="retry")
+            delay = backoff_delay(attempt)
+            logger.warning(f"LLM call failed ({type(e).__name__}), retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+
+def stream_with_retry(runnable, inputs, attempts=RETRY_ATTEMPTS, provider=None):
+    """
+    Stream chunk texts from a chain
+
+    Transient errors are retried only until the first chunk has been
+    yielded; after that a restart would duplicate output, so they raise.
+    Each attempt waits for provider's rate limit, if one is set.
+    """
+    for attempt in range(attempts):
+        started = False
+        try:
+            _throttle(provider)
+            for chunk in runnable.stream(inputs):
+                started = True
+                if chunk.content:
+                    yield chunk.content
+            LLM_CALLS.inc(outcome="success")
+            return
+        except Exception as e:
+            if started or attempt == attempts - 1 or not is_retryable(e):
+                LLM_CALLS.inc(outcome="error")
+                raise
+            LLM_CALLS.inc(outcome="retry")
+            delay = backoff_delay(attempt)
+            logger.warning(f"LLM stream failed ({type(e).__name__}), retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+
+def _cache_key(cache, prompt, inputs, template_version, provider, model_name):
+    # Chains from get_chain run at temperature 0, so the rendered prompt determines the completion
+    return cache.key(f"{provider}:{_model_name(provider, model_name)}", prompt.format(**inputs), template_version)
+
+
+def invoke_cached(prompt, inputs, template_version, provider="groq", model_name=None, bypass=False,
+                  validate=None, use_cache=True):
+    """
+    Invoke get_chain(prompt) with retries, through the LLM response cache
+
+    Args:
+      - prompt: the PromptTemplate; its rendering with inputs is part of the key
+      - template_version: bump when the prompt's meaning changes without its text
+      - bypass: skip the lookup for this call; the fresh completion is still stored
+      - validate: callable(content) raising on a completion the caller cannot
+        use (e.g. JsonOutputParser().parse); such a completion is not stored,
+        its error is raised, and a cached one failing it is dropped and re-fetched
+      - use_cache: False calls the model directly, for callers whose results
+        already have their own cache
+
+    Return:
+      - an AIMessage; response_metadata["cached"] is True when it came from the cache
+    """
+    chain = get_chain(prompt, provider, model_name)
+    cache = get_llm_cache() if use_cache else None
+    if cache is None:
+        return invoke_with_retry(chain, inputs, provider=provider)
+
+    from langchain_core.messages import AIMessage
+    key = _cache_key(cache, prompt, inputs, template_version, provider, model_name)
+    content = cache.get(key, bypass)
+    if content is not None:
+        try:
+            if validate is not None:
+                validate(content)
+            LLM_CALLS.inc(outcome="cached")
+            return AIMessage(content=content, response_metadata={
+                "cached": True, "model_name": _model_name(provider, model_name)
+            })
+        except Exception as e:
+            logger.warning(f"Dropping cached LLM response that fails validation ({type(e).__name__})")
+            cache.delete(key)
+
+    start = time.perf_counter()
+    response = invoke_with_retry(chain, inputs, provider=provider)
+    if validate is not None:
+        validate(response.content)
+    cache.put(key, response.content, response_tokens(response), time.perf_counter() - start)
+    return response
+
+
+def stream_cached(prompt, inputs, template_version, provider="groq", model_name=None, bypass=False):
+    """
+    stream_with_retry through the LLM response cache
+
+    A hit is yielded as one chunk; a completion streamed to the end is stored.
+    """
+    chain = get_chain(prompt, provider, model_name)
+    cache = get_llm_cache()
+    if cache is None:
+        yield from stream_with_retry(chain, inputs, provider=provider)
+        return
+
+    key = _cache_key(cache, prompt, inputs, template_version, provider, model_name)
+    content = cache.get(key, bypass)
+    if content is not None:
+        LLM_CALLS.inc(outcome="cached")
+        yield content
+        return
+
+    start = time.perf_counter()
+    chunks = []
+    for chunk in stream_with_retry(chain, inputs, provider=provider):
+        chunks.append(chunk)
+        yield chunk
+    # Streams do not report token usage
+    cache.put(key, "".join(chunks), 0, time.perf_counter() - start)
@@ -0,0 +1,89 @@
+import os
+import hashlib
+from src.disk_cache import DiskCache
+from src.metrics import REGISTRY
+
+SAVED_TOKENS = REGISTRY.counter(
+    "outbound_llm_cache_saved_tokens_total", "Provider tokens not spent thanks to LLM cache hits"
+)
+SAVED_SECONDS = REGISTRY.counter(
+    "outbound_llm_cache_saved_seconds_total", "Provider latency not waited for thanks to LLM cache hits"
+)
+
+
+def response_tokens(response):
+    """Total tokens an AIMessage reports using, 0 if the provider did not say"""
+    usage = getattr(response, "usage_metadata", None)
+    if usage and usage.get("total_tokens"):
+        return usage["total_tokens"]
+    token_usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+    return token_usage.get("total_tokens") or 0
+
+
+class LLMCache:
+    def __init__(self, path, ttl=None, max_bytes=128 * 1024 * 1024, bypass=False):
+        """
+        Completions of temperature-0 prompts keyed by model, rendered prompt
+        and prompt-template version
+
+        Each entry keeps the tokens and seconds the original call took, so
+        hits can report what they saved.
+
+        Args:
+          - path: SQLite file
+          - ttl: seconds an entry stays fresh, None for no expiry
+          - max_bytes: size bound, least recently used entries evicted first
+          - bypass: never read the cache, only refresh it with new completions
+        """
+        self.store = DiskCache(path, max_bytes=max_bytes, default_ttl=ttl)
+        self.bypass = bypass
+        self.saved_tokens = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def key(model, prompt, template_version):
+        digest = hashlib.sha256()
+        for part in (model, template_version, prompt):
+            digest.update(str(part).encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key, bypass=False):
+        """Cached completion text for key, or None on a miss or when bypassed"""
+        if bypass or self.bypass:
+            return None
+        entry = self.store.get(key)
+        if entry is None:
+            return None
+        self.saved_tokens += entry["tokens"]
+        self.saved_seconds += entry["seconds"]
+        SAVED_TOKENS.inc(entry["tokens"])
+        SAVED_SECONDS.inc(entry["seconds"])
+        return entry["content"]
+
+    def put(self, key, content, tokens=0, seconds=0.0):
+        self.store.set(key, {"content": content, "tokens": tokens, "seconds": round(seconds, 3)})
+
+    def delete(self, key):
+        self.store.delete(key)
+
+    def stats(self):
+        return {
+            **self.store.stats(),
+            "saved_tokens": self.saved_tokens,
+            "saved_seconds": round(self.saved_seconds, 3),
+        }
+
+
+def setup_llm_cache():
+    """LLM response cache under LLM_CACHE_DIR, or None if it is not set"""
+    cache_dir = os.getenv("LLM_CACHE_DIR")
+    if not cache_dir:
+        return None
+    ttl = os.getenv("LLM_CACHE_TTL")
+    return LLMCache(
+        os.path.join(cache_dir, "llm.sqlite"),
+        ttl=float(ttl) if ttl else None,
+        max_bytes=int(os.getenv("LLM_CACHE_MAX_MB", 128)) * 1024 * 1024,
+        bypass=os.getenv("LLM_CACHE_BYPASS", "").lower() in ("1", "true")
+    )
@@ -0,0 +1,306 @@
+import os
+import json
+import uuid
+import shutil
+import hashlib
+import threading
+from types import SimpleNamespace
+import numpy as np
+
+_HASH_MASK = (1 << 64) - 1
+
+
+class LocalHybridIndex:
+    # Query vectors may be passed as NumPy arrays; see src.search.to_wire_format
+    accepts_numpy = True
+
+    def __init__(self, dimension=512):
+        """
+        In-process hybrid (dense + sparse) dotproduct index
+
+        Drop-in replacement for a Pinecone index handle for catalogs that fit
+        in RAM: supports upsert, fetch, delete, query and describe_index_stats
+        with the same arguments and response shapes used in this project.
+
+        Dense vectors are rows of a contiguous float32 matrix; sparse BM25
+        vectors are kept per row and compacted into CSR arrays on the first
+        query after a write.
+
+        fingerprint identifies the stored content itself: an order-independent
+        sum of per-record hashes, kept up to date on every write. It doubles
+        as the version stamp caches of search results are keyed by, so they
+        stay valid across restarts and processes exactly as long as the
+        content is unchanged.
+        """
+        self.dimension = dimension
+        self.ids = []
+        self.metadata = []
+        self._rows = {}
+        self._row_hashes = []
+        self._hash_sum = 0
+        self._dense = np.zeros((0, dimension), dtype=np.float32)
+        self._sparse = []
+        self._csr = None
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def fingerprint(self):
+        """Identity of the stored records; equal for indexes holding the same records"""
+        return f"{len(self.ids)}:{self._hash_sum:016x}"
+
+    @property
+    def version(self):
+        return self.fingerprint
+
+    def _record_hash(self, row):
+        digest = hashlib.blake2b(digest_size=8)
+        digest.update(str(self.ids[row]).encode("utf-8"))
+        digest.update(np.ascontiguousarray(self._dense[row], dtype=np.float32).tobytes())
+        indices, values = self._sparse[row]
+        digest.update(np.asarray(indices, dtype=np.int64).tobytes())
+        digest.update(np.asarray(values, dtype=np.float32).tobytes())
+        digest.update(json.dumps(self.metadata[row], sort_keys=True, default=str).encode("utf-8"))
+        return int.from_bytes(digest.digest(), "little")
+
+    def _rehash(self):
+        self._row_hashes = [self._record_hash(row) for row in range(len(self.ids))]
+        self._hash_sum = sum(self._row_hashes) & _HASH_MASK
+
+    def _reserve(self, size):
+        """Grow the dense matrix geometrically; also un-shares a read-only (mmap) matrix"""
+        if size <= len(self._dense) and self._dense.flags.writeable:
+            return
+        capacity = max(size, 2 * len(self._dense), 64)
+        dense = np.zeros((capacity, self.dimension), dtype=np.float32)
+        dense[:len(self.ids)] = self._dense[:len(self.ids)]
+        self._dense = dense
+
+    @staticmethod
+    def _as_sparse(sparse_vector):
+        if not sparse_vector:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return (np.asarray(sparse_vector["indices"], dtype=np.int64),
+                np.asarray(sparse_vector["values"], dtype=np.float32))
+
+    def upsert(self, vectors):
+        """Insert or overwrite records of the form {'id', 'values', 'sparse_values', 'metadata'}"""
+        with self._lock:
+            self._reserve(len(self.ids) + len(vectors))
+            for record in vectors:
+                row = self._rows.get(record["id"])
+                if row is None:
+                    row = len(self.ids)
+                    self._rows[record["id"]] = row
+                    self.ids.append(record["id"])
+                    self.metadata.append(None)
+                    self._sparse.append(None)
+                    self._row_hashes.append(0)
+                self._dense[row] = np.asarray(record["values"], dtype=np.float32)
+                self._sparse[row] = self._as_sparse(record.get("sparse_values"))
+                self.metadata[row] = record.get("metadata", {})
+                row_hash = self._record_hash(row)
+                self._hash_sum = (self._hash_sum - self._row_hashes[row] + row_hash) & _HASH_MASK
+                self._row_hashes[row] = row_hash
+            self._csr = None
+        return {"upserted_count": len(vectors)}
+
+    def fetch(self, ids):
+        """Return the stored records for the given ids that exist"""
+        found = {}
+        with self._lock:
+            for id_ in ids:
+                row = self._rows.get(id_)
+                if row is None:
+                    continue
+                indices, values = self._sparse[row]
+                found[id_] = {
+                    "id": id_,
+                    "values": self._dense[row].tolist(),
+                    "sparse_values": {"indices": indices.tolist(), "values": values.tolist()},
+                    "metadata": self.metadata[row],
+                }
+        return {"vectors": found}
+
+    def delete(self, ids):
+        """Remove records by id; unknown ids are ignored. The last row is moved into each freed slot"""
+        with self._lock:
+            self._reserve(len(self.ids))
+            for id_ in ids:
+                row = self._rows.pop(id_, None)
+                if row is None:
+                    continue
+                self._hash_sum = (self._hash_sum - self._row_hashes[row]) & _HASH_MASK
+                last = len(self.ids) - 1
+                if row != last:
+                    moved = self.ids[last]
+                    self.ids[row] = moved
+                    self.metadata[row] = self.metadata[last]
+                    self._sparse[row] = self._sparse[last]
+                    self._dense[row] = self._dense[last]
+                    self._row_hashes[row] = self._row_hashes[last]
+                    self._rows[moved] = row
+                self.ids.pop()
+                self.metadata.pop()
+                self._sparse.pop()
+                self._row_hashes.pop()
+            self._csr = None
+        return {}
+
+    def describe_index_stats(self):
+        """Index statistics in the same shape as Pinecone"""
+        return {"dimension": self.dimension, "total_vector_count": len(self.ids)}
+
+    def _build_csr(self):
+        """Compact per-row sparse vectors into (row_of_nnz, indices, data) arrays"""
+        lengths = np.fromiter((len(indices) for indices, _ in self._sparse), dtype=np.int64, count=len(self._sparse))
+        if lengths.sum():
+            indices = np.concatenate([indices for indices, _ in self._sparse])
+            data = np.concatenate([values for _, values in self._sparse])
+        else:
+            indices = np.empty(0, dtype=np.int64)
+            data = np.empty(0, dtype=np.float32)
+        indptr = np.concatenate(([0], np.cumsum(lengths)))
+        row_of_nnz = np.repeat(np.arange(len(lengths)), lengths)
+        return SimpleNamespace(indptr=indptr, indices=indices, data=data, row_of_nnz=row_of_nnz)
+
+    def _snapshot(self):
+        with self._lock:
+            if self._csr is None:
+                self._csr = self._build_csr()
+            n = len(self.ids)
+            return self._dense[:n], self._csr, list(self.ids), list(self.metadata)
+
+    def compact(self):
+        """Build the CSR arrays now rather than on the next query (e.g. before forking workers)"""
+        self._snapshot()
+
+    def sparse_scores(self, sparse_vector, csr, n):
+        """Dot product of a sparse query with every stored sparse vector"""
+        q_indices, q_values = self._as_sparse(sparse_vector)
+        if not len(q_indices) or not len(csr.indices):
+            return np.zeros(n, dtype=np.float32)
+        order = np.argsort(q_indices)
+        q_indices, q_values = q_indices[order], q_values[order]
+        pos = np.searchsorted(q_indices, csr.indices)
+        pos[pos == len(q_indices)] = 0
+        matched = q_indices[pos] == csr.indices
+        contributions = np.where(matched, csr.data * q_values[pos], 0.0)
+        return np.bincount(csr.row_of_nnz, weights=contributions, minlength=n).astype(np.float32)
+
+    def _matches(self, scores, top_k, ids, metadata, include_metadata):
+        k = min(top_k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        matches = []
+        for row in top:
+            match = {"id": ids[row], "score": float(scores[row])}
+            if include_metadata:
+                match["metadata"] = metadata[row]
+            matches.append(match)
+        return matches
+
+    def query(self, top_k, vector=None, sparse_vector=None, include_metadata=False, **kwargs):
+        """Top-k records by dense dotproduct plus sparse dotproduct"""
+        dense, csr, ids, metadata = self._snapshot()
+        scores = np.zeros(len(ids), dtype=np.float32)
+        if vector is not None:
+            scores += dense @ np.asarray(vector, dtype=np.float32)
+        if sparse_vector:
+            scores += self.sparse_scores(sparse_vector, csr, len(ids))
+        return SimpleNamespace(matches=self._matches(scores, top_k, ids, metadata, include_metadata))
+
+    def query_multi_alpha(self, top_k, vector, sparse_vector, style_similarities, include_metadata=False):
+        """
+        One scoring pass re-ranked for several hybrid weights
+
+        Equivalent to calling query with hybrid_scale(sparse_vector, vector, alpha)
+        for each alpha, but the dense and sparse scores are computed only once.
+        """
+        dense, csr, ids, metadata = self._snapshot()
+        dense_scores = dense @ np.asarray(vector, dtype=np.float32)
+        sparse_scores = self.sparse_scores(sparse_vector, csr, len(ids))
+        return [
+            SimpleNamespace(matches=self._matches(
+                alpha * dense_scores + (1 - alpha) * sparse_scores, top_k, ids, metadata, include_metadata
+            ))
+            for alpha in style_similarities
+        ]
+
+    def save(self, path):
+        """
+        Persist to a directory: records.json plus a data-* subdirectory with
+        dense.npy, the sparse CSR arrays and the record hashes
+
+        The arrays go to a new subdirectory and records.json, which names
+        it, is replaced last, so a save that dies midway leaves the previous
+        index loadable. Older subdirectories are removed afterwards; processes
+        that memory-mapped them keep their mapping.
+        """
+        with self._lock:
+            dense, csr, ids, metadata = self._snapshot()
+            row_hashes = np.array(self._row_hashes, dtype=np.uint64)
+        data_dir = f"data-{uuid.uuid4().hex[:12]}"
+        os.makedirs(os.path.join(path, data_dir))
+        np.save(os.path.join(path, data_dir, "dense.npy"), np.ascontiguousarray(dense))
+        np.save(os.path.join(path, data_dir, "sparse_indptr.npy"), csr.indptr)
+        np.save(os.path.join(path, data_dir, "sparse_indices.npy"), csr.indices)
+        np.save(os.path.join(path, data_dir, "sparse_data.npy"), csr.data)
+        np.save(os.path.join(path, data_dir, "row_hashes.npy"), row_hashes)
+        tmp_path = os.path.join(path, "records.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"dimension": self.dimension, "data": data_dir, "ids": ids, "metadata": metadata}, f, default=str)
+        os.replace(tmp_path, os.path.join(path, "records.json"))
+        for name in os.listdir(path):
+            if name.startswith("data-") and name != data_dir:
+                shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+            elif name.endswith(".npy"):
+                # Arrays of a save from before the data-* subdirectories
+                os.remove(os.path.join(path, name))
+
+    @classmethod
+    def load(cls, path, mmap=False):
+        """
+        Load an index saved with save()
+
+        With mmap=True the dense matrix is memory-mapped read-only, so
+        processes loading the same files share its pages; the first write
+        copies it into private memory.
+        """
+        with open(os.path.join(path, "records.json")) as f:
+            records = json.load(f)
+        index = cls(dimension=records["dimension"])
+        index.ids = records["ids"]
+        index.metadata = records["metadata"]
+        index._rows = {id_: row for row, id_ in enumerate(index.ids)}
+        # Saves from before the data-* subdirectories kept the arrays next to records.json
+        data_path = os.path.join(path, records.get("data", ""))
+        index._dense = np.load(os.path.join(data_path, "dense.npy"), mmap_mode="r" if mmap else None)
+
+        indptr = np.load(os.path.join(data_path, "sparse_indptr.npy"))
+        indices = np.load(os.path.join(data_path, "sparse_indices.npy"))
+        data = np.load(os.path.join(data_path, "sparse_data.npy"))
+        index._sparse = [
+            (indices[indptr[row]:indptr[row + 1]], data[indptr[row]:indptr[row + 1]])
+            for row in range(len(index.ids))
+        ]
+        hashes_path = os.path.join(data_path, "row_hashes.npy")
+        row_hashes = np.load(hashes_path) if os.path.exists(hashes_path) else None
+        if row_hashes is not None and len(row_hashes) == len(index.ids):
+            index._row_hashes = [int(row_hash) for row_hash in row_hashes]
+            index._hash_sum = sum(index._row_hashes) & _HASH_MASK
+        else:
+            # Saved before record hashes were kept
+            index._rehash()
+        return index
+
+
+def setup_local_index(path=None, dimension=512, mmap=False):
+    """Load the local index from path if it was saved there, otherwise start an empty one"""
+    if path and os.path.exists(os.path.join(path, "records.json")):
+        return LocalHybridIndex.load(path, mmap=mmap)
+    return LocalHybridIndex(dimension=dimension)
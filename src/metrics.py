@@ -0,0 +1,386 @@
+import os
+import json
+import time
+import math
+import threading
+import functools
+from contextlib import contextmanager
+
+# Seconds; spans cached lookups (sub-millisecond) to LLM calls (tens of seconds)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, registry, name, help, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple((name, labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self):
+        """(suffix, labels, value) triples for rendering"""
+        with self._lock:
+            return [("", key, value) for key, value in self._values.items()]
+
+    def _merge(self, key, value):
+        self._values[key] = self._values.get(key, 0) + value
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, registry, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the enclosed block"""
+        if not self.registry.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _merge(self, key, value):
+        state = self._values.get(key)
+        if state is None:
+            state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+        state[0] = [a + b for a, b in zip(state[0], value[0])]
+        state[1] += value[1]
+        state[2] += value[2]
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    samples.append(("_bucket", key + (("le", _format_value(bound)),), cumulative))
+                samples.append(("_sum", key, total))
+                samples.append(("_count", key, count))
+        return samples
+
+
+class Registry:
+    def __init__(self, enabled=True):
+        """
+        Process-wide set of metrics rendered in the Prometheus text format
+
+        When disabled every update returns after one attribute check, so
+        instrumented code costs next to nothing.
+        """
+        self.enabled = enabled
+        self.directory = None
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(self, name, help, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._get(Counter, name, help, labelnames)
+
+    def gauge(self, name, help, labelnames=()):
+        return self._get(Gauge, name, help, labelnames)
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help, labelnames, buckets=buckets)
+
+    def register_collector(self, collect):
+        """
+        Add a callable run at scrape time, returning a list of
+        (name, type, help, [(labels dict, value), ...]) for values that
+        live elsewhere (cache stats, queue depths)
+        """
+        self._collectors.append(collect)
+
+    def use_directory(self, directory):
+        """
+        Aggregate the metrics of several processes (pre-fork workers)
+        through snapshot files in directory; call in the parent before forking
+
+        Each process writes its snapshot when scraped and every few seconds
+        (see reset_after_fork), and render() merges them all: counters and
+        histograms summed over every process that wrote one, gauges over
+        live ones, collector values labelled with their worker's pid.
+        Values of other processes are as of their last snapshot.
+        """
+        os.makedirs(directory, exist_ok=True)
+        # Left over from an earlier run
+        for name in os.listdir(directory):
+            if name.endswith(".json"):
+                os.remove(os.path.join(directory, name))
+        self.directory = directory
+
+    def reset_after_fork(self, flush_interval=5.0):
+        """
+        In a worker forked after use_directory: drop the values inherited
+        from the parent, whose own snapshot already counts them, and write
+        snapshots every flush_interval seconds
+        """
+        if self.directory is None:
+            return
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            with metric._lock:
+                metric._values.clear()
+
+        def flush():
+            while True:
+                time.sleep(flush_interval)
+                self.write_snapshot()
+
+        threading.Thread(target=flush, name="metrics-flush", daemon=True).start()
+
+    def write_snapshot(self):
+        """Write this process's values where the other processes read them"""
+        if self.directory is None:
+            return
+        with self._lock:
+            metrics = list(self._metrics.values())
+        snapshot = {"metrics": {}, "collected": self._collect()}
+        for metric in metrics:
+            with metric._lock:
+                values = [[key, value] for key, value in metric._values.items()]
+            snapshot["metrics"][metric.name] = {
+                "type": metric.type,
+                "help": metric.help,
+                "labelnames": metric.labelnames,
+                "buckets": metric.buckets[:-1] if isinstance(metric, Histogram) else None,
+                "values": values,
+            }
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        try:
+            with open(path + ".tmp", "w") as f:
+                json.dump(snapshot, f)
+            os.replace(path + ".tmp", path)
+        except OSError:
+            pass
+
+    def _merge_snapshots(self):
+        merged = Registry()
+        families = {}
+        for filename in sorted(os.listdir(self.directory)):
+            if not filename.endswith(".json"):
+                continue
+            pid = int(filename[:-len(".json")])
+            try:
+                with open(os.path.join(self.directory, filename)) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            live = _alive(pid)
+            for name, entry in snapshot["metrics"].items():
+                if entry["type"] == "gauge" and not live:
+                    continue
+                cls = _TYPES[entry["type"]]
+                kwargs = {"buckets": entry["buckets"]} if cls is Histogram else {}
+                metric = merged._get(cls, name, entry["help"], entry["labelnames"], **kwargs)
+                for key, value in entry["values"]:
+                    metric._merge(tuple(tuple(pair) for pair in key), value)
+            if not live:
+                continue
+            for name, type_, help, samples in snapshot["collected"]:
+                family = families.setdefault(name, (name, type_, help, []))
+                family[3].extend(({**labels, "worker": pid}, value) for labels, value in samples)
+        return list(merged._metrics.values()), list(families.values())
+
+    def _collect(self):
+        families = []
+        for collect in self._collectors:
+            try:
+                families.extend(collect())
+            except Exception:
+                continue
+        return families
+
+    def render(self):
+        if self.directory is not None:
+            self.write_snapshot()
+            metrics, families = self._merge_snapshots()
+        else:
+            with self._lock:
+                metrics = list(self._metrics.values())
+            families = self._collect()
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for suffix, labels, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        for name, type_, help, samples in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {type_}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+_TYPES = {"counter": Counter, "gauge": Gauge, "histogram": Histogram}
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+REGISTRY = Registry(enabled=os.getenv("METRICS_ENABLED", "true").lower() not in ("0", "false", "no"))
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "outbound_stage_seconds", "Duration of pipeline, startup and model stages", ["stage"]
+)
+STAGE_IN_PROGRESS = REGISTRY.gauge(
+    "outbound_stage_in_progress", "Stages currently running", ["stage"]
+)
+STAGE_ERRORS = REGISTRY.counter(
+    "outbound_stage_errors_total", "Stages that raised", ["stage"]
+)
+ITEMS = REGISTRY.counter(
+    "outbound_items_total", "Items processed by model stages (images, texts, documents)", ["stage"]
+)
+
+
+@contextmanager
+def track_stage(stage):
+    """Latency histogram, in-flight gauge and error counter around one stage"""
+    if not REGISTRY.enabled:
+        yield
+        return
+    STAGE_IN_PROGRESS.inc(stage=stage)
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+        STAGE_IN_PROGRESS.dec(stage=stage)
+
+
+def timed(stage):
+    """Decorator form of track_stage"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not REGISTRY.enabled:
+                return fn(*args, **kwargs)
+            with track_stage(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def cache_collector(caches):
+    """
+    Collector exposing hit/miss counters and hit ratios of caches with a
+    stats() dict (DiskCache, PageCache, ExtractionCache, EmbeddingCache)
+
+    Args:
+      - caches: callable returning {cache name: cache or None}
+    """
+    def collect():
+        hits, misses, ratio = [], [], []
+        for name, cache in caches().items():
+            if cache is None:
+                continue
+            stats = cache.stats()
+            if "hits" not in stats:
+                continue
+            lookups = stats["hits"] + stats.get("misses", 0)
+            hits.append(({"cache": name}, stats["hits"]))
+            misses.append(({"cache": name}, stats.get("misses", 0)))
+            ratio.append(({"cache": name}, stats["hits"] / lookups if lookups else 0.0))
+        return [
+            ("outbound_cache_hits_total", "counter", "Cache hits", hits),
+            ("outbound_cache_misses_total", "counter", "Cache misses", misses),
+            ("outbound_cache_hit_ratio", "gauge", "Cache hits over lookups", ratio),
+        ]
+    return collect
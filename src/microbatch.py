@@ -0,0 +1,164 @@
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from src.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZES = REGISTRY.histogram(
+    "outbound_microbatch_size", "Items per batched forward pass", ["batcher"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+QUEUE_DEPTH = REGISTRY.histogram(
+    "outbound_microbatch_queue_depth", "Items still waiting when a batch is formed", ["batcher"],
+    buckets=(0, 1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+QUEUE_WAIT = REGISTRY.histogram(
+    "outbound_microbatch_wait_seconds", "Time an item waited before its batch started", ["batcher"],
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+)
+
+
+class MicroBatcher:
+    def __init__(self, fn, max_batch_size=32, max_wait=0.0, name="batch"):
+        """
+        Coalesces single-item calls from concurrent threads into batched calls
+
+        A worker thread takes everything waiting (up to max_batch_size) and
+        runs fn on it once, then hands each caller its own result. The batch
+        is dispatched as soon as the queue is drained: items arriving while
+        fn runs form the next batch, so batches grow with load without any
+        item waiting for a timer. With max_wait > 0 the worker instead holds
+        a batch that already has several items open up to max_wait seconds
+        for more, trading up to max_wait of added latency per request for
+        larger batches under concurrent load.
+
+        An exception escaping a batch fails that batch's futures; the worker
+        keeps running.
+
+        Args:
+          - fn: callable(list of items) -> sequence of results, one per item
+          - max_batch_size: items per call of fn
+          - max_wait: seconds a batch may be held open to fill up, 0 to dispatch once the queue is drained
+          - name: label of the batcher's metrics
+        """
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.name = name
+        self.batches = 0
+        self.items = 0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _start(self):
+        # Started on first use, like the job and evaluation workers, so
+        # a batcher created before a server forks works in every worker
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._work, name=f"microbatch-{self.name}", daemon=True)
+                self._thread.start()
+
+    def submit(self, item):
+        """Queue one item; returns a Future of its result"""
+        self._start()
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def __call__(self, item, timeout=None):
+        """Result for one item, computed in a batch with whatever else is waiting"""
+        return self.submit(item).result(timeout)
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if len(batch) > 1 and self.max_wait > 0:
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+        return [entry for entry in batch if entry is not None], None in batch
+
+    def _work(self):
+        while True:
+            batch, stopping = self._next_batch()
+            if batch:
+                try:
+                    self._run(batch)
+                except BaseException as e:
+                    # The worker must outlive any failure, or every later caller would block forever
+                    logger.exception(f"{self.name}: batch of {len(batch)} failed")
+                    for _, future, _ in batch:
+                        if not future.done():
+                            future.set_exception(e)
+            if stopping:
+                return
+
+    def _run(self, batch):
+        start = time.perf_counter()
+        BATCH_SIZES.observe(len(batch), batcher=self.name)
+        QUEUE_DEPTH.observe(self._queue.qsize(), batcher=self.name)
+        for _, _, submitted in batch:
+            QUEUE_WAIT.observe(start - submitted, batcher=self.name)
+
+        # Callers that cancelled their future are left out
+        live = [(item, future) for item, future, _ in batch if future.set_running_or_notify_cancel()]
+        if not live:
+            return
+        try:
+            results = self._call(live)
+        except Exception as e:
+            if len(live) == 1:
+                live[0][1].set_exception(e)
+                return
+            # One bad item (e.g. an unreadable image) must not fail the others
+            logger.warning(f"{self.name}: batch of {len(live)} failed ({type(e).__name__}), retrying items one by one")
+            for entry in live:
+                self._run_one(entry)
+            return
+        for (_, future), result in zip(live, results):
+            future.set_result(result)
+        self.batches += 1
+        self.items += len(live)
+
+    def _call(self, entries):
+        results = self.fn([item for item, _ in entries])
+        if len(results) != len(entries):
+            raise ValueError(f"{self.name}: {len(entries)} items in, {len(results)} results out")
+        return results
+
+    def _run_one(self, entry):
+        try:
+            entry[1].set_result(self._call([entry])[0])
+        except Exception as e:
+            entry[1].set_exception(e)
+        self.batches += 1
+        self.items += 1
+
+    def close(self, timeout=None):
+        """Finish what is queued, then stop the worker"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
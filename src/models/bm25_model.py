@@ -1,18 +1,149 @@
+import os
+import json
+from collections import Counter
+import numpy as np
+import pandas as pd
 from pinecone_text.sparse import BM25Encoder
+from src.metrics import timed, ITEMS
+
+def corpus_signature(descriptions):
+    """
+    Order-independent fingerprint of a corpus: the wrapped sum of the
+    texts' 64-bit hashes, so it can be updated as documents come and go
+    """
+    return int(_hash_texts(descriptions).sum()) if len(descriptions) else 0
+
+def _hash_texts(texts):
+    if isinstance(texts, pd.Series) and isinstance(texts.dtype, pd.CategoricalDtype):
+        # Hash each distinct description once
+        category_hashes = pd.util.hash_array(np.asarray(texts.cat.categories, dtype=object))
+        return category_hashes[texts.cat.codes.to_numpy()]
+    return pd.util.hash_array(np.asarray(list(texts), dtype=object))
 
 class BM25ModelWrapper:
-    def __init__(self):
-        """Initialize BM25 encoder"""
-        self.bm25 = BM25Encoder()
-    
+    def __init__(self, encoder=None):
+        """
+        Initialize BM25 encoder
+
+        The corpus statistics (document frequencies, document count and
+        total length) are kept here and pushed into the encoder, so they can
+        be updated in place with add_documents / remove_documents and
+        persisted with save / load instead of refitting on every start.
+
+        Args:
+          - encoder: BM25Encoder to wrap, a default one if None
+        """
+        self.bm25 = encoder if encoder is not None else BM25Encoder()
+        self.doc_freq = Counter()
+        self.n_docs = 0
+        self.sum_doc_len = 0
+        self.corpus_signature = 0
+
     def fit(self, descriptions):
         """Fit BM25 encoder on text descriptions"""
-        self.bm25.fit(descriptions)
-    
+        self.doc_freq = Counter()
+        self.n_docs = 0
+        self.sum_doc_len = 0
+        self.corpus_signature = 0
+        self.add_documents(descriptions)
+
+    def _term_frequencies(self, texts):
+        """(indices, term counts) per distinct text; each is tokenized and hashed once"""
+        return {text: self.bm25._tf(text) for text in dict.fromkeys(texts)}
+
+    @timed("bm25_update")
+    def _update(self, descriptions, sign):
+        texts = list(descriptions)
+        for text in texts:
+            if not isinstance(text, str):
+                raise ValueError("descriptions must be strings")
+        multiplicity = Counter(texts)
+        for text, (indices, tf) in self._term_frequencies(multiplicity).items():
+            if not indices:
+                continue
+            count = multiplicity[text] * sign
+            self.n_docs += count
+            self.sum_doc_len += count * sum(tf)
+            for idx in indices:
+                self.doc_freq[idx] += count
+                if self.doc_freq[idx] <= 0:
+                    del self.doc_freq[idx]
+        if texts:
+            signature = np.uint64(self.corpus_signature)
+            delta = np.uint64(corpus_signature(descriptions))
+            with np.errstate(over="ignore"):
+                self.corpus_signature = int(signature + delta if sign > 0 else signature - delta)
+        self._sync()
+
+    def add_documents(self, descriptions):
+        """Add descriptions to the corpus statistics; cost is linear in len(descriptions)"""
+        self._update(descriptions, 1)
+
+    def remove_documents(self, descriptions):
+        """Remove previously added descriptions from the corpus statistics"""
+        self._update(descriptions, -1)
+
+    def _sync(self):
+        self.bm25.doc_freq = self.doc_freq
+        self.bm25.n_docs = self.n_docs
+        self.bm25.avgdl = self.sum_doc_len / self.n_docs if self.n_docs else None
+
+    @timed("bm25_encode_documents")
     def encode_documents(self, description):
-        """Get sparse embeddings for text descriptions"""
-        return self.bm25.encode_documents(description)
-    
+        """
+        Get sparse embeddings for text descriptions
+
+        A list (or Series) is encoded in one pass: each distinct description
+        is tokenized and hashed once and the BM25 weights of all of them are
+        computed together.
+        """
+        if isinstance(description, str):
+            return self.bm25.encode_documents(description)
+        if self.bm25.avgdl is None:
+            raise ValueError("BM25 must be fit before encoding documents")
+
+        texts = list(description)
+        ITEMS.inc(len(texts), stage="bm25_encode_documents")
+        term_frequencies = self._term_frequencies(texts)
+        lengths = [len(indices) for indices, _ in term_frequencies.values()]
+        tf = np.fromiter((v for _, counts in term_frequencies.values() for v in counts), dtype=np.float64, count=sum(lengths))
+        doc_len = np.repeat([sum(counts) for _, counts in term_frequencies.values()], lengths)
+        k1, b = self.bm25.k1, self.bm25.b
+        weights = tf / (k1 * (1.0 - b + b * (doc_len / self.bm25.avgdl)) + tf)
+
+        encoded = {}
+        offset = 0
+        for (text, (indices, _)), length in zip(term_frequencies.items(), lengths):
+            encoded[text] = (indices, weights[offset:offset + length].tolist())
+            offset += length
+        return [{"indices": list(encoded[text][0]), "values": list(encoded[text][1])} for text in texts]
+
+    @timed("bm25_encode_queries")
     def encode_queries(self, query):
         """Get sparse embeddings for queries"""
-        return self.bm25.encode_queries(query) 
\ No newline at end of file
+        return self.bm25.encode_queries(query)
+
+    def save(self, path):
+        """Write the fitted state (encoder params and corpus statistics) as JSON"""
+        state = {
+            "params": self.bm25.get_params(),
+            "sum_doc_len": self.sum_doc_len,
+            "corpus_signature": self.corpus_signature
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        """Restore a state written by save"""
+        with open(path) as f:
+            state = json.load(f)
+        self.bm25.set_params(**state["params"])
+        self.doc_freq = Counter({int(idx): int(val) for idx, val in self.bm25.doc_freq.items()})
+        self.n_docs = self.bm25.n_docs
+        self.sum_doc_len = state["sum_doc_len"]
+        self.corpus_signature = state["corpus_signature"]
+        self._sync()
+        return self
@@ -1,29 +1,163 @@
 from transformers import CLIPProcessor, CLIPModel
+import numpy as np
 import torch
-from PIL import Image
+from src.image_preprocessing import PreprocessConfig, preprocess_files, normalize_pixels
+from src.metrics import timed, ITEMS
+from src.microbatch import MicroBatcher
+
+SUPPORTED_DTYPES = ("float32", "bfloat16", "int8")
 
 class CLIPModelWrapper:
-    def __init__(self, model_name="openai/clip-vit-base-patch32"):
-        """Initialize CLIP model and processor"""
-        self.model = CLIPModel.from_pretrained(model_name)
+    def __init__(self, model_name="openai/clip-vit-base-patch32", batch_size=16, dtype="float32", num_threads=None,
+                 embedding_cache=None):
+        """
+        Initialize CLIP model and processor
+
+        Args:
+          - model_name: Hugging Face model id or local path
+          - batch_size: default number of inputs per forward pass
+          - dtype: "float32", "bfloat16" or "int8" (dynamically quantized Linear layers, CPU only)
+          - num_threads: torch intra-op threads; note this is a process-wide torch setting
+          - embedding_cache: optional EmbeddingCache consulted by embed_images
+
+        Image files are preprocessed by src.image_preprocessing with
+        preprocess_config; set pixel_cache (a PixelCache) and decode_pool
+        (see make_decode_pool) to cache and parallelize that stage.
+
+        Single queries and images (embed_query, embed_image) from concurrent
+        requests are batched together once enable_micro_batching is called.
+        """
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"dtype must be one of {SUPPORTED_DTYPES}")
+        if num_threads:
+            torch.set_num_threads(num_threads)
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.dtype = dtype
+        self.embedding_cache = embedding_cache
+        self.model = CLIPModel.from_pretrained(model_name).eval()
         self.processor = CLIPProcessor.from_pretrained(model_name)
-    
+        self.preprocess_config = PreprocessConfig.from_processor(self.processor)
+        self.pixel_cache = None
+        self.decode_pool = None
+        self.text_batcher = None
+        self.image_batcher = None
+
+        if dtype == "bfloat16":
+            self.model = self.model.to(torch.bfloat16)
+        elif dtype == "int8":
+            self.model = torch.ao.quantization.quantize_dynamic(
+                self.model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+
+    def _forward(self, features_fn, inputs):
+        """Run one batch and return L2-normalized float32 features"""
+        if self.dtype == "bfloat16" and "pixel_values" in inputs:
+            inputs["pixel_values"] = inputs["pixel_values"].to(torch.bfloat16)
+        with torch.inference_mode():
+            embedding = features_fn(**inputs).float()
+        # normalization for faster cosine similarity calculation
+        return embedding / embedding.norm(dim=-1, keepdim=True)
+
+    def _to_matrix(self, embeddings):
+        return np.ascontiguousarray(torch.cat(embeddings).numpy(), dtype=np.float32)
+
+    @timed("clip_embed_images")
+    def get_image_embeddings(self, images, batch_size=None):
+        """Get normalized dense embeddings for already decoded PIL images as an (n, d) float32 matrix"""
+        batch_size = batch_size or self.batch_size
+        ITEMS.inc(len(images), stage="clip_embed_images")
+        embeddings = []
+        for start in range(0, len(images), batch_size):
+            inputs = self.processor(images=images[start:start + batch_size], return_tensors="pt")
+            embeddings.append(self._forward(self.model.get_image_features, inputs))
+        if not embeddings:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        return self._to_matrix(embeddings)
+
+    @timed("clip_embed_images")
+    def get_pixel_embeddings(self, pixels, batch_size=None):
+        """Get normalized dense embeddings for (n, H, W, 3) uint8 preprocessed pixels as an (n, d) float32 matrix"""
+        batch_size = batch_size or self.batch_size
+        ITEMS.inc(len(pixels), stage="clip_embed_images")
+        embeddings = []
+        for start in range(0, len(pixels), batch_size):
+            pixel_values = torch.from_numpy(normalize_pixels(pixels[start:start + batch_size], self.preprocess_config))
+            embeddings.append(self._forward(self.model.get_image_features, {"pixel_values": pixel_values}))
+        if not embeddings:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        return self._to_matrix(embeddings)
+
+    def embed_images(self, image_paths, batch_size=None):
+        """
+        Get normalized dense embeddings for image files as an (n, d) float32 matrix
+
+        With an embedding cache attached, only images whose contents are not
+        cached are decoded and run through the model.
+        """
+        batch_size = batch_size or self.batch_size
+        image_paths = list(image_paths)
+        if self.embedding_cache is None:
+            return self._embed_image_files(image_paths, batch_size)
+
+        keys = [self.embedding_cache.key_for_file(path) for path in image_paths]
+        embeddings, hit_mask = self.embedding_cache.get_many(keys)
+        misses = np.flatnonzero(~hit_mask)
+        if len(misses):
+            computed = self._embed_image_files([image_paths[i] for i in misses], batch_size)
+            embeddings[misses] = computed
+            self.embedding_cache.put_many([keys[i] for i in misses], computed)
+            self.embedding_cache.flush()
+        return embeddings
+
+    def _embed_image_files(self, image_paths, batch_size):
+        pixels, ok = preprocess_files(image_paths, self.preprocess_config, pool=self.decode_pool, cache=self.pixel_cache)
+        if not ok.all():
+            failed = [path for path, loaded in zip(image_paths, ok) if not loaded]
+            raise ValueError(f"Could not load images: {failed}")
+        return self.get_pixel_embeddings(pixels, batch_size)
+
+    @timed("clip_embed_texts")
+    def embed_texts(self, queries, batch_size=None):
+        """Get normalized dense embeddings for text queries as an (n, d) float32 matrix"""
+        batch_size = batch_size or self.batch_size
+        ITEMS.inc(len(queries), stage="clip_embed_texts")
+        embeddings = []
+        for start in range(0, len(queries), batch_size):
+            inputs = self.processor(
+                text=list(queries[start:start + batch_size]), return_tensors="pt", padding=True, truncation=True
+            )
+            embeddings.append(self._forward(self.model.get_text_features, inputs))
+        if not embeddings:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        return self._to_matrix(embeddings)
+
+    @property
+    def dimension(self):
+        return self.model.config.projection_dim
+
+    def enable_micro_batching(self, max_batch_size=32, max_wait=0.0):
+        """Route embed_query and embed_image through MicroBatchers (see src.microbatch)"""
+        self.text_batcher = MicroBatcher(self.embed_texts, max_batch_size, max_wait, name="clip_text")
+        self.image_batcher = MicroBatcher(self.embed_images, max_batch_size, max_wait, name="clip_image")
+
+    def embed_query(self, query):
+        """Normalized dense embedding of one text query as a (d,) float32 vector"""
+        if self.text_batcher is not None:
+            return self.text_batcher(query)
+        return self.embed_texts([query])[0]
+
+    def embed_image(self, image_path):
+        """Normalized dense embedding of one image file as a (d,) float32 vector"""
+        if self.image_batcher is not None:
+            return self.image_batcher(image_path)
+        return self.embed_images([image_path])[0]
+
     def get_image_embedding(self, image_path):
         """Get dense embeddings for images"""
-        image = Image.open(image_path).convert("RGB")
-        inputs = self.processor(images=image, return_tensors="pt")
-        with torch.no_grad():
-            embedding = self.model.get_image_features(**inputs)
-        # normalization for faster cosine similarity calculation
-        return embedding / embedding.norm(dim=-1)
-    
+        return torch.from_numpy(self.embed_image(image_path)[None])
+
     def get_text_embedding(self, query):
         """Get dense embeddings for text"""
-        # Preprocess the text query
-        inputs = self.processor(
-            text=[query], return_tensors="pt", padding=True, truncation=True
-        )
-        with torch.no_grad():
-            embedding = self.model.get_text_features(**inputs)
-        # normalization for faster cosine similarity calculation
-        return embedding / embedding.norm(dim=-1) 
\ No newline at end of file
+        return torch.from_numpy(self.embed_query(query)[None])
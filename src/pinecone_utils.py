@@ -1,5 +1,6 @@
 import os
 from pinecone import Pinecone, ServerlessSpec
+from src.ingestion import ingest_inventory
 
 def setup_pinecone_index():
     """Set up Pinecone index"""
@@ -34,29 +35,13 @@ def setup_pinecone_index():
     
     return pc.Index(index_name)
 
-def upsert_inventory_to_pinecone(index, inventory_df, clip_model, bm25_model):
-    """Upsert inventory data to Pinecone index"""
-    for _, row in inventory_df.iterrows():
-        # Extracting Elements
-        image_id = row["style"]
-        image_path = row["Image"]
-        image_description = row["Description"]
+def upsert_inventory_to_pinecone(index, inventory_df, clip_model, bm25_model, **kwargs):
+    """
+    Upsert inventory data to Pinecone index
 
-        # Image Embedding
-        dense_embeds = clip_model.get_image_embedding(image_path).squeeze(0).tolist()
-
-        # Text Embedding
-        sparse_embeds = bm25_model.encode_documents(image_description)
-        
-        # Get metadata
-        metadata = row.to_dict()
-        if index.fetch([image_id])['vectors']:
-            print(f"ID {image_id} already exists in the database. Skipping upsert.")
-            continue
-        else:
-            index.upsert([{
-                'id': image_id,
-                'sparse_values': sparse_embeds,
-                'values': dense_embeds,
-                'metadata': metadata
-            }]) 
\ No newline at end of file
+    Styles already in the index are skipped. Extra keyword arguments
+    (batch sizes, worker counts) are passed to src.ingestion.ingest_inventory.
+    """
+    stats = ingest_inventory(index, inventory_df, clip_model, bm25_model, **kwargs)
+    print(f"Upsert finished: {stats}")
+    return stats
\ No newline at end of file
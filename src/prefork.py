@@ -0,0 +1,340 @@
+import os
+import gc
+import sys
+import time
+import signal
+import socket
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Fields of /proc/<pid>/smaps_rollup, in kB
+SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty", "Swap")
+
+# Set in worker processes forked by PreforkServer
+MASTER_PID = None
+
+
+def read_memory(pid="self"):
+    """
+    Memory of one process from /proc/<pid>/smaps_rollup (Linux 4.14+)
+
+    Return:
+      - dict with rss_kb, pss_kb, shared_kb (pages other processes also map),
+        unique_kb (private pages, what the process alone costs) and swap_kb
+    """
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in SMAPS_FIELDS:
+                fields[name] = int(rest.split()[0])
+    return {
+        "pid": os.getpid() if pid == "self" else int(pid),
+        "rss_kb": fields.get("Rss", 0),
+        "pss_kb": fields.get("Pss", 0),
+        "shared_kb": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "unique_kb": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+        "swap_kb": fields.get("Swap", 0),
+    }
+
+
+def child_pids(pid):
+    """Direct children of a process"""
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def memory_report(master_pid=None):
+    """
+    Unique versus shared memory of a pre-fork master and its workers
+
+    RSS counts a shared page in every process mapping it, so summing RSS
+    over workers overstates the pool; PSS splits shared pages between the
+    processes sharing them, so total pss_kb is what the pool really costs.
+
+    Args:
+      - master_pid: defaults to the pre-fork master when called in a
+        worker, else to this process
+    """
+    master_pid = master_pid or MASTER_PID or os.getpid()
+    processes = [{"role": "master", **read_memory(master_pid)}]
+    for pid in child_pids(master_pid):
+        try:
+            processes.append({"role": "worker", **read_memory(pid)})
+        except OSError:
+            continue  # exited meanwhile
+    return {
+        "processes": processes,
+        "total_rss_kb": sum(p["rss_kb"] for p in processes),
+        "total_pss_kb": sum(p["pss_kb"] for p in processes),
+        "total_unique_kb": sum(p["unique_kb"] for p in processes),
+    }
+
+
+class PreforkServer:
+    def __init__(self, app, host="0.0.0.0", port=5001, workers=2, preload=None,
+                 on_worker_start=None, torch_threads=None, shutdown_timeout=10.0, reload=None,
+                 on_worker_stop=None):
+        """
+        Serve a WSGI app from several forked worker processes
+
+        The master binds the socket and runs preload (loading models,
+        inventory and index) once, then freezes the garbage collector's view
+        of everything loaded and forks the workers. CLIP weights, the BM25
+        state, the inventory and the embedding matrix are thus shared
+        copy-on-write instead of being loaded once per worker; only what a
+        worker writes becomes private to it. Workers accept from the shared
+        socket and are restarted if they die.
+
+        On SIGHUP (see request_reload) the master runs reload and, if it
+        succeeds, forks a fresh set of workers from the reloaded state and
+        stops the old ones, so every worker serves the same state.
+
+        A worker told to stop (SIGTERM, on shutdown or after a reload) stops
+        accepting connections, lets the requests it is serving finish, runs
+        on_worker_stop and exits, all within shutdown_timeout; only then does
+        the master kill it.
+
+        Args:
+          - app: the WSGI application
+          - workers: worker processes
+          - preload: callable run in the master before forking
+          - on_worker_start: callable run in each worker after the fork
+          - torch_threads: torch intra-op threads per worker, defaults to
+            the CPU count divided by workers so workers do not oversubscribe
+          - shutdown_timeout: seconds workers get to drain and exit before SIGKILL
+          - reload: callable run in the master on SIGHUP, defaults to preload
+          - on_worker_stop: callable(timeout) run in a stopping worker once its
+            requests are done, e.g. to finish background jobs within timeout seconds
+        """
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.preload = preload
+        self.on_worker_start = on_worker_start
+        self.torch_threads = torch_threads or max(1, (os.cpu_count() or 1) // workers)
+        self.shutdown_timeout = shutdown_timeout
+        self.reload = reload or preload
+        self.on_worker_stop = on_worker_stop
+        self.socket = None
+        self._children = {}
+        # Replaced workers still draining, with the time they get killed
+        self._retiring = {}
+        self._stopping = False
+        self._reload_requested = False
+
+    def _bind(self):
+        family = socket.AF_INET6 if ":" in self.host else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(128)
+        sock.set_inheritable(True)
+        self.socket = sock
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._run_worker()
+            except BaseException:
+                logger.exception("Worker crashed")
+                code = 1
+            finally:
+                os._exit(code)
+        self._children[pid] = time.monotonic()
+        logger.info(f"Started worker {pid}")
+
+    def _run_worker(self):
+        global MASTER_PID
+        from werkzeug.serving import make_server
+        MASTER_PID = os.getppid()
+        # The master stops workers with SIGTERM; Ctrl-C is handled there too
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        if "torch" in sys.modules:
+            sys.modules["torch"].set_num_threads(self.torch_threads)
+        if self.on_worker_start is not None:
+            self.on_worker_start()
+        app = _InFlight(self.app)
+        server = make_server(self.host, self.port, app, threaded=True, fd=self.socket.fileno())
+
+        def stop(signum, frame):
+            signal.signal(signal.SIGTERM, signal.SIG_IGN)
+            # shutdown() waits for serve_forever to return, so it cannot run in this thread
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+        signal.signal(signal.SIGTERM, stop)
+        server.serve_forever()
+
+        # Leave a margin before the master's SIGKILL
+        deadline = time.monotonic() + max(0.0, self.shutdown_timeout - 1.0)
+        if not app.wait(deadline - time.monotonic()):
+            logger.warning(f"Worker {os.getpid()} stopping with {app.count} requests still running")
+        if self.on_worker_stop is not None:
+            self.on_worker_stop(max(0.0, deadline - time.monotonic()))
+        logger.info(f"Worker {os.getpid()} stopped")
+
+    def _handle_stop(self, signum, frame):
+        self._stopping = True
+        raise _Stop()
+
+    def _handle_reload(self, signum, frame):
+        self._reload_requested = True
+
+    def _reload_workers(self):
+        """Run reload in the master, then replace every worker with one forked from the new state"""
+        logger.info("Reloading in the master")
+        gc.unfreeze()
+        try:
+            if self.reload is not None:
+                self.reload()
+        except Exception:
+            logger.exception("Reload failed, keeping the current workers")
+            return
+        finally:
+            gc.collect()
+            gc.freeze()
+        old = list(self._children)
+        for _ in range(self.workers):
+            self._spawn()
+        for pid in old:
+            self._children.pop(pid)
+            self._retiring[pid] = time.monotonic() + self.shutdown_timeout
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        logger.info(f"Replaced workers {old} after reload")
+
+    def serve(self):
+        """Bind, preload, fork the workers and supervise them until SIGTERM or SIGINT"""
+        self._bind()
+        if self.preload is not None:
+            self.preload()
+        # Keep the collector from touching (and so un-sharing) the pages of
+        # everything loaded so far
+        gc.collect()
+        gc.freeze()
+        logger.info(f"Serving on {self.host}:{self.port} with {self.workers} workers")
+
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_reload)
+        try:
+            for _ in range(self.workers):
+                self._spawn()
+            while not self._stopping:
+                if self._reload_requested:
+                    self._reload_requested = False
+                    self._reload_workers()
+                self._kill_overdue()
+                # Polled rather than blocking in os.wait, so a SIGHUP is acted on promptly
+                try:
+                    pid, status = os.waitpid(-1, os.WNOHANG)
+                except ChildProcessError:
+                    pid, status = 0, 0
+                if pid == 0:
+                    time.sleep(0.2)
+                    continue
+                self._retiring.pop(pid, None)
+                started = self._children.pop(pid, None)
+                if started is None or self._stopping:
+                    continue
+                logger.warning(f"Worker {pid} exited with status {status}, restarting")
+                if time.monotonic() - started < 1.0:
+                    time.sleep(1.0)  # crashing on start; do not spin
+                self._spawn()
+        except _Stop:
+            pass
+        finally:
+            self._shutdown()
+
+    def _kill_overdue(self):
+        for pid, deadline in list(self._retiring.items()):
+            if time.monotonic() > deadline:
+                logger.warning(f"Worker {pid} did not stop in time, killing it")
+                self._retiring.pop(pid)
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                    os.waitpid(pid, 0)
+                except (ProcessLookupError, ChildProcessError):
+                    pass
+
+    def _shutdown(self):
+        for pid in self._retiring:
+            self._children[pid] = None
+        self._retiring.clear()
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                self._children.pop(pid)
+        deadline = time.monotonic() + self.shutdown_timeout
+        while self._children and time.monotonic() < deadline:
+            for pid in list(self._children):
+                done, _ = os.waitpid(pid, os.WNOHANG)
+                if done:
+                    self._children.pop(pid)
+            time.sleep(0.05)
+        for pid in self._children:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self._children.clear()
+        self.socket.close()
+        logger.info("All workers stopped")
+
+
+class _InFlight:
+    def __init__(self, app):
+        """WSGI middleware counting requests whose response has not been fully sent"""
+        self.app = app
+        self.count = 0
+        self._idle = threading.Condition()
+
+    def __call__(self, environ, start_response):
+        from werkzeug.wsgi import ClosingIterator
+        with self._idle:
+            self.count += 1
+        try:
+            response = self.app(environ, start_response)
+        except BaseException:
+            self._finished()
+            raise
+        # Streamed responses count until their last chunk is sent
+        return ClosingIterator(response, self._finished)
+
+    def _finished(self):
+        with self._idle:
+            self.count -= 1
+            self._idle.notify_all()
+
+    def wait(self, timeout):
+        """Whether every request finished within timeout seconds"""
+        with self._idle:
+            return self._idle.wait_for(lambda: self.count == 0, max(0.0, timeout))
+
+
+def request_reload():
+    """
+    Ask the pre-fork master to reload and replace its workers
+
+    Return:
+      - True if called in a pre-fork worker and the master was signalled,
+        False if this process is not a pre-fork worker
+    """
+    if MASTER_PID is None:
+        return False
+    os.kill(MASTER_PID, signal.SIGHUP)
+    return True
+
+
+class _Stop(Exception):
+    pass
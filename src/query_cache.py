@@ -0,0 +1,281 @@
+import os
+import re
+import time
+import base64
+import threading
+from collections import OrderedDict
+import numpy as np
+from src.search import search_multi_alpha
+
+
+def normalize_query(query):
+    """
+    Cache key form of a search query: lowercased, whitespace collapsed
+
+    Both encoders are case-insensitive (CLIP's tokenizer and the BM25
+    tokenizer lowercase), so this does not change the embeddings.
+    """
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+
+def index_version(index):
+    """Version stamp of an index, or None if the backend does not track writes"""
+    return getattr(index, "version", None)
+
+
+class VersionedIndex:
+    def __init__(self, index, path=None, max_age=None):
+        """
+        Index handle (e.g. Pinecone) whose version stamp counts the upserts
+        and deletes made through it; every other attribute is passed through
+
+        The counter is bumped after each write completes, so results cached
+        under the stamp read before a search stop matching once the index
+        changes. With path the counter is persisted, so the stamp survives
+        restarts along with results in a disk-backed QueryCache (keep it next
+        to that cache).
+
+        Only writes made through this handle are counted, so the stamp
+        assumes this process is the index's single writer. With max_age the
+        stamp also changes every max_age seconds, which bounds how long
+        results stay cached when other processes write to the index too.
+
+        Args:
+          - path: file holding the counter, created on the first write
+          - max_age: seconds a stamp stays valid, None for no limit
+        """
+        self._index = index
+        self._path = path
+        self.max_age = max_age
+        self._writes = 0
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self._writes = int(f.read().strip() or 0)
+
+    @property
+    def version(self):
+        if self.max_age:
+            return f"{self._writes}.{int(time.time() // self.max_age)}"
+        return str(self._writes)
+
+    def _bump(self):
+        with self._lock:
+            self._writes += 1
+            if self._path:
+                os.makedirs(os.path.dirname(os.path.abspath(self._path)), exist_ok=True)
+                tmp_path = f"{self._path}.tmp"
+                with open(tmp_path, "w") as f:
+                    f.write(str(self._writes))
+                os.replace(tmp_path, self._path)
+
+    def upsert(self, *args, **kwargs):
+        response = self._index.upsert(*args, **kwargs)
+        self._bump()
+        return response
+
+    def delete(self, *args, **kwargs):
+        response = self._index.delete(*args, **kwargs)
+        self._bump()
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self._index, name)
+
+
+def _encode_vectors(sparse, dense):
+    dense = np.ascontiguousarray(dense, dtype=np.float32)
+    return {
+        "indices": np.asarray(sparse["indices"]).tolist(),
+        "values": np.asarray(sparse["values"]).tolist(),
+        "dense": base64.b64encode(dense.tobytes()).decode("ascii"),
+    }
+
+
+def _decode_vectors(value):
+    dense = np.frombuffer(base64.b64decode(value["dense"]), dtype=np.float32)
+    return {"indices": value["indices"], "values": value["values"]}, dense
+
+
+class QueryCache:
+    def __init__(self, model_key="", max_entries=1024, store=None):
+        """
+        LRU cache of query vectors and search results, keyed by normalized query
+
+        Vectors (BM25 sparse + CLIP dense) are keyed by the query and
+        model_key; search results additionally by the weights, top_k and
+        the index's version stamp, so an upsert, delete or sync makes them
+        miss without explicit invalidation. Results cached under an older
+        stamp are dropped as soon as a newer one is seen.
+
+        Args:
+          - model_key: identifies the encoders (CLIP model, BM25 corpus);
+            a string, or a callable returning one when they can change in place
+          - max_entries: entries kept in memory, least recently used evicted
+          - store: optional DiskCache that survives restarts and is shared
+            by pre-fork workers; consulted on a memory miss
+        """
+        self.model_key = model_key
+        self.max_entries = max_entries
+        self.store = store
+        self.vector_hits = 0
+        self.vector_misses = 0
+        self.result_hits = 0
+        self.result_misses = 0
+        self._entries = OrderedDict()
+        self._results_version = None
+        self._lock = threading.Lock()
+
+    def _model_key(self):
+        return self.model_key() if callable(self.model_key) else self.model_key
+
+    def _get(self, key, decode):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                return value
+        if self.store is None:
+            return None
+        stored = self.store.get(key)
+        if stored is None:
+            return None
+        value = decode(stored)
+        self._put_memory(key, value)
+        return value
+
+    def _put_memory(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def vectors(self, query, compute):
+        """
+        (sparse, dense) query vectors, calling compute() -> (sparse, dense) on a miss
+
+        The dense vector is returned read-only since it is shared between callers.
+        """
+        key = f"vectors:{self._model_key()}:{normalize_query(query)}"
+        cached = self._get(key, _decode_vectors)
+        if cached is not None:
+            self.vector_hits += 1
+            return cached
+        self.vector_misses += 1
+        sparse, dense = compute()
+        dense = np.array(dense, dtype=np.float32)
+        dense.setflags(write=False)
+        self._put_memory(key, (sparse, dense))
+        if self.store is not None:
+            self.store.set(key, _encode_vectors(sparse, dense))
+        return sparse, dense
+
+    def _results_key(self, query, style_similarities, top_k, version):
+        alphas = ",".join(f"{alpha:g}" for alpha in style_similarities)
+        return f"results:{self._model_key()}:{version}:{alphas}:{top_k}:{normalize_query(query)}"
+
+    def _check_version(self, version):
+        # A new stamp means the index changed; drop results cached under the old one
+        with self._lock:
+            if version == self._results_version:
+                return
+            self._results_version = version
+            for key in [key for key in self._entries if key.startswith("results:")]:
+                del self._entries[key]
+
+    def get_results(self, query, style_similarities, top_k, version):
+        """
+        Cached search_multi_alpha results, or None
+
+        Args:
+          - version: index_version of the index searched; None disables caching
+        """
+        if version is None:
+            return None
+        self._check_version(version)
+        cached = self._get(
+            self._results_key(query, style_similarities, top_k, version),
+            lambda stored: [tuple(result) for result in stored]
+        )
+        if cached is None:
+            self.result_misses += 1
+            return None
+        self.result_hits += 1
+        return cached
+
+    def put_results(self, query, style_similarities, top_k, version, results):
+        """Store results; version must be read before the search, so a write racing it is not masked"""
+        if version is None:
+            return
+        key = self._results_key(query, style_similarities, top_k, version)
+        # Scores may be NumPy floats (stored as plain JSON values) or None when the backend returned none
+        results = [
+            tuple(list(part) for part in result[:3])
+            + tuple([None if score is None else float(score) for score in part] for part in result[3:])
+            for result in results
+        ]
+        self._put_memory(key, results)
+        if self.store is not None:
+            self.store.set(key, results)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "hits": self.vector_hits + self.result_hits,
+            "misses": self.vector_misses + self.result_misses,
+            "vector_hits": self.vector_hits,
+            "vector_misses": self.vector_misses,
+            "result_hits": self.result_hits,
+            "result_misses": self.result_misses,
+        }
+
+
+class QuerySearch:
+    def __init__(self, state, query, style_similarities=(0, 1), top_k=3):
+        """
+        search_multi_alpha for one query against state.index, through
+        state.query_cache when there is one
+
+        The steps can be run separately, e.g. to time them as their own
+        stages: cached() looks the results up, embed() returns the query
+        vectors and search(sparse, dense) runs the search and stores its
+        results. Calling the object runs all three. The index version is read
+        here, before any search, so a write racing the search is not masked.
+        """
+        self.state = state
+        self.query = query
+        self.style_similarities = list(style_similarities)
+        self.top_k = top_k
+        self.cache = getattr(state, "query_cache", None)
+        self.version = index_version(state.index)
+
+    def cached(self):
+        """Cached results, or None"""
+        if self.cache is None:
+            return None
+        return self.cache.get_results(self.query, self.style_similarities, self.top_k, self.version)
+
+    def embed(self):
+        """(sparse, dense) query vectors"""
+        def compute():
+            return self.state.bm25_model.encode_queries(self.query), self.state.clip_model.embed_query(self.query)
+        if self.cache is None:
+            return compute()
+        return self.cache.vectors(self.query, compute)
+
+    def search(self, sparse, dense):
+        results = search_multi_alpha(self.state.index, sparse, dense, self.style_similarities, top_k=self.top_k)
+        if self.cache is not None:
+            self.cache.put_results(self.query, self.style_similarities, self.top_k, self.version, results)
+        return results
+
+    def __call__(self):
+        results = self.cached()
+        if results is None:
+            results = self.search(*self.embed())
+        return results
@@ -1,3 +1,14 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from src.metrics import timed
+
+def as_sparse_arrays(sparse):
+    """Sparse vector as index/value NumPy arrays (no copy if it already is)"""
+    return {
+        "indices": np.asarray(sparse["indices"], dtype=np.int64),
+        "values": np.asarray(sparse["values"], dtype=np.float32)
+    }
+
 def hybrid_scale(sparse, dense, style_similarity=1):
     """
     Hybrid vector scaling with alpha * dense + (1 - alpha) * sparse
@@ -6,45 +17,71 @@ def hybrid_scale(sparse, dense, style_similarity=1):
       - dense: array of floats
       - sparse: a dict of indices and values
       - alpha: 0 = sparse only, 1 = dense only
+
+    Return:
+      - the scaled sparse vector as index/value NumPy arrays
+      - the scaled dense vector as a float32 NumPy array
     """
     if style_similarity < 0 or style_similarity > 1:
         raise ValueError("Alpha must be between 0 and 1")
 
+    sparse = as_sparse_arrays(sparse)
     scaled_sparse = {
         "indices": sparse["indices"],
-        "values": [
-            value * (1 - style_similarity) for value in sparse["values"]
-        ]
+        "values": sparse["values"] * np.float32(1 - style_similarity)
     }
-    scaled_dense = [style_similarity * value for value in dense]
+    scaled_dense = np.asarray(dense, dtype=np.float32) * np.float32(style_similarity)
     return scaled_sparse, scaled_dense
 
-def collect_search_results(search_result):
+def to_wire_format(index, sparse, dense):
+    """
+    Convert query vectors to what the index backend accepts
+
+    The local hybrid index takes NumPy arrays as-is; the Pinecone client
+    needs plain lists, so the conversion happens once here.
+    """
+    if getattr(index, "accepts_numpy", False):
+        return sparse, dense
+    wire_sparse = {
+        "indices": np.asarray(sparse["indices"]).tolist(),
+        "values": np.asarray(sparse["values"]).tolist()
+    }
+    return wire_sparse, np.asarray(dense).tolist()
+
+def collect_search_results(search_result, include_scores=False):
     """
     Collect search results for search visualizations
 
     Args:
       - search_result: a pinecone query response
+      - include_scores: also return the match scores
     
     Return:
       - a list of style names
       - a list of image paths
       - a list of composition descriptions
+      - a list of scores (only if include_scores)
     """
     style_names = []
     image_paths = []
     composition_desc = []
+    scores = []
 
     for match in search_result.matches:
         style_names.append(match["id"])
         image_paths.append(match["metadata"]["Image"])
         composition_desc.append(match['metadata']['Description'])
+        if include_scores:
+            scores.append(match.get("score"))
     
+    if include_scores:
+        return style_names, image_paths, composition_desc, scores
     return style_names, image_paths, composition_desc
 
+@timed("index_query")
 def search_by_fabric(index, sparse, dense, top_k=3):
     """Search by fabric composition"""
-    scaled_sparse, scaled_dense = hybrid_scale(sparse, dense, 0)
+    scaled_sparse, scaled_dense = to_wire_format(index, *hybrid_scale(sparse, dense, 0))
     
     result = index.query(
         top_k=top_k,
@@ -55,9 +92,10 @@ def search_by_fabric(index, sparse, dense, top_k=3):
     
     return result
 
+@timed("index_query")
 def search_by_likeliness(index, sparse, dense, top_k=3):
     """Search by overall likeliness"""
-    scaled_sparse, scaled_dense = hybrid_scale(sparse, dense)
+    scaled_sparse, scaled_dense = to_wire_format(index, *hybrid_scale(sparse, dense))
     
     result = index.query(
         top_k=top_k,
@@ -66,4 +104,52 @@ def search_by_likeliness(index, sparse, dense, top_k=3):
         include_metadata=True
     )
     
-    return result 
\ No newline at end of file
+    return result 
+
+def _hybrid_query(index, sparse, dense, style_similarity, top_k):
+    scaled_sparse, scaled_dense = to_wire_format(index, *hybrid_scale(sparse, dense, style_similarity))
+    return index.query(
+        top_k=top_k,
+        vector=scaled_dense,
+        sparse_vector=scaled_sparse,
+        include_metadata=True
+    )
+
+@timed("index_query")
+def search_multi_alpha(index, sparse, dense, style_similarities=(0, 1), top_k=3):
+    """
+    Search once for several style_similarity weights
+
+    Backends that can re-rank locally (the local hybrid index) score the
+    inventory once and re-rank per weight; otherwise the per-weight queries
+    are issued concurrently.
+
+    Args:
+      - sparse: a dict of indices and values
+      - dense: array of floats
+      - style_similarities: alphas, 0 = fabric (sparse) only, 1 = likeliness (dense) only
+
+    Return:
+      - one (style names, image paths, composition descriptions, scores) tuple
+        per style_similarity, in the same order; [] if there are none
+    """
+    style_similarities = list(style_similarities)
+    if not style_similarities:
+        return []
+    for style_similarity in style_similarities:
+        if style_similarity < 0 or style_similarity > 1:
+            raise ValueError("Alpha must be between 0 and 1")
+
+    sparse = as_sparse_arrays(sparse)
+    dense = np.asarray(dense, dtype=np.float32)
+
+    if hasattr(index, "query_multi_alpha"):
+        results = index.query_multi_alpha(top_k, dense, sparse, style_similarities, include_metadata=True)
+    else:
+        with ThreadPoolExecutor(max_workers=len(style_similarities)) as pool:
+            results = list(pool.map(
+                lambda style_similarity: _hybrid_query(index, sparse, dense, style_similarity, top_k),
+                style_similarities
+            ))
+
+    return [collect_search_results(result, include_scores=True) for result in results]
\ No newline at end of file
@@ -0,0 +1,250 @@
+import os
+import threading
+import logging
+from src.config import load_environment
+from src.web_cache import setup_web_caches
+from src.timing import StageTimer
+
+logger = logging.getLogger(__name__)
+
+INVENTORY_PATH = "./images/test_image.csv"
+
+
+class ServiceState:
+    def __init__(self, clip_model, bm25_model, inventory_df, index, startup_timings,
+                 page_cache=None, extraction_cache=None, query_cache=None):
+        """Immutable bundle of everything a request needs; swapped as a whole on reload"""
+        self.clip_model = clip_model
+        self.bm25_model = bm25_model
+        self.inventory_df = inventory_df
+        self.index = index
+        self.startup_timings = startup_timings
+        self.page_cache = page_cache
+        self.extraction_cache = extraction_cache
+        self.query_cache = query_cache
+
+
+class ServiceContext:
+    def __init__(self, inventory_path=None, upsert=True):
+        """
+        Process-wide holder for the CLIP model, fitted BM25 encoder,
+        processed inventory and index handle
+
+        Args:
+          - inventory_path: inventory CSV, defaults to INVENTORY_PATH env or ./images/test_image.csv
+          - upsert: if True, sync the inventory into the index while loading
+        """
+        self.inventory_path = inventory_path or os.getenv("INVENTORY_PATH", INVENTORY_PATH)
+        self.upsert = upsert
+        self._state = None
+        self._reload_lock = threading.Lock()
+        self._loading = False
+        self.load_error = None
+
+    @property
+    def loaded(self):
+        return self._state is not None
+
+    @property
+    def current(self):
+        """Current state, or None if not loaded yet; never triggers a load"""
+        return self._state
+
+    @property
+    def status(self):
+        """
+        "ready" once a state is published (also while it is being reloaded),
+        else "loading", "failed" (see load_error) or "not_loaded"
+        """
+        if self._state is not None:
+            return "ready"
+        if self._loading:
+            return "loading"
+        if self.load_error is not None:
+            return "failed"
+        return "not_loaded"
+
+    @property
+    def state(self):
+        """Current state; loads on first access"""
+        if self._state is None:
+            with self._reload_lock:
+                if self._state is None:
+                    self._tracked_build()
+        return self._state
+
+    def load(self):
+        """Build a fresh state and publish it atomically"""
+        with self._reload_lock:
+            return self._tracked_build()
+
+    def prewarm(self):
+        """
+        Load in a background thread, so a server can start listening first
+
+        Requests that need the state before it is ready wait for this same
+        load. A failed load is logged and retried by the next access.
+        """
+        thread = threading.Thread(target=self._prewarm, name="service-prewarm", daemon=True)
+        thread.start()
+        return thread
+
+    def _prewarm(self):
+        try:
+            self.state
+        except Exception:
+            logger.exception("Background pre-warm of the service context failed")
+
+    def _tracked_build(self):
+        self._loading = True
+        try:
+            state = self._build()
+        except Exception as e:
+            self.load_error = f"{type(e).__name__}: {str(e)}"
+            raise
+        finally:
+            self._loading = False
+        self.load_error = None
+        return state
+
+    def _build(self):
+        # torch, transformers, pandas and pinecone are imported on first load,
+        # not when the server process starts
+        from src.embedding_cache import EmbeddingCache
+        from src.image_preprocessing import PixelCache, make_decode_pool
+        from src.data_processing import load_inventory
+        from src.models.clip_model import CLIPModelWrapper
+        from src.models.bm25_model import BM25ModelWrapper, corpus_signature
+        from src.index_sync import sync_inventory
+        from src.pinecone_utils import setup_pinecone_index, upsert_inventory_to_pinecone
+        from src.local_index import setup_local_index
+        from src.query_cache import QueryCache, VersionedIndex
+        from src.disk_cache import DiskCache
+
+        timer = StageTimer()
+
+        with timer.stage("load_environment"):
+            load_environment()
+
+        with timer.stage("load_inventory"):
+            inventory_df = load_inventory(self.inventory_path, cache_dir=os.getenv("INVENTORY_CACHE_DIR"))
+
+        with timer.stage("clip_init"):
+            clip_model = CLIPModelWrapper(
+                batch_size=int(os.getenv("CLIP_BATCH_SIZE", 16)),
+                dtype=os.getenv("CLIP_DTYPE", "float32"),
+                num_threads=int(os.getenv("CLIP_NUM_THREADS", 0)) or None
+            )
+            pixel_cache_dir = os.getenv("PIXEL_CACHE_DIR")
+            if pixel_cache_dir:
+                clip_model.pixel_cache = PixelCache(pixel_cache_dir)
+            if os.getenv("CLIP_MICROBATCH", "").lower() in ("1", "true"):
+                clip_model.enable_micro_batching(
+                    max_batch_size=int(os.getenv("CLIP_MICROBATCH_MAX_SIZE", 32)),
+                    max_wait=float(os.getenv("CLIP_MICROBATCH_WAIT_MS", 0)) / 1000
+                )
+            decode_processes = int(os.getenv("IMAGE_DECODE_PROCESSES", 0))
+            if decode_processes:
+                clip_model.decode_pool = make_decode_pool(decode_processes)
+            cache_dir = os.getenv("EMBEDDING_CACHE_DIR")
+            if cache_dir:
+                clip_model.embedding_cache = EmbeddingCache(
+                    cache_dir,
+                    clip_model.model_name,
+                    dimension=clip_model.dimension,
+                    capacity=int(os.getenv("EMBEDDING_CACHE_CAPACITY", 100000)),
+                    read_only=os.getenv("EMBEDDING_CACHE_READ_ONLY", "").lower() in ("1", "true")
+                )
+
+        with timer.stage("bm25_fit"):
+            bm25_model = BM25ModelWrapper()
+            # Reuse the saved BM25 state when it was fitted on this exact inventory
+            bm25_path = os.getenv("BM25_PATH")
+            if bm25_path and os.path.exists(bm25_path):
+                bm25_model.load(bm25_path)
+            if bm25_model.corpus_signature != corpus_signature(inventory_df['Description']):
+                bm25_model.fit(inventory_df['Description'])
+                if bm25_path:
+                    bm25_model.save(bm25_path)
+
+        backend = os.getenv("VECTOR_BACKEND", "pinecone")
+        local_index_path = os.getenv("LOCAL_INDEX_PATH")
+        query_cache_dir = os.getenv("QUERY_CACHE_DIR")
+        with timer.stage("index_setup"):
+            if backend == "local":
+                index = setup_local_index(
+                    local_index_path,
+                    dimension=clip_model.dimension,
+                    mmap=os.getenv("LOCAL_INDEX_MMAP", "").lower() in ("1", "true")
+                )
+            else:
+                # Gives the remote index a version stamp for the query cache, persisted with its disk store
+                index = VersionedIndex(
+                    setup_pinecone_index(),
+                    path=os.path.join(query_cache_dir, "index_version") if query_cache_dir else None,
+                    max_age=float(os.getenv("QUERY_RESULTS_MAX_AGE", 0)) or None
+                )
+
+        if self.upsert:
+            # With a manifest only new, changed and removed styles are touched
+            manifest_path = os.getenv("INDEX_MANIFEST_PATH")
+            save_index = None
+            if backend == "local" and local_index_path:
+                def save_index():
+                    index.save(local_index_path)
+            with timer.stage("index_upsert"):
+                if manifest_path:
+                    # Saved inside the sync (and timed with it), before the manifest recording it is written
+                    sync_inventory(
+                        index, inventory_df, clip_model, bm25_model, manifest_path,
+                        update_bm25=False, persist=save_index
+                    )
+                    save_index = None
+                elif not upsert_inventory_to_pinecone(index, inventory_df, clip_model, bm25_model).vectors:
+                    save_index = None
+            if save_index is not None:
+                with timer.stage("index_save"):
+                    save_index()
+
+        with timer.stage("web_caches"):
+            page_cache, extraction_cache = setup_web_caches()
+
+        query_cache = None
+        query_cache_size = int(os.getenv("QUERY_CACHE_SIZE", 1024))
+        if query_cache_size:
+            query_cache = QueryCache(
+                # BM25 corpus statistics change when an inventory sync updates them
+                model_key=lambda: f"{clip_model.model_name}:{bm25_model.corpus_signature}",
+                max_entries=query_cache_size,
+                store=DiskCache(
+                    os.path.join(query_cache_dir, "queries.sqlite"),
+                    max_bytes=int(os.getenv("QUERY_CACHE_MAX_MB", 64)) * 1024 * 1024
+                ) if query_cache_dir else None
+            )
+
+        # Requests already holding the previous state keep using it until they finish
+        self._state = ServiceState(
+            clip_model, bm25_model, inventory_df, index, timer.as_dict(),
+            page_cache=page_cache, extraction_cache=extraction_cache, query_cache=query_cache
+        )
+        logger.info(f"Service context loaded ({timer.summary()})")
+        return self._state
+
+    def reload(self):
+        """Explicitly reload models, inventory and index"""
+        logger.info("Reloading service context")
+        return self.load()
+
+
+_context = None
+_context_lock = threading.Lock()
+
+
+def get_service_context():
+    """Return the process-wide ServiceContext, creating it on first use"""
+    global _context
+    if _context is None:
+        with _context_lock:
+            if _context is None:
+                _context = ServiceContext()
+    return _context
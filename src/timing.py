@@ -0,0 +1,38 @@
+import time
+from contextlib import contextmanager
+from src.metrics import track_stage
+
+
+class StageTimer:
+    def __init__(self):
+        """Record wall-clock durations of named pipeline stages"""
+        self.timings = {}
+        # End-to-end seconds, set by callers whose stages overlap (so total() overcounts)
+        self.wall = None
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block and add it to the stage's total (and to the stage metrics)"""
+        start = time.perf_counter()
+        try:
+            with track_stage(name):
+                yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[name] = self.timings.get(name, 0.0) + elapsed
+
+    def total(self):
+        """Total seconds across all recorded stages"""
+        return sum(self.timings.values())
+
+    def as_dict(self):
+        """Stage durations in milliseconds, plus the total"""
+        breakdown = {name: round(seconds * 1000, 1) for name, seconds in self.timings.items()}
+        breakdown["total"] = round(self.total() * 1000, 1)
+        if self.wall is not None:
+            breakdown["wall"] = round(self.wall * 1000, 1)
+        return breakdown
+
+    def summary(self):
+        """One-line human readable breakdown for logs"""
+        return ", ".join(f"{name}: {ms} ms" for name, ms in self.as_dict().items())
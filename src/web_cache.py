@@ -0,0 +1,130 @@
+import os
+import hashlib
+import logging
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from src.disk_cache import DiskCache
+
+logger = logging.getLogger(__name__)
+
+TRACKING_PARAMS = ("gclid", "fbclid", "mc_cid", "mc_eid")
+
+
+def normalize_url(url):
+    """
+    Canonical form of a URL for cache keys: lower-case scheme and host,
+    no default port, no fragment, no tracking parameters, sorted query
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and not (scheme == "http" and parts.port == 80) and not (scheme == "https" and parts.port == 443):
+        host = f"{host}:{parts.port}"
+    path = parts.path or "/"
+    if len(path) > 1:
+        path = path.rstrip("/")
+    query = sorted(
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not name.startswith("utm_") and name not in TRACKING_PARAMS
+    )
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
+
+
+class PageCache:
+    def __init__(self, path, ttl=24 * 3600, max_bytes=256 * 1024 * 1024):
+        """
+        Fetched page text keyed by normalized URL
+
+        Fresh entries are served without a request. Stale entries that carry
+        an ETag or Last-Modified are revalidated with a conditional GET, and
+        a 304 reply just extends their TTL. Only 2xx responses are stored; on
+        an error status the stale entry is served if there is one, otherwise
+        load raises ValueError.
+        """
+        self.store = DiskCache(path, max_bytes=max_bytes, default_ttl=ttl)
+        self.revalidated = 0
+
+    def load(self, url, fetch):
+        """
+        Page text for url
+
+        Args:
+          - fetch: callable(url, headers) returning (status, text, validators)
+            where validators holds the response's etag / last_modified
+        """
+        key = normalize_url(url)
+        entry, fresh = self.store.get_entry(key)
+        if entry is not None and fresh:
+            self.store.hits += 1
+            return entry["text"]
+        self.store.misses += 1
+
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        status, text, validators = fetch(url, headers)
+        if status == 304:
+            if entry is not None:
+                self.revalidated += 1
+                self.store.set(key, entry)
+                return entry["text"]
+            # Not modified relative to nothing we hold; ask again unconditionally
+            status, text, validators = fetch(url, {})
+
+        if not 200 <= status < 300:
+            # Error pages (404, 429, 5xx) are never cached or handed to extraction
+            if entry is not None:
+                logger.warning(f"Fetching {url} returned HTTP {status}, serving the stale cached page")
+                return entry["text"]
+            raise ValueError(f"Fetching {url} returned HTTP {status}")
+
+        self.store.set(key, {"text": text, **validators})
+        return text
+
+    def stats(self):
+        return {**self.store.stats(), "revalidated": self.revalidated}
+
+
+class ExtractionCache:
+    def __init__(self, path, ttl=30 * 24 * 3600, max_bytes=64 * 1024 * 1024):
+        """Parsed extraction JSON keyed by page-content hash, extraction kind, prompt version and model"""
+        self.store = DiskCache(path, max_bytes=max_bytes, default_ttl=ttl)
+
+    @staticmethod
+    def key(kind, page_data, prompt_version, model_name):
+        digest = hashlib.sha256(page_data.encode("utf-8")).hexdigest()
+        return f"{kind}:{prompt_version}:{model_name}:{digest}"
+
+    def get_or_compute(self, kind, page_data, prompt_version, model_name, compute):
+        """Cached result for this page and prompt, calling compute() on a miss"""
+        key = self.key(kind, page_data, prompt_version, model_name)
+        result = self.store.get(key)
+        if result is None:
+            result = compute()
+            self.store.set(key, result)
+        return result
+
+    def stats(self):
+        return self.store.stats()
+
+
+def setup_web_caches():
+    """Page and extraction caches under WEB_CACHE_DIR, or (None, None) if it is not set"""
+    cache_dir = os.getenv("WEB_CACHE_DIR")
+    if not cache_dir:
+        return None, None
+    max_bytes = int(os.getenv("WEB_CACHE_MAX_MB", 256)) * 1024 * 1024
+    page_cache = PageCache(
+        os.path.join(cache_dir, "pages.sqlite"),
+        ttl=float(os.getenv("WEB_CACHE_TTL", 24 * 3600)),
+        max_bytes=max_bytes
+    )
+    extraction_cache = ExtractionCache(
+        os.path.join(cache_dir, "extractions.sqlite"),
+        ttl=float(os.getenv("EXTRACTION_CACHE_TTL", 30 * 24 * 3600)),
+        max_bytes=max_bytes // 4
+    )
+    return page_cache, extraction_cache
@@ -1,19 +1,17 @@
-from langchain_groq import ChatGroq
 from langchain_community.document_loaders import WebBaseLoader
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
+from bs4 import BeautifulSoup
+from src.llm import invoke_cached
+from src.content_reducer import reduce_for_extraction
 import os
 
-def load_web_content(url):
-    """Load content from a web page"""
-    loader = WebBaseLoader(url)
-    page_data = (loader.load().pop().page_content).strip()
-    return page_data
+# Bump when an extraction prompt changes so cached extractions and LLM responses are not reused
+PRODUCT_PROMPT_VERSION = "1"
+CLIENT_PROMPT_VERSION = "1"
 
-def extract_product_info(page_data):
-    """Extract product information from web page content"""
-    prompt_extract_product = PromptTemplate.from_template(
-        '''
+PROMPT_EXTRACT_PRODUCT = PromptTemplate.from_template(
+    '''
         ### SCRAPED TEXT FROM WEBSITE:
         {page_data_product}
 
@@ -30,25 +28,10 @@ def extract_product_info(page_data):
 
         ### VALID JSON (NO PREAMBLE): Do not include anything else in the response—no extra text, no explanations. If you need to provide explanations, put them as JSON fields within the JSON object.
         '''
-    )
-    
-    llm_groq = ChatGroq(
-        temperature=0,
-        model_name=os.getenv("GROQ_MODEL_NAME_1")
-    )
-    
-    chain_product = prompt_extract_product | llm_groq
-    res_product = chain_product.invoke(input={'page_data_product': page_data})
-    
-    json_parser = JsonOutputParser()
-    json_res_product = json_parser.parse(res_product.content)
-    
-    return json_res_product
+)
 
-def extract_client_info(page_data):
-    """Extract client information from web page content"""
-    prompt_extract_client = PromptTemplate.from_template(
-        '''
+PROMPT_EXTRACT_CLIENT = PromptTemplate.from_template(
+    '''
         ### SCRAPED TEXT FROM WEBSITE:
         {page_data_client}
 
@@ -60,17 +43,82 @@ def extract_client_info(page_data):
 
         ### VALID JSON (NO PREAMBLE): Do not include anything else in the response—no extra text, no explanations. If you need to provide explanations, put them as JSON fields within the JSON object.
         '''
+)
+
+def _conditional_fetch(url, headers):
+    """GET url the way WebBaseLoader does, with extra (conditional) headers"""
+    loader = WebBaseLoader(url)
+    response = loader.session.get(url, headers=headers, **loader.requests_kwargs)
+    if response.status_code == 304:
+        return 304, None, {}
+    response.encoding = response.apparent_encoding
+    text = BeautifulSoup(response.text, loader.default_parser).get_text().strip()
+    validators = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified")
+    }
+    return response.status_code, text, validators
+
+def load_web_content(url, cache=None):
+    """Load content from a web page, through a PageCache if given"""
+    if cache is not None:
+        return cache.load(url, _conditional_fetch)
+    loader = WebBaseLoader(url)
+    page_data = (loader.load().pop().page_content).strip()
+    return page_data
+
+def extract_product_info(page_data, cache=None):
+    """
+    Extract product information from web page content, through an ExtractionCache if given
+
+    The page is first cut down to PAGE_TOKEN_BUDGET tokens (see
+    src.content_reducer); cache entries are keyed by the reduced text.
+    """
+    page_data = reduce_for_extraction(page_data, "product")
+    if cache is not None:
+        return cache.get_or_compute(
+            "product", page_data, PRODUCT_PROMPT_VERSION, os.getenv("GROQ_MODEL_NAME_1"),
+            # The extraction cache owns these results; the LLM response cache is skipped
+            lambda: _extract_product_info(page_data, use_llm_cache=False)
+        )
+    return _extract_product_info(page_data)
+
+def _extract_product_info(page_data, use_llm_cache=True):
+    json_parser = JsonOutputParser()
+    # Only replies that parse are cached
+    res_product = invoke_cached(
+        PROMPT_EXTRACT_PRODUCT, {'page_data_product': page_data}, PRODUCT_PROMPT_VERSION,
+        validate=json_parser.parse, use_cache=use_llm_cache
     )
     
-    llm_groq = ChatGroq(
-        temperature=0,
-        model_name=os.getenv("GROQ_MODEL_NAME_1")
-    )
-    
-    chain_client = prompt_extract_client | llm_groq
-    res_client = chain_client.invoke(input={'page_data_client': page_data})
+    json_res_product = json_parser.parse(res_product.content)
     
+    return json_res_product
+
+def extract_client_info(page_data, cache=None):
+    """
+    Extract client information from web page content, through an ExtractionCache if given
+
+    The page is first cut down to PAGE_TOKEN_BUDGET tokens (see
+    src.content_reducer); cache entries are keyed by the reduced text.
+    """
+    page_data = reduce_for_extraction(page_data, "client")
+    if cache is not None:
+        return cache.get_or_compute(
+            "client", page_data, CLIENT_PROMPT_VERSION, os.getenv("GROQ_MODEL_NAME_1"),
+            # The extraction cache owns these results; the LLM response cache is skipped
+            lambda: _extract_client_info(page_data, use_llm_cache=False)
+        )
+    return _extract_client_info(page_data)
+
+def _extract_client_info(page_data, use_llm_cache=True):
     json_parser = JsonOutputParser()
+    # Only replies that parse are cached
+    res_client = invoke_cached(
+        PROMPT_EXTRACT_CLIENT, {'page_data_client': page_data}, CLIENT_PROMPT_VERSION,
+        validate=json_parser.parse, use_cache=use_llm_cache
+    )
+    
     json_res_client = json_parser.parse(res_client.content)
     
     return json_res_client 
\ No newline at end of file
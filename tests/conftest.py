@@ -0,0 +1,72 @@
+import os
+import sys
+import zlib
+import numpy as np
+import pandas as pd
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.image_preprocessing import PreprocessConfig  # noqa: E402
+
+
+class FakeClip:
+    """CLIP stand-in: the embedding of an image is its mean color, padded and normalized"""
+    model_name = "fake-clip"
+    dimension = 8
+    embedding_cache = None
+    pixel_cache = None
+    decode_pool = None
+    preprocess_config = PreprocessConfig(size=32, crop_size=32)
+
+    def __init__(self):
+        self.embedded = 0
+
+    def get_pixel_embeddings(self, pixels, batch_size=16):
+        self.embedded += len(pixels)
+        embeds = np.zeros((len(pixels), self.dimension), dtype=np.float32)
+        embeds[:, :3] = pixels.reshape(len(pixels), -1, 3).mean(axis=1)
+        embeds[:, 3] = 1.0
+        return embeds / np.linalg.norm(embeds, axis=1, keepdims=True)
+
+    def embed_query(self, query):
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        vector[zlib.crc32(query.encode()) % self.dimension] = 1.0
+        return vector
+
+
+class FakeBM25:
+    """BM25 stand-in: one unit weight per distinct word"""
+    def _encode(self, text):
+        indices = sorted({zlib.crc32(word.encode()) % 1000 for word in str(text).lower().split()})
+        return {"indices": indices, "values": [1.0] * len(indices)}
+
+    def encode_documents(self, texts):
+        return [self._encode(text) for text in texts]
+
+    def encode_queries(self, text):
+        return self._encode(text)
+
+
+@pytest.fixture
+def fake_clip():
+    return FakeClip()
+
+
+@pytest.fixture
+def fake_bm25():
+    return FakeBM25()
+
+
+@pytest.fixture
+def make_inventory(tmp_path):
+    """Inventory DataFrame of styles with one small solid-color JPEG each"""
+    def make(styles):
+        rows = []
+        for i, style in enumerate(styles):
+            path = tmp_path / f"{style}.jpg"
+            Image.new("RGB", (48, 48), (40 * i % 256, 90, 160)).save(path)
+            rows.append({"style": style, "Image": str(path), "Description": f"Shell: 100% cotton {style}"})
+        return pd.DataFrame(rows)
+    return make
@@ -0,0 +1,72 @@
+from src.content_reducer import reduce_page_content, estimate_tokens
+
+
+def _filler(blocks):
+    return "\n\n".join(
+        f"Related post {i}: a long paragraph about the weather, the city and nothing in particular " * 3
+        for i in range(blocks)
+    )
+
+
+def test_page_within_budget_passes_through_whole():
+    page = "Sign in\nMy account\n\nVelvet blazer\nShell: 100% cotton\n\nCookie settings"
+    reduced, stats = reduce_page_content(page, token_budget=2000, kind="product")
+    assert reduced == page
+    assert stats.boilerplate == 0
+
+
+def test_page_within_budget_is_not_deduplicated():
+    page = "Size 38 in stock\nSize 40 in stock\nSize 38 in stock"
+    reduced, stats = reduce_page_content(page, token_budget=2000)
+    assert reduced == page
+    assert stats.duplicates == 0
+
+
+def test_repeated_blocks_and_sentences_dropped_when_over_budget():
+    footer = "Free shipping on orders over 200\nReturns within 30 days of delivery"
+    page = "\n\n".join([
+        "Velvet blazer with patch pockets, size 38 in stock",
+        footer,
+        "Velvet blazer with patch pockets, size 40 in stock\nvelvet blazer with patch pockets, SIZE 38 IN STOCK",
+        footer,
+        _filler(40),
+    ])
+    reduced, stats = reduce_page_content(page, token_budget=estimate_tokens(page) - 20, kind="product")
+    lines = reduced.split("\n")
+    assert "Velvet blazer with patch pockets, size 40 in stock" in lines
+    assert lines.count("Free shipping on orders over 200") == 1
+    assert stats.duplicates == 3
+
+
+def test_repeated_values_under_distinct_labels_are_kept():
+    table = ["Tecido", "100% Algodão", "Forro", "100% Algodão", "Bolso", "100% Algodão"]
+    page = "\n".join(table) + "\n\n" + _filler(40)
+    reduced, _ = reduce_page_content(page, token_budget=estimate_tokens(page) - 50, kind="product")
+    assert reduced.split("\n\n")[0].split("\n") == table
+
+
+def test_composition_table_survives_menu_stripping():
+    table = ["Shell", "100% Algodão", "Lining", "60% Viscose", "40% Poliéster"]
+    page = "\n".join(table) + "\n\n" + _filler(40)
+    reduced, _ = reduce_page_content(page, token_budget=estimate_tokens(page) - 50, kind="product")
+    for line in table:
+        assert line in reduced.split("\n")
+
+
+def test_menus_and_boilerplate_dropped_when_over_budget():
+    menu = ["Home", "Women", "Men", "Kids", "Sale"]
+    page = "\n".join(menu) + "\n\nSign in to your account\n\nVelvet blazer, shell 100% cotton\n\n" + _filler(40)
+    reduced, stats = reduce_page_content(page, token_budget=estimate_tokens(page) - 50, kind="product")
+    lines = reduced.split("\n")
+    assert "Velvet blazer, shell 100% cotton" in lines
+    assert not set(menu) & set(lines)
+    assert "Sign in to your account" not in lines
+    assert stats.boilerplate == len(menu) + 1
+
+
+def test_boilerplate_terms_match_whole_words_only():
+    content = ["Designed in Portugal from organic linen", "Cartão de visita bordado, 100% linho", "Blogindex of fabrics"]
+    page = "\n".join(content) + "\n\n" + _filler(40)
+    reduced, _ = reduce_page_content(page, token_budget=estimate_tokens(page) - 50, kind="product")
+    for line in content:
+        assert line in reduced.split("\n")
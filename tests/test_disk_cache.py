@@ -0,0 +1,19 @@
+from src import disk_cache
+from src.disk_cache import DiskCache
+
+
+def test_evicts_least_recently_used_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(disk_cache, "EVICT_BATCH", 2)
+    # Every value below is stored as 12 bytes of JSON
+    cache = DiskCache(str(tmp_path / "cache.sqlite"), max_bytes=12 * 10)
+    for i in range(10):
+        cache.set(f"k{i}", f"value-{i:04d}")
+    assert cache.get("k0") == "value-0000"
+
+    for i in range(10, 15):
+        cache.set(f"k{i}", f"value-{i:04d}")
+    assert len(cache) == 10
+    assert cache.evictions == 5
+    assert cache.get("k0") is not None
+    assert [cache.get(f"k{i}") for i in range(1, 6)] == [None] * 5
+    assert cache.get("k14") == "value-0014"
@@ -0,0 +1,46 @@
+import numpy as np
+from src.embedding_cache import EmbeddingCache
+
+
+def _embedding(value, dimension=4):
+    return np.full(dimension, value, dtype=np.float32)
+
+
+def test_put_and_get(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "m", dimension=4, capacity=3)
+    keys = [cache.key_for_bytes(bytes([i])) for i in range(2)]
+    cache.put_many(keys, [_embedding(1), _embedding(2)])
+    embeddings, hits = cache.get_many(keys + [cache.key_for_bytes(b"other")])
+    assert hits.tolist() == [True, True, False]
+    assert embeddings[1].tolist() == _embedding(2).tolist()
+
+
+def test_eviction_keeps_the_most_recently_used(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "m", dimension=4, capacity=2)
+    keys = [cache.key_for_bytes(bytes([i])) for i in range(3)]
+    cache.put_many(keys[:2], [_embedding(0), _embedding(1)])
+    cache.get_many([keys[0]])
+    cache.put_many([keys[2]], [_embedding(2)])
+    assert keys[0] in cache and keys[1] not in cache
+    embeddings, _ = cache.get_many([keys[0], keys[2]])
+    assert embeddings[:, 0].tolist() == [0, 2]
+
+
+def test_reopen_after_crash_hole_maps_no_key_to_another_embedding(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "m", dimension=4, capacity=3)
+    keys = [cache.key_for_bytes(bytes([i])) for i in range(4)]
+    cache.put_many(keys[:3], [_embedding(0), _embedding(1), _embedding(2)])
+    # A crash after an eviction cleared slot 0's key but before it was reused
+    cache._keys[0] = 0
+    cache.flush()
+
+    reopened = EmbeddingCache(str(tmp_path), "m", dimension=4, capacity=3)
+    reopened.put_many([keys[3]], [_embedding(3)])
+    embeddings, hits = reopened.get_many(keys)
+    assert hits.tolist() == [False, True, True, True]
+    assert embeddings[1:, 0].tolist() == [1, 2, 3]
+
+    # And the mapping survives another reopen
+    again = EmbeddingCache(str(tmp_path), "m", dimension=4, capacity=3, read_only=True)
+    embeddings, hits = again.get_many(keys)
+    assert embeddings[1:, 0].tolist() == [1, 2, 3]
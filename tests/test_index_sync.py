@@ -0,0 +1,91 @@
+import json
+from src.index_sync import sync_inventory, load_manifest
+from src.local_index import LocalHybridIndex
+
+
+def test_second_sync_touches_nothing(tmp_path, fake_clip, fake_bm25, make_inventory):
+    inventory = make_inventory(["A", "B", "C"])
+    manifest_path = tmp_path / "manifest.json"
+    index = LocalHybridIndex(dimension=fake_clip.dimension)
+
+    first = sync_inventory(index, inventory, fake_clip, fake_bm25, manifest_path, update_bm25=False)
+    second = sync_inventory(index, inventory, fake_clip, fake_bm25, manifest_path, update_bm25=False)
+    assert first.added == 3 and len(index) == 3
+    assert second.unchanged == 3 and second.ingest is None
+    assert load_manifest(manifest_path)["index"] == index.fingerprint
+
+
+def test_fresh_empty_index_gets_full_sync(tmp_path, fake_clip, fake_bm25, make_inventory):
+    inventory = make_inventory(["A", "B", "C"])
+    manifest_path = tmp_path / "manifest.json"
+    sync_inventory(LocalHybridIndex(dimension=8), inventory, fake_clip, fake_bm25, manifest_path, update_bm25=False)
+
+    # e.g. the index files were lost, or a Pinecone index was recreated
+    fresh = LocalHybridIndex(dimension=8)
+    stats = sync_inventory(fresh, inventory, fake_clip, fake_bm25, manifest_path, update_bm25=False)
+    assert stats.added == 3
+    assert sorted(fresh.ids) == ["A", "B", "C"]
+
+
+def test_index_other_than_manifests_gets_full_sync(tmp_path, fake_clip, fake_bm25, make_inventory):
+    inventory = make_inventory(["A", "B"])
+    manifest_path = tmp_path / "manifest.json"
+    sync_inventory(LocalHybridIndex(dimension=8), inventory, fake_clip, fake_bm25, manifest_path, update_bm25=False)
+
+    other = LocalHybridIndex(dimension=8)
+    other.upsert([{"id": "A", "values": [1.0] + [0.0] * 7, "metadata": {}}])
+    stats = sync_inventory(other, inventory, fake_clip, fake_bm25, manifest_path, update_bm25=False)
+    assert stats.added == 2
+    assert other.fetch(["A"])["vectors"]["A"]["metadata"]["style"] == "A"
+
+
+def test_manifest_written_after_index_is_persisted(tmp_path, fake_clip, fake_bm25, make_inventory):
+    inventory = make_inventory(["A", "B"])
+    manifest_path = tmp_path / "manifest.json"
+    index = LocalHybridIndex(dimension=8)
+    index_path = tmp_path / "index"
+    seen = []
+
+    def persist():
+        seen.append(manifest_path.exists())
+        index.save(index_path)
+
+    sync_inventory(index, inventory, fake_clip, fake_bm25, manifest_path, update_bm25=False, persist=persist)
+    assert seen == [False]
+    # A restart loading the saved index matches the manifest and needs no work
+    loaded = LocalHybridIndex.load(index_path)
+    stats = sync_inventory(loaded, inventory, fake_clip, fake_bm25, manifest_path, update_bm25=False)
+    assert stats.unchanged == 2 and stats.ingest is None
+
+
+def test_style_whose_image_fails_to_embed_is_not_recorded(tmp_path, fake_clip, fake_bm25, make_inventory):
+    inventory = make_inventory(["A", "B", "C"])
+    manifest_path = tmp_path / "manifest.json"
+    index = LocalHybridIndex(dimension=8)
+    with open(inventory.loc[1, "Image"], "wb") as f:
+        f.write(b"not an image")
+
+    stats = sync_inventory(index, inventory, fake_clip, fake_bm25, manifest_path, update_bm25=False)
+    assert stats.ingest.failed_styles == ["B"]
+    assert set(json.loads(manifest_path.read_text())["styles"]) == {"A", "C"}
+
+    # Once the image is fixed the next sync picks it up
+    make_inventory(["A", "B", "C"])
+    stats = sync_inventory(index, inventory, fake_clip, fake_bm25, manifest_path, update_bm25=False)
+    assert stats.added == 1 and "B" in index.ids
+
+
+def test_failed_change_keeps_previous_entry(tmp_path, fake_clip, fake_bm25, make_inventory):
+    inventory = make_inventory(["A", "B"])
+    manifest_path = tmp_path / "manifest.json"
+    index = LocalHybridIndex(dimension=8)
+    sync_inventory(index, inventory, fake_clip, fake_bm25, manifest_path, update_bm25=False)
+    previous = load_manifest(manifest_path)["styles"]["B"]
+
+    with open(inventory.loc[1, "Image"], "wb") as f:
+        f.write(b"not an image")
+    stats = sync_inventory(index, inventory, fake_clip, fake_bm25, manifest_path, update_bm25=False)
+    assert stats.changed == 1
+    assert load_manifest(manifest_path)["styles"]["B"] == previous
+    # Still counted as changed, so it is retried
+    assert sync_inventory(index, inventory, fake_clip, fake_bm25, manifest_path, update_bm25=False).changed == 1
@@ -0,0 +1,41 @@
+import threading
+import pytest
+from src.disk_cache import DiskCache
+from src.jobs import JobManager, QueueFull, SUCCEEDED, CANCELLED
+
+
+def test_job_visible_and_cancellable_from_another_manager(tmp_path):
+    store = DiskCache(str(tmp_path / "jobs.sqlite"))
+    release = threading.Event()
+
+    def run(job):
+        print("working", file=job.output)
+        release.wait(5)
+        return {"email": job.params["product_url"]}
+
+    owner = JobManager(run, workers=1, store=store)
+    other = JobManager(run, workers=1, store=store)
+    first = owner.submit(product_url="a")
+    second = owner.submit(product_url="b")
+
+    seen = other.get(first.id)
+    assert seen is not None and seen.params == {"product_url": "a"}
+    assert other.cancel(second.id).cancel_requested.is_set()
+
+    release.set()
+    assert first.done.wait(5) and second.done.wait(5)
+    finished = other.get(first.id)
+    assert finished.status == SUCCEEDED and finished.done.is_set()
+    assert finished.result == {"email": "a"}
+    assert "working" in finished.output.getvalue()
+    assert other.get(second.id).status == CANCELLED
+    assert other.get("unknown") is None
+
+
+def test_drain_waits_for_jobs_and_refuses_new_ones():
+    manager = JobManager(lambda job: job.params["n"] * 2, workers=1)
+    jobs = [manager.submit(n=i) for i in range(3)]
+    assert manager.drain(timeout=5)
+    assert [job.result for job in jobs] == [0, 2, 4]
+    with pytest.raises(QueueFull):
+        manager.submit(n=3)
@@ -0,0 +1,67 @@
+import pytest
+from langchain_core.output_parsers import JsonOutputParser
+from benchmarks.stubs import FakeChatModel
+from src.llm import register_llm, set_llm_cache, invoke_cached, _cache_key
+from src.llm_cache import LLMCache
+from src.web_scraping import PROMPT_EXTRACT_PRODUCT, PRODUCT_PROMPT_VERSION
+
+PAGE = "Velvet blazer, shell 100% cotton"
+INPUTS = {"page_data_product": PAGE}
+
+
+class FlakyChatModel(FakeChatModel):
+    """Answers the first `bad` calls with text that is not JSON"""
+    bad: int = 0
+
+    def _respond(self, messages):
+        if self.bad:
+            self.bad -= 1
+            return "Sure! Here is the JSON: {"
+        return super()._respond(messages)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = LLMCache(str(tmp_path / "llm.sqlite"))
+    set_llm_cache(cache)
+    yield cache
+    set_llm_cache(None)
+
+
+def _llm(bad=0):
+    llm = FlakyChatModel(latency=0, bad=bad)
+    register_llm(llm)
+    return llm
+
+
+def test_reply_failing_validation_is_not_cached(cache):
+    llm = _llm(bad=1)
+    parse = JsonOutputParser().parse
+    with pytest.raises(Exception):
+        invoke_cached(PROMPT_EXTRACT_PRODUCT, INPUTS, PRODUCT_PROMPT_VERSION, validate=parse)
+    assert cache.stats()["entries"] == 0
+
+    response = invoke_cached(PROMPT_EXTRACT_PRODUCT, INPUTS, PRODUCT_PROMPT_VERSION, validate=parse)
+    assert parse(response.content)["brand"]
+    cached = invoke_cached(PROMPT_EXTRACT_PRODUCT, INPUTS, PRODUCT_PROMPT_VERSION, validate=parse)
+    assert cached.response_metadata["cached"]
+    assert llm.calls == 2
+
+
+def test_cached_reply_failing_validation_is_replaced(cache):
+    llm = _llm()
+    key = _cache_key(cache, PROMPT_EXTRACT_PRODUCT, INPUTS, PRODUCT_PROMPT_VERSION, "groq", None)
+    cache.put(key, "not json")
+
+    response = invoke_cached(PROMPT_EXTRACT_PRODUCT, INPUTS, PRODUCT_PROMPT_VERSION, validate=JsonOutputParser().parse)
+    assert not response.response_metadata.get("cached")
+    assert llm.calls == 1
+    assert cache.get(key) == response.content
+
+
+def test_use_cache_false_skips_the_cache(cache):
+    llm = _llm()
+    for _ in range(2):
+        invoke_cached(PROMPT_EXTRACT_PRODUCT, INPUTS, PRODUCT_PROMPT_VERSION, use_cache=False)
+    assert llm.calls == 2
+    assert cache.stats()["entries"] == 0
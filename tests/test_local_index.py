@@ -0,0 +1,59 @@
+import os
+import numpy as np
+import pytest
+from src.local_index import LocalHybridIndex
+
+
+def _record(id_, hot):
+    values = [0.0] * 8
+    values[hot] = 1.0
+    return {"id": id_, "values": values, "sparse_values": {"indices": [hot], "values": [1.0]},
+            "metadata": {"Image": f"{id_}.jpg"}}
+
+
+def test_interrupted_save_keeps_previous_index(tmp_path, monkeypatch):
+    path = tmp_path / "index"
+    index = LocalHybridIndex(dimension=8)
+    index.upsert([_record("a", 0), _record("b", 1)])
+    index.save(path)
+
+    index.upsert([_record("c", 2)])
+    calls = []
+    save = np.save
+
+    def failing_save(file, array):
+        calls.append(file)
+        if len(calls) == 3:
+            raise OSError("disk full")
+        save(file, array)
+
+    monkeypatch.setattr(np, "save", failing_save)
+    with pytest.raises(OSError):
+        index.save(path)
+    monkeypatch.undo()
+
+    loaded = LocalHybridIndex.load(path)
+    assert sorted(loaded.ids) == ["a", "b"]
+    index.save(path)
+    assert sorted(LocalHybridIndex.load(path, mmap=True).ids) == ["a", "b", "c"]
+    assert len([name for name in os.listdir(path) if name.startswith("data-")]) == 1
+
+
+def test_loads_and_replaces_flat_layout(tmp_path):
+    path = tmp_path / "index"
+    index = LocalHybridIndex(dimension=8)
+    index.upsert([_record("a", 0), _record("b", 1)])
+    index.save(path)
+    # Arrays next to records.json, as saved before the data-* subdirectories
+    data_dir = next(name for name in os.listdir(path) if name.startswith("data-"))
+    for name in os.listdir(path / data_dir):
+        os.replace(path / data_dir / name, path / name)
+    os.rmdir(path / data_dir)
+    records = (path / "records.json").read_text().replace(f'"data": "{data_dir}", ', "")
+    (path / "records.json").write_text(records)
+
+    loaded = LocalHybridIndex.load(path)
+    assert loaded.fingerprint == index.fingerprint
+    loaded.save(path)
+    assert not [name for name in os.listdir(path) if name.endswith(".npy")]
+    assert LocalHybridIndex.load(path).fingerprint == index.fingerprint
@@ -0,0 +1,33 @@
+import os
+from src.metrics import Registry
+
+
+def test_render_merges_forked_workers(tmp_path):
+    registry = Registry()
+    requests = registry.counter("requests_total", "Requests", ["endpoint"])
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1))
+    busy = registry.gauge("busy", "Busy")
+    registry.register_collector(lambda: [("queued", "gauge", "Queued", [({}, 2)])])
+    registry.use_directory(str(tmp_path))
+    requests.inc(endpoint="/a")
+    registry.write_snapshot()
+
+    pid = os.fork()
+    if pid == 0:
+        registry.reset_after_fork(flush_interval=60)
+        requests.inc(2, endpoint="/a")
+        latency.observe(0.5)
+        busy.set(1)
+        registry.write_snapshot()
+        os._exit(0)
+    os.waitpid(pid, 0)
+
+    latency.observe(0.05)
+    lines = registry.render().splitlines()
+    assert 'requests_total{endpoint="/a"} 3' in lines
+    assert 'latency_seconds_bucket{le="1"} 2' in lines
+    assert "latency_seconds_count 2" in lines
+    # The exited worker's gauges and collector values are gone
+    assert "busy 1" not in lines
+    assert f'queued{{worker="{os.getpid()}"}} 2' in lines
+    assert f'queued{{worker="{pid}"}} 2' not in lines
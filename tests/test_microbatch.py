@@ -0,0 +1,70 @@
+import time
+import threading
+import pytest
+from src.microbatch import MicroBatcher
+
+
+def _double(items):
+    time.sleep(0.01)
+    return [item * 2 for item in items]
+
+
+def test_dispatches_once_queue_drains():
+    # Several items queued must not hold the batch open waiting for more
+    batcher = MicroBatcher(_double)
+    start = time.perf_counter()
+    futures = [batcher.submit(i) for i in range(3)]
+    assert [future.result(2) for future in futures] == [0, 2, 4]
+    assert time.perf_counter() - start < 0.5
+    batcher.close()
+
+
+def test_concurrent_callers_are_batched():
+    batcher = MicroBatcher(_double)
+    results = {}
+
+    def call(i):
+        results[i] = batcher(i, timeout=5)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(40)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == {i: 2 * i for i in range(40)}
+    assert batcher.batches < 40
+    batcher.close()
+
+
+def test_one_bad_item_fails_only_its_caller():
+    def fn(items):
+        if "bad" in items:
+            raise ValueError("bad item")
+        return items
+
+    batcher = MicroBatcher(fn)
+    futures = [batcher.submit(item) for item in ("a", "bad", "b")]
+    assert futures[0].result(2) == "a"
+    with pytest.raises(ValueError):
+        futures[1].result(2)
+    assert futures[2].result(2) == "b"
+    batcher.close()
+
+
+class _Fatal(BaseException):
+    pass
+
+
+def test_worker_survives_base_exception():
+    def fn(items):
+        if items[0] == "fatal":
+            raise _Fatal()
+        return items
+
+    batcher = MicroBatcher(fn)
+    with pytest.raises(_Fatal):
+        batcher("fatal", timeout=2)
+    # The worker is still running and serves later callers
+    assert batcher("ok", timeout=2) == "ok"
+    assert batcher._thread.is_alive()
+    batcher.close()
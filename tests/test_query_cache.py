@@ -0,0 +1,126 @@
+from types import SimpleNamespace
+import numpy as np
+from src.disk_cache import DiskCache
+from src.local_index import LocalHybridIndex
+from src.query_cache import QueryCache, QuerySearch, VersionedIndex, index_version
+
+
+def _record(id_, hot):
+    values = [0.0] * 8
+    values[hot] = 1.0
+    return {"id": id_, "values": values, "sparse_values": {"indices": [hot], "values": [1.0]},
+            "metadata": {"Image": f"{id_}.jpg", "Description": f"style {id_}"}}
+
+
+def _state(index, fake_clip, fake_bm25, query_cache):
+    return SimpleNamespace(index=index, clip_model=fake_clip, bm25_model=fake_bm25, query_cache=query_cache)
+
+
+def test_local_version_follows_content():
+    index = LocalHybridIndex(dimension=8)
+    index.upsert([_record("a", 0), _record("b", 1)])
+    version = index_version(index)
+
+    index.upsert([_record("a", 0)])
+    assert index_version(index) == version
+    index.upsert([_record("c", 2)])
+    assert index_version(index) != version
+    index.delete(["c"])
+    assert index_version(index) == version
+
+    # Same records in another order, or in another process, give the same stamp
+    other = LocalHybridIndex(dimension=8)
+    other.upsert([_record("b", 1), _record("a", 0)])
+    assert index_version(other) == version
+
+
+def test_local_version_survives_save_and_load(tmp_path):
+    index = LocalHybridIndex(dimension=8)
+    index.upsert([_record("a", 0), _record("b", 1)])
+    index.save(tmp_path / "index")
+    assert index_version(LocalHybridIndex.load(tmp_path / "index")) == index_version(index)
+
+
+class _RemoteIndex:
+    def upsert(self, vectors, namespace=None):
+        return {"upserted_count": len(vectors)}
+
+    def delete(self, ids):
+        return {}
+
+
+def test_remote_version_is_a_persisted_write_counter(tmp_path):
+    path = tmp_path / "index_version"
+    index = VersionedIndex(_RemoteIndex(), path=str(path))
+    version = index.version
+    index.upsert([])
+    index.delete([])
+    assert index.version != version
+    # A restarted process sees the same stamp
+    assert VersionedIndex(_RemoteIndex(), path=str(path)).version == index.version
+
+
+def test_query_search_serves_repeats_until_index_changes(fake_clip, fake_bm25):
+    index = LocalHybridIndex(dimension=8)
+    index.upsert([_record(str(i), i % 8) for i in range(6)])
+    cache = QueryCache(model_key="m")
+    state = _state(index, fake_clip, fake_bm25, cache)
+
+    first = QuerySearch(state, "Red  Velvet")()
+    assert QuerySearch(state, "red velvet").cached() == first
+    assert cache.vector_misses == 1
+
+    index.upsert([_record("new", 3)])
+    assert QuerySearch(state, "red velvet").cached() is None
+    QuerySearch(state, "red velvet")()
+    # The vectors did not change with the index
+    assert cache.vector_hits == 1
+
+
+def test_query_search_without_cache(fake_clip, fake_bm25):
+    index = LocalHybridIndex(dimension=8)
+    index.upsert([_record(str(i), i % 8) for i in range(6)])
+    search = QuerySearch(_state(index, fake_clip, fake_bm25, None), "red velvet")
+    assert search.cached() is None
+    fabric_results, likeliness_results = search()
+    assert len(fabric_results[0]) == 3
+
+
+def test_disk_store_shared_by_processes(tmp_path, fake_clip, fake_bm25):
+    index = LocalHybridIndex(dimension=8)
+    index.upsert([_record(str(i), i % 8) for i in range(6)])
+    store_path = str(tmp_path / "queries.sqlite")
+    first = QuerySearch(_state(index, fake_clip, fake_bm25, QueryCache("m", store=DiskCache(store_path))), "linen")()
+
+    # A second process with an index loaded from the same files
+    index.save(tmp_path / "index")
+    loaded = LocalHybridIndex.load(tmp_path / "index")
+    cache = QueryCache("m", store=DiskCache(store_path))
+    cached = QuerySearch(_state(loaded, fake_clip, fake_bm25, cache), "linen").cached()
+    assert cached is not None
+    assert [list(part) for part in cached[0][:3]] == [list(part) for part in first[0][:3]]
+
+
+def test_stored_vectors_are_read_only():
+    cache = QueryCache("m")
+    _, dense = cache.vectors("q", lambda: ({"indices": [1], "values": [1.0]}, np.ones(8)))
+    assert not dense.flags.writeable
+
+
+def test_remote_version_expires_with_max_age(monkeypatch):
+    index = VersionedIndex(_RemoteIndex(), max_age=60)
+    monkeypatch.setattr("src.query_cache.time.time", lambda: 600.0)
+    version = index.version
+    monkeypatch.setattr("src.query_cache.time.time", lambda: 659.0)
+    assert index.version == version
+    monkeypatch.setattr("src.query_cache.time.time", lambda: 660.0)
+    assert index.version != version
+
+
+def test_results_without_scores_are_cached():
+    cache = QueryCache("m")
+    results = [(["a"], ["a.jpg"], ["style a"], [None]), (["b"], ["b.jpg"], ["style b"], [np.float32(0.5)])]
+    assert cache.get_results("q", [0, 1], 3, "v1") is None
+    cache.put_results("q", [0, 1], 3, "v1", results)
+    assert cache.get_results("q", [0, 1], 3, "v1") == [(["a"], ["a.jpg"], ["style a"], [None]),
+                                                      (["b"], ["b.jpg"], ["style b"], [0.5])]
@@ -0,0 +1,14 @@
+from src.local_index import LocalHybridIndex
+from src.search import search_multi_alpha
+
+
+class _RemoteIndex:
+    def query(self, **kwargs):
+        raise AssertionError("no query expected")
+
+
+def test_no_weights_returns_no_results():
+    sparse = {"indices": [1], "values": [1.0]}
+    dense = [1.0] + [0.0] * 7
+    assert search_multi_alpha(_RemoteIndex(), sparse, dense, []) == []
+    assert search_multi_alpha(LocalHybridIndex(dimension=8), sparse, dense, ()) == []